@@ -0,0 +1,211 @@
+"""Versioned JSON API over the same data the dashboards show.
+
+    GET /api/v1/requests   admins: every request; residents: their own
+    GET /api/v1/users      admins only: registered residents
+    GET /api/v1/records    admins only: archived requests (all_records)
+    GET /api/v1/stats      the dashboard counters (a resident gets their own)
+
+Lists are keyset-paginated like the HTML pages (?limit=, and the
+next_cursor / prev_cursor of a response as ?after= / ?before=) and take:
+
+    fields=id,status,...   only these columns; the list goes into the SELECT,
+                           and users is only joined when a field needs it
+    status=, document_type=, date_from=, date_to= (YYYY-MM-DD, inclusive)
+                           where the resource has that column
+
+Responses are gzip-compressed when the client accepts it and carry a weak
+ETag over the JSON body, so polling an unchanged page costs a 304 instead
+of the transfer. Access follows the HTML routes' session and role checks;
+errors come back as {"error": "..."} with 400, 401, 403 or 404.
+"""
+import gzip
+import hashlib
+import json
+from datetime import date, datetime, timedelta
+
+from flask import Response, request, session
+
+from export import parse_date
+from pagination import page_size
+
+PREFIX = '/api/v1'
+MIN_GZIP_BYTES = 1024
+
+RESOURCES = {
+    'requests': {
+        'from': 'requests r',
+        'join': 'JOIN users u ON r.user_id = u.id',
+        'fields': {
+            'id': 'r.id', 'user_id': 'r.user_id', 'fullname': 'u.fullname', 'email': 'u.email',
+            'full_name': 'r.full_name', 'document_type': 'r.document_type', 'purpose': 'r.purpose',
+            'address': 'r.address', 'contact': 'r.contact', 'status': 'r.status',
+            'date_submitted': 'r.date_submitted', 'updated_at': 'r.updated_at',
+        },
+        'default_fields': ('id', 'fullname', 'email', 'document_type', 'purpose', 'status', 'date_submitted'),
+        # What a resident sees of their own requests (no join needed).
+        'owner_fields': ('id', 'full_name', 'document_type', 'purpose', 'address', 'contact', 'status',
+                         'date_submitted', 'updated_at'),
+        'owner_column': 'r.user_id',
+        'keys': [('date_submitted', 'r.date_submitted'), ('id', 'r.id')],
+        'descending': True,
+        'filters': {'status': 'r.status', 'document_type': 'r.document_type'},
+        'date_column': 'r.date_submitted',
+    },
+    'users': {
+        'from': 'users',
+        'fields': {
+            'id': 'id', 'first_name': 'first_name', 'last_name': 'last_name', 'fullname': 'fullname',
+            'email': 'email', 'contact': 'contact', 'birthdate': 'birthdate', 'civil_status': 'civil_status',
+            'address': 'address', 'fathers_name': 'fathers_name', 'mothers_name': 'mothers_name',
+            'birthplace': 'birthplace',
+        },
+        'default_fields': ('id', 'first_name', 'last_name', 'fullname', 'email'),
+        'where': ["role = 'user'"],
+        'keys': [('id', 'id')],
+        'descending': False,
+        'filters': {},
+    },
+    'records': {
+        'from': 'all_records',
+        'fields': {
+            'id': 'id', 'request_id': 'request_id', 'user_id': 'user_id', 'fullname': 'fullname',
+            'document_type': 'document_type', 'status': 'status', 'date_submitted': 'date_submitted',
+            'archived_at': 'archived_at',
+        },
+        'default_fields': ('id', 'request_id', 'fullname', 'document_type', 'status', 'date_submitted',
+                           'archived_at'),
+        'keys': [('archived_at', 'archived_at'), ('id', 'id')],
+        'descending': True,
+        'filters': {'status': 'status', 'document_type': 'document_type'},
+        'date_column': 'archived_at',
+    },
+}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def json_response(payload, status=200):
+    """Serialize `payload`; answer 304 if the client holds this body already,
+    gzip it if the client accepts that and it is worth it"""
+    body = json.dumps(payload, separators=(',', ':'), ensure_ascii=False, default=_json_default).encode('utf-8')
+    # Weak: the same tag stands for the plain and the gzipped bytes.
+    etag = hashlib.sha1(body).hexdigest()[:32]
+    if status == 200 and request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, status=status, mimetype='application/json')
+        if len(body) >= MIN_GZIP_BYTES and 'gzip' in request.accept_encodings:
+            response.set_data(gzip.compress(body, 6))
+            response.headers['Content-Encoding'] = 'gzip'
+    if status == 200:
+        response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Accept-Encoding')
+    response.vary.add('Cookie')
+    return response
+
+
+def _viewer(admin_only):
+    """(user_id, is_admin) of the session, or ApiError as the HTML routes would redirect"""
+    if 'user_id' not in session:
+        raise ApiError(401, 'login required')
+    is_admin = session.get('role') == 'admin'
+    if admin_only and not is_admin:
+        raise ApiError(403, 'admin only')
+    return session['user_id'], is_admin
+
+
+def _projection(spec, allowed):
+    raw = request.args.get('fields', '').strip()
+    if not raw:
+        return [f for f in spec['default_fields'] if f in allowed] or list(allowed)
+    fields = list(dict.fromkeys(f.strip() for f in raw.split(',') if f.strip()))
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise ApiError(400, f"unknown field(s): {', '.join(unknown)}; available: {', '.join(allowed)}")
+    return fields
+
+
+def build_page_query(name, owner_id=None):
+    """The SELECT, key columns, WHERE list, params and projected fields for
+    a list request, from the query string"""
+    spec = RESOURCES[name]
+    allowed = spec['owner_fields'] if owner_id is not None else tuple(spec['fields'])
+    fields = _projection(spec, allowed)
+
+    # The page cursor needs the key columns whether or not they were asked for.
+    selected = list(dict.fromkeys(fields + [key for key, _ in spec['keys']]))
+    columns = [spec['fields'][f] for f in selected]
+    from_sql = spec['from']
+    if spec.get('join') and any(c.startswith('u.') for c in columns):
+        from_sql += ' ' + spec['join']
+    select = f"SELECT {', '.join(f'{c} AS {f}' for f, c in zip(selected, columns))} FROM {from_sql}"
+
+    where, params = list(spec.get('where', [])), []
+    if owner_id is not None:
+        where.append(f"{spec['owner_column']} = %s")
+        params.append(owner_id)
+    for arg, column in spec['filters'].items():
+        value = request.args.get(arg, '').strip()
+        if value:
+            where.append(f'{column} = %s')
+            params.append(value)
+    try:
+        date_from = parse_date(request.args.get('date_from', '').strip())
+        date_to = parse_date(request.args.get('date_to', '').strip())
+    except ValueError:
+        raise ApiError(400, 'dates must be YYYY-MM-DD')
+    if (date_from or date_to) and not spec.get('date_column'):
+        raise ApiError(400, f'{name} cannot be filtered by date')
+    if date_from:
+        where.append(f"{spec['date_column']} >= %s")
+        params.append(date_from)
+    if date_to:
+        where.append(f"{spec['date_column']} < %s")
+        params.append(date_to + timedelta(days=1))
+
+    keys = [(column, key) for key, column in spec['keys']]
+    return select, keys, where, params, fields
+
+
+def init_app(app, repo):
+    """Register the /api/v1 routes on `app`, reading through `repo`"""
+
+    @app.errorhandler(ApiError)
+    def api_error(e):
+        return json_response({'error': e.message}, e.status)
+
+    @app.route(f'{PREFIX}/stats')
+    def api_stats():
+        user_id, is_admin = _viewer(admin_only=False)
+        if not is_admin:
+            counts = repo.status_counts(user_id)
+            return json_response({'requests': counts, 'total_requests': sum(counts.values())})
+        residents, counts = repo.admin_stats()
+        return json_response({'residents': residents, 'requests': counts, 'total_requests': sum(counts.values())})
+
+    @app.route(f'{PREFIX}/<resource>')
+    def api_list(resource):
+        if resource not in RESOURCES:
+            raise ApiError(404, f'no such resource: {resource}')
+        user_id, is_admin = _viewer(admin_only=resource != 'requests')
+        select, keys, where, params, fields = build_page_query(resource, None if is_admin else user_id)
+        page = repo.page(select, keys, where, params, after=request.args.get('after'),
+                         before=request.args.get('before'), limit=page_size(request.args.get('limit')),
+                         descending=RESOURCES[resource]['descending'])
+        return json_response({
+            'data': [{f: row[f] for f in fields} for row in page.rows],
+            'next_cursor': page.next_cursor,
+            'prev_cursor': page.prev_cursor,
+        })
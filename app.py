@@ -1,11 +1,32 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import (Flask, render_template, request, redirect, url_for, session, flash, g, jsonify, has_app_context,
+                   Response, make_response, send_file)
+from jinja2 import FileSystemBytecodeCache
 import os
-import pymysql
-from pymysql.cursors import DictCursor
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.middleware.proxy_fix import ProxyFix
 from datetime import datetime
 import re
 from dotenv import load_dotenv
+from db_pool import ConnectionPool
+from backends import MySQLBackend, SQLiteBackend
+from repository import Repository, DuplicateEmail
+from pagination import page_size
+from migrations import migrate
+from archive import ARCHIVABLE_STATUSES
+import export
+import api
+import health
+import reports
+import certificates
+import cold_storage
+import work_queue
+import passwords
+from throttle import FairSemaphore, Throttle
+from cache import TTLCache
+import i18n
+from i18n import gettext
+import assets
+import metrics
+import live
 
 # Load environment variables (for local testing)
 load_dotenv()
@@ -15,86 +36,156 @@ app.secret_key = os.getenv("SECRET_KEY", "secretkey123")
 app.config['UPLOAD_FOLDER'] = 'static/uploads/'
 app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024
 
+# Behind Heroku's router (or any reverse proxy) set PROXY_FIX_HOPS=1 so
+# request.remote_addr is the client, not the proxy; login throttling is
+# per client address.
+if int(os.getenv("PROXY_FIX_HOPS", "0")):
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=int(os.getenv("PROXY_FIX_HOPS")))
+
+# One template per page; English/Tagalog text comes from translations/*.json.
+# Compiled templates are cached on disk so a fresh worker skips the parse.
+i18n.init_app(app)
+JINJA_CACHE_DIR = os.getenv("JINJA_CACHE_DIR", os.path.join(app.root_path, '.jinja_cache'))
+os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(JINJA_CACHE_DIR)
+
+# Fingerprinted CSS/JS/images built by `python assets.py build`, served from
+# /assets/ with immutable caching; templates link them through asset_url().
+assets.init_app(app)
+
+# Document types /admin/certificate/<id>.pdf can print (see certificates.py).
+app.jinja_env.globals['certificate_types'] = certificates.CERTIFICATES
+
+# Per-endpoint latency / SQL / render histograms at /metrics, plus a log
+# line (with the SQL it ran) for every request slower than SLOW_REQUEST_MS.
+metrics.init_app(app, slow_request_ms=float(os.getenv("SLOW_REQUEST_MS", "500")),
+                 metrics_token=os.getenv("METRICS_TOKEN"))
+
 # ==================== DATABASE CONNECTION ====================
 
-DB_HOST = os.getenv("DB_HOST")
-DB_USER = os.getenv("DB_USER")
-DB_PASS = os.getenv("DB_PASS")
-DB_NAME = os.getenv("DB_NAME")
-DB_PORT = int(os.getenv("DB_PORT", "3306"))
+# DB_BACKEND=mysql (default) or sqlite. SQLite suits a single-node
+# barangay install and fast local runs: one WAL-mode file, no server.
+DB_BACKEND = os.getenv("DB_BACKEND", "mysql")
+
+if DB_BACKEND == 'sqlite':
+    backend = SQLiteBackend(os.getenv("SQLITE_PATH", os.path.join(app.root_path, 'barangay.db')),
+                            cursor_wrapper=metrics.instrument_cursor)
+else:
+    from pymysql.cursors import DictCursor
+
+    DB_HOST = os.getenv("DB_HOST")
+    DB_USER = os.getenv("DB_USER")
+    DB_PASS = os.getenv("DB_PASS")
+    DB_NAME = os.getenv("DB_NAME")
+    DB_PORT = int(os.getenv("DB_PORT", "3306"))
+
+    backend = MySQLBackend(ConnectionPool(
+        dict(
+            host=DB_HOST,
+            user=DB_USER,
+            password=DB_PASS,
+            database=DB_NAME,
+            port=DB_PORT,
+            cursorclass=DictCursor,
+            autocommit=False
+        ),
+        max_size=int(os.getenv("DB_POOL_SIZE", "10")),
+        timeout=float(os.getenv("DB_POOL_TIMEOUT", "10")),
+        max_idle=float(os.getenv("DB_POOL_MAX_IDLE", "300")),
+        max_lifetime=float(os.getenv("DB_POOL_MAX_LIFETIME", "3600")),
+        ping_interval=float(os.getenv("DB_POOL_PING_INTERVAL", "30")),
+        cursor_wrapper=metrics.instrument_cursor,
+    ))
 
 
 def get_db():
-    """Return a MySQL connection"""
-    conn = pymysql.connect(
-        host=DB_HOST,
-        user=DB_USER,
-        password=DB_PASS,
-        database=DB_NAME,
-        port=DB_PORT,
-        cursorclass=DictCursor,
-        autocommit=False
-    )
-    return conn
+    """Return a connection from the configured backend.
+
+    Inside a request the same connection is reused for the whole request
+    and handed back to the backend on teardown. Outside a request (CLI,
+    init scripts) the caller owns it until conn.close().
+    """
+    if not has_app_context():
+        return backend.acquire()
+    if 'db' not in g:
+        g.db = backend.acquire()
+        g.db.request_scoped = True
+    return g.db
+
+
+@app.teardown_appcontext
+def release_db(exc):
+    conn = g.pop('db', None)
+    if conn is not None:
+        backend.release(conn)
+
+
+repo = Repository(backend, get_db, on_requests_changed=live.notify)
+
+# ETags / 304s on the resident status pages and a Server-Sent Events
+# stream that tells an open page when one of its requests changed.
+live.init_app(app, repo.request_versions,
+              poll_seconds=float(os.getenv("LIVE_POLL_SECONDS", "2")),
+              stream_seconds=float(os.getenv("LIVE_STREAM_SECONDS", "55")),
+              max_streams=int(os.getenv("LIVE_MAX_STREAMS", "8")))
+
+# JSON for scripts and mobile clients: /api/v1/requests, users, records, stats.
+api.init_app(app, repo)
+
+# /healthz (process up) and /readyz (database and pool usable) for the
+# router and uptime checks.
+health.init_app(app, backend)
+
+
+# ==================== CACHES ====================
+
+# Cached profiles are stamped with the profile version (counters.PROFILES)
+# they were read under, and every profile write bumps it in the same
+# transaction, so a write is seen at once by every session and worker.
+profile_cache = TTLCache(maxsize=int(os.getenv("PROFILE_CACHE_SIZE", "4096")),
+                         ttl=float(os.getenv("PROFILE_CACHE_TTL", "300")))
+
+# Failed logins per email and per client address. A blocked key is turned
+# away before its password is hashed, and at most LOGIN_MAX_HASHING logins
+# per worker hash at once, so login attempts cannot eat every thread's CPU.
+# A login that finds every slot taken queues for up to LOGIN_HASH_WAIT_MS
+# before it is told the server is busy. The default is two hashes' time
+# with every slot sharing one CPU, so a login queued behind a full set of
+# hashes gets the next free slot.
+login_email_throttle = Throttle(limit=int(os.getenv("LOGIN_EMAIL_FAILURES", "5")),
+                                window=float(os.getenv("LOGIN_THROTTLE_WINDOW", "900")))
+login_ip_throttle = Throttle(limit=int(os.getenv("LOGIN_IP_FAILURES", "50")),
+                             window=float(os.getenv("LOGIN_THROTTLE_WINDOW", "900")))
+LOGIN_MAX_HASHING = int(os.getenv("LOGIN_MAX_HASHING", "4"))
+login_hashing = FairSemaphore(LOGIN_MAX_HASHING)
+login_hashing_wait = float(os.getenv("LOGIN_HASH_WAIT_MS", 2 * LOGIN_MAX_HASHING * float(
+    os.getenv("PASSWORD_HASH_TARGET_MS", passwords.DEFAULT_TARGET_MS)))) / 1000
+
+
+def get_profile(user_id):
+    """Cached repo.user_by_id()"""
+    version = repo.profile_version()
+    cached = profile_cache.get(user_id)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    user = repo.user_by_id(user_id)
+    if user is not None:
+        profile_cache.set(user_id, (version, user))
+    return user
 
 
 def init_db():
-    """Initialize MySQL database (create tables and admin user if not exist)"""
+    """Initialize the database (run migrations and create admin user if not exist)"""
     conn = get_db()
-    c = conn.cursor()
-
-    # USERS TABLE
-    c.execute('''
-    CREATE TABLE IF NOT EXISTS users (
-        id INT AUTO_INCREMENT PRIMARY KEY,
-        first_name VARCHAR(255) NOT NULL,
-        last_name VARCHAR(255) NOT NULL,
-        fullname VARCHAR(511) NOT NULL,
-        email VARCHAR(255) NOT NULL UNIQUE,
-        password VARCHAR(255) NOT NULL,
-        contact VARCHAR(50),
-        birthdate VARCHAR(50),
-        civil_status VARCHAR(50),
-        address TEXT,
-        fathers_name VARCHAR(255),
-        mothers_name VARCHAR(255),
-        birthplace VARCHAR(255),
-        role VARCHAR(50) DEFAULT 'user',
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    ) ENGINE=InnoDB;
-    ''')
-
-    # REQUESTS TABLE
-    c.execute('''
-    CREATE TABLE IF NOT EXISTS requests (
-        id INT AUTO_INCREMENT PRIMARY KEY,
-        user_id INT NOT NULL,
-        document_type VARCHAR(255) NOT NULL,
-        full_name VARCHAR(511) NOT NULL,
-        address TEXT NOT NULL,
-        contact VARCHAR(50) NOT NULL,
-        purpose TEXT NOT NULL,
-        status VARCHAR(50) DEFAULT 'Pending',
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
-    ) ENGINE=InnoDB;
-    ''')
+    migrate(conn)
+    conn.close()
 
     # INSERT ADMIN IF NOT EXISTS
     admin_email = 'adminsislc@domain.com'
-    c.execute('SELECT id FROM users WHERE email = %s', (admin_email,))
-    admin = c.fetchone()
-    if not admin:
-        hashed = generate_password_hash('S3cr#t@dm1n')
-        c.execute('''
-            INSERT INTO users (first_name, last_name, fullname, email, password, contact, role)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        ''', ('Admin', 'User', 'Admin User', admin_email, hashed, '09123456789', 'admin'))
-
-    conn.commit()
-    c.close()
-    conn.close()
-    print(" MySQL database initialized successfully!")
+    if not repo.user_by_email(admin_email):
+        repo.create_user('Admin', 'User', admin_email, passwords.hash_password('S3cr#t@dm1n'),
+                         role='admin', contact='09123456789')
+    print(f" {DB_BACKEND} database initialized successfully!")
 
 
 # ==================== VALIDATION ====================
@@ -103,19 +194,39 @@ def validate_contact(contact):
     return re.match(r'^09\d{9}$', contact) is not None
 
 
+VALID_STATUSES = ['Pending', 'Processing', 'Verifying', 'Ready to be Claim', 'Completed', 'Rejected']
+
+# How long an admin's claim on a request lasts (see work_queue.py)
+CLAIM_LEASE_SECONDS = int(os.getenv("CLAIM_LEASE_SECONDS", str(work_queue.LEASE_SECONDS)))
+
+# Request workflow, mirroring the action buttons on the admin dashboard
+STATUS_TRANSITIONS = {
+    'Pending': ['Processing', 'Rejected'],
+    'Processing': ['Verifying', 'Rejected'],
+    'Verifying': ['Ready to be Claim', 'Rejected'],
+    'Ready to be Claim': ['Completed'],
+    'Completed': [],
+    'Rejected': [],
+}
+
+
+def safe_next_url(target, default):
+    """Only follow same-site relative redirects"""
+    if target and target.startswith('/') and not target.startswith('//'):
+        return target
+    return default
+
+
 # ==================== ROUTES ====================
 
 @app.route('/')
 def home():
-    lang = session.get('lang', 'en')
-    if lang == 'tl':
-        return render_template('index_tl.html')
-    return render_template('index_en.html')
+    return render_template('index.html')
 
 
 @app.route('/set_language/<lang>')
 def set_language(lang):
-    if lang in ['en', 'tl']:
+    if lang in i18n.LANGUAGES:
         session['lang'] = lang
     return redirect(request.referrer or url_for('home'))
 
@@ -123,19 +234,35 @@ def set_language(lang):
 @app.route('/login', methods=['GET', 'POST'])
 def login_page():
     if request.method == 'POST':
-        email = request.form['email']
+        email = request.form['email'].strip().lower()
         password = request.form['password']
+        ip_key = request.remote_addr
 
-        conn = get_db()
-        cur = conn.cursor()
-        cur.execute('SELECT * FROM users WHERE email = %s', (email,))
-        user = cur.fetchone()
-        cur.close()
-        conn.close()
+        wait = max(login_email_throttle.retry_after(email), login_ip_throttle.retry_after(ip_key))
+        if wait:
+            flash(gettext("Too many failed sign-ins. Try again in %(minutes)s minute(s).",
+                          minutes=int(wait // 60) + 1), "error")
+            return render_template('login.html'), 429, {'Retry-After': str(int(wait) + 1)}
+
+        user = repo.login_user(email)
 
         if user is None:
-            flash("You do not have an account.", "error")
-        elif check_password_hash(user['password'], password):
+            login_ip_throttle.failure(ip_key)
+            flash(gettext("You do not have an account."), "error")
+            return render_template('login.html')
+
+        if not login_hashing.acquire(timeout=login_hashing_wait):
+            flash(gettext("The server is busy. Please try again in a moment."), "error")
+            return render_template('login.html'), 503, {'Retry-After': '1'}
+        try:
+            matches, new_hash = passwords.verify(user['password'], password)
+        finally:
+            login_hashing.release()
+
+        if matches:
+            login_email_throttle.reset(email)
+            if new_hash:
+                repo.rehash_password(user['id'], user['password'], new_hash)
             session['user_id'] = user['id']
             session['role'] = user['role']
             session['fullname'] = user['fullname']
@@ -146,10 +273,11 @@ def login_page():
             else:
                 return redirect(url_for('user_dashboard'))
         else:
-            flash("Invalid password", "error")
+            login_email_throttle.failure(email)
+            login_ip_throttle.failure(ip_key)
+            flash(gettext("Invalid password"), "error")
 
-    lang = session.get('lang', 'en')
-    return render_template('login_tl.html' if lang == 'tl' else 'login.html')
+    return render_template('login.html')
 
 
 @app.route('/register', methods=['GET', 'POST'])
@@ -157,41 +285,29 @@ def register_page():
     if request.method == 'POST':
         first_name = request.form['first_name']
         last_name = request.form['last_name']
-        email = request.form['email']
+        email = request.form['email'].strip().lower()
         password = request.form['password']
         confirm_password = request.form['confirm_password']
 
         if password != confirm_password:
-            flash("Passwords do not match", "error")
+            flash(gettext("Passwords do not match"), "error")
             return redirect(url_for('register_page'))
 
         fullname = f"{first_name} {last_name}"
-        conn = get_db()
-        cur = conn.cursor()
         try:
-            cur.execute('''INSERT INTO users (first_name, last_name, fullname, email, password)
-                           VALUES (%s, %s, %s, %s, %s)''',
-                        (first_name, last_name, fullname, email, generate_password_hash(password)))
-            conn.commit()
-
-            cur.execute('SELECT id FROM users WHERE email = %s', (email,))
-            user = cur.fetchone()
-            session['user_id'] = user['id']
+            user_id = repo.create_user(first_name, last_name, email, passwords.hash_password(password))
+        except DuplicateEmail:
+            flash(gettext("Email already exists"), "error")
+        else:
+            session['user_id'] = user_id
             session['role'] = 'user'
             session['fullname'] = fullname
             session['email'] = email
 
-            flash("Registration successful! Please complete your profile.", "info")
+            flash(gettext("Registration successful! Please complete your profile."), "info")
             return redirect(url_for('edit_account'))
 
-        except pymysql.err.IntegrityError:
-            flash("Email already exists", "error")
-        finally:
-            cur.close()
-            conn.close()
-
-    lang = session.get('lang', 'en')
-    return render_template('register_tl.html' if lang == 'tl' else 'register.html')
+    return render_template('register.html')
 
 
 @app.route('/logout')
@@ -206,8 +322,6 @@ def edit_account():
         return redirect(url_for('login_page'))
 
     user_id = session['user_id']
-    conn = get_db()
-    cur = conn.cursor()
 
     if request.method == 'POST':
         first_name = request.form['first_name']
@@ -225,43 +339,19 @@ def edit_account():
         fullname = f"{first_name} {last_name}"
 
         if not validate_contact(contact):
-            flash("Contact number must be 11 digits and start with 09", "error")
-            cur.execute('SELECT * FROM users WHERE id = %s', (user_id,))
-            user = cur.fetchone()
-            cur.close()
-            conn.close()
-            lang = session.get('lang', 'en')
-            return render_template('edit_account_tl.html' if lang == 'tl' else 'edit_account.html', user=user)
-
-        if password:
-            cur.execute('''UPDATE users 
-                           SET first_name=%s, last_name=%s, fullname=%s, contact=%s, email=%s, password=%s, 
-                               birthdate=%s, civil_status=%s, address=%s, fathers_name=%s, mothers_name=%s, birthplace=%s 
-                           WHERE id=%s''',
-                        (first_name, last_name, fullname, contact, email, generate_password_hash(password),
-                         birthdate, civil_status, address, fathers_name, mothers_name, birthplace, user_id))
-        else:
-            cur.execute('''UPDATE users 
-                           SET first_name=%s, last_name=%s, fullname=%s, contact=%s, email=%s, 
-                               birthdate=%s, civil_status=%s, address=%s, fathers_name=%s, mothers_name=%s, birthplace=%s 
-                           WHERE id=%s''',
-                        (first_name, last_name, fullname, contact, email,
-                         birthdate, civil_status, address, fathers_name, mothers_name, birthplace, user_id))
-
-        conn.commit()
+            flash(gettext("Contact number must be 11 digits and start with 09"), "error")
+            return render_template('edit_account.html', user=get_profile(user_id))
+
+        repo.update_user(user_id, dict(
+            first_name=first_name, last_name=last_name, fullname=fullname, contact=contact, email=email,
+            birthdate=birthdate, civil_status=civil_status, address=address,
+            fathers_name=fathers_name, mothers_name=mothers_name, birthplace=birthplace),
+            password_hash=passwords.hash_password(password) if password else None)
         session['fullname'] = fullname
-        flash("Account updated successfully!", "success")
-        cur.close()
-        conn.close()
+        flash(gettext("Account updated successfully!"), "success")
         return redirect(url_for('user_dashboard'))
 
-    cur.execute('SELECT * FROM users WHERE id = %s', (user_id,))
-    user = cur.fetchone()
-    cur.close()
-    conn.close()
-
-    lang = session.get('lang', 'en')
-    return render_template('edit_account_tl.html' if lang == 'tl' else 'edit_account.html', user=user)
+    return render_template('edit_account.html', user=get_profile(user_id))
 
 
 @app.route('/user/dashboard', methods=['GET', 'POST'])
@@ -270,15 +360,14 @@ def user_dashboard():
         return redirect(url_for('login_page'))
 
     user_id = session['user_id']
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute('SELECT * FROM users WHERE id = %s', (user_id,))
-    user = cur.fetchone()
+    user = get_profile(user_id)
+
+    if user is None:
+        session.clear()
+        return redirect(url_for('login_page'))
 
     if not user['birthdate'] or not user['civil_status'] or not user['address']:
-        cur.close()
-        conn.close()
-        flash("Please complete your profile information.", "error")
+        flash(gettext("Please complete your profile information."), "error")
         return redirect(url_for('edit_account'))
 
     if request.method == 'POST':
@@ -289,36 +378,31 @@ def user_dashboard():
         purpose = request.form.get('purpose', '').strip()
 
         if not (doc_type and full_name and address_form and contact and purpose):
-            flash("All fields are required.", "error")
+            flash(gettext("All fields are required."), "error")
         else:
-            cur.execute('''INSERT INTO requests (user_id, full_name, email, document_type, address, contact, purpose, status)
-                           VALUES (%s, %s, %s, %s, %s, %s, %s, %s)''',
-                        (user_id, full_name, session['email'], doc_type, address_form, contact, purpose, 'Pending'))
-            conn.commit()
-            flash("Request submitted successfully!", "success")
-
-        cur.close()
-        conn.close()
+            repo.submit_request(user_id, full_name, session['email'], doc_type, address_form, contact, purpose)
+            flash(gettext("Request submitted successfully!"), "success")
+
         return redirect(url_for('user_dashboard'))
 
-    cur.execute('SELECT COUNT(*) AS total FROM requests WHERE user_id = %s', (user_id,))
-    total = cur.fetchone()['total']
-    cur.execute('SELECT COUNT(*) AS pending FROM requests WHERE user_id = %s AND status = "Pending"', (user_id,))
-    pending = cur.fetchone()['pending']
-    cur.execute('SELECT COUNT(*) AS completed FROM requests WHERE user_id = %s AND status = "Completed"', (user_id,))
-    completed = cur.fetchone()['completed']
+    version = live.version(user_id)
+    etag = live.page_etag(version, session.get('fullname'), user['contact'])
+    not_modified = live.not_modified(etag)
+    if not_modified:
+        return not_modified
 
-    cur.execute('SELECT id, document_type, status, created_at FROM requests WHERE user_id = %s ORDER BY created_at DESC', (user_id,))
-    user_requests = cur.fetchall()
+    counts = repo.status_counts(user_id)
+    total = sum(counts.values())
+    pending = counts.get('Pending', 0)
+    completed = counts.get('Completed', 0)
 
-    cur.close()
-    conn.close()
+    user_requests = repo.user_requests(user_id)
 
-    lang = session.get('lang', 'en')
-    return render_template('user_dashboard_tl.html' if lang == 'tl' else 'user_dashboard.html',
-                           fullname=session.get('fullname'),
-                           total=total, pending=pending, completed=completed,
-                           user_contact=user['contact'] or '', user_requests=user_requests)
+    return live.tag(make_response(render_template('user_dashboard.html',
+                                                  fullname=session.get('fullname'),
+                                                  total=total, pending=pending, completed=completed,
+                                                  user_contact=user['contact'] or '', user_requests=user_requests,
+                                                  live_version=version)), etag)
 
 
 @app.route('/status')
@@ -326,16 +410,15 @@ def status_page():
     if 'user_id' not in session or session.get('role') != 'user':
         return redirect(url_for('login_page'))
 
-    user_id = session['user_id']
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute('SELECT id, document_type, status FROM requests WHERE user_id = %s ORDER BY created_at DESC', (user_id,))
-    requests_list = cur.fetchall()
-    cur.close()
-    conn.close()
+    version = live.version(session['user_id'])
+    etag = live.page_etag(version)
+    not_modified = live.not_modified(etag)
+    if not_modified:
+        return not_modified
 
-    lang = session.get('lang', 'en')
-    return render_template('status_tl.html' if lang == 'tl' else 'status.html', requests=requests_list)
+    requests_list = repo.user_requests(session['user_id'], columns='id, document_type, status')
+
+    return live.tag(make_response(render_template('status.html', requests=requests_list, live_version=version)), etag)
 
 
 @app.route('/admin/dashboard', methods=['GET', 'POST'])
@@ -345,57 +428,39 @@ def admin_dashboard():
 
     search_query = request.args.get('search', '').strip()
     status_filter = request.args.get('status', '').strip()
-    conn = get_db()
-    cur = conn.cursor()
 
     user_info = None
     if request.method == 'POST' and 'view_user' in request.form:
-        user_id_to_view = request.form['user_id']
-        cur.execute('SELECT * FROM users WHERE id = %s', (user_id_to_view,))
-        user_info = cur.fetchone()
-
-    # Request list (for documents)
-    if status_filter:
-         cur.execute('''SELECT r.id, u.fullname, u.email, r.document_type, r.purpose, r.status, r.date_submitted
-                   FROM requests r JOIN users u ON r.user_id = u.id
-                   WHERE r.status = %s ORDER BY r.date_submitted DESC''', (status_filter,))
-    else:
-        cur.execute('''SELECT r.id, u.fullname, u.email, r.document_type, r.purpose, r.status, r.date_submitted
-                    FROM requests r JOIN users u ON r.user_id = u.id ORDER BY r.date_submitted DESC''')
-
-    requests_list = cur.fetchall()
-
-    # Stats
-    cur.execute('SELECT COUNT(*) AS cnt FROM users WHERE role = "user"')
-    total_users = cur.fetchone()['cnt']
-    cur.execute('SELECT COUNT(*) AS cnt FROM requests')
-    total_requests = cur.fetchone()['cnt']
-
-    # Fix: always define users_list regardless of search_query
-    if search_query:
-        cur.execute('''SELECT id, first_name, last_name, fullname, email 
-                       FROM users
-                       WHERE role = "user" 
-                       AND (first_name LIKE %s OR last_name LIKE %s OR fullname LIKE %s)''',
-                    (f'%{search_query}%', f'%{search_query}%', f'%{search_query}%'))
-        users_list = cur.fetchall()
-    else:
-        cur.execute('SELECT id, first_name, last_name, fullname, email FROM users WHERE role = "user"')
-        users_list = cur.fetchall()
+        user_info = repo.user_by_id(request.form['user_id'])
 
-    cur.close()
-    conn.close()
+    limit = page_size(request.args.get('limit'))
+
+    # Request list (for documents), one page at a time, newest first
+    requests_page = repo.request_page(status_filter, after=request.args.get('after'),
+                                      before=request.args.get('before'), limit=limit)
+
+    # Stats (read from the counter tables, not COUNT(*) over requests/users)
+    total_users, status_counts = repo.admin_stats()
+    total_requests = sum(status_counts.values())
+
+    # Registered users: ranked name search, or everyone paginated by id
+    users_page = repo.resident_page(search_query, after=request.args.get('users_after'),
+                                    before=request.args.get('users_before'), limit=limit)
 
-    lang = session.get('lang', 'en')
     return render_template(
-        'admin_dashboard_tl.html' if lang == 'tl' else 'admin_dashboard.html',
-        requests=requests_list,
+        'admin_dashboard.html',
+        requests=requests_page.rows,
+        requests_page=requests_page,
+        status_counts=status_counts,
         total_users=total_users,
         total_requests=total_requests,
-        users=users_list,
+        users=users_page.rows,
+        users_page=users_page,
         user_info=user_info,
         search_query=search_query,
-        status_filter=status_filter
+        status_filter=status_filter,
+        limit=limit,
+        now=datetime.now()
     )
 
 # -------------------------------
@@ -407,46 +472,175 @@ def all_records():
         return redirect(url_for('login_page'))
 
     status_filter = request.args.get('status', '').strip()
-    conn = get_db()
-    cur = conn.cursor()
+    records_page = repo.record_page(status_filter, after=request.args.get('after'),
+                                    before=request.args.get('before'),
+                                    limit=page_size(request.args.get('limit')))
+
+    # Records past the cold-storage horizon live in compressed files now
+    cold_request_id = request.args.get('cold_request_id', '').strip()
+    cold_records = None
+    if cold_request_id.isdigit():
+        cold_records = cold_storage.lookup('request_id', int(cold_request_id))
 
-    if status_filter:
-        cur.execute("SELECT * FROM all_records WHERE status = %s ORDER BY archived_at DESC", (status_filter,))
+    return render_template(
+        'all_records.html',
+        requests=records_page.rows,
+        records_page=records_page,
+        status_filter=status_filter,
+        cold_request_id=cold_request_id,
+        cold_records=cold_records
+    )
+
+
+@app.route('/admin/all-records/restore/<int:record_id>', methods=['POST'])
+def restore_record(record_id):
+    """Bring one record back from cold storage into All Records"""
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return redirect(url_for('login_page'))
+
+    if repo.restore_record(record_id):
+        flash(gettext("Record restored to All Records."), "success")
     else:
-        cur.execute("SELECT * FROM all_records ORDER BY archived_at DESC")
+        flash(gettext("Record not found in cold storage, or already in All Records."), "warning")
+    return redirect(url_for('all_records'))
 
-    requests_list = cur.fetchall()
-    cur.close()
-    conn.close()
+@app.route('/admin/queue')
+def admin_queue():
+    """The admin's claimed requests, and a form to claim the next batch"""
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return redirect(url_for('login_page'))
+
+    return render_template(
+        'admin_queue.html',
+        requests=repo.claimed_requests(session['user_id']),
+        queue_statuses=work_queue.QUEUE_STATUSES,
+        transitions=STATUS_TRANSITIONS,
+        max_claim=work_queue.MAX_CLAIM,
+        lease_minutes=CLAIM_LEASE_SECONDS // 60
+    )
+
+
+@app.route('/admin/queue/claim', methods=['POST'])
+def claim_requests():
+    """Claim the next N unclaimed requests in a status, oldest first"""
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return redirect(url_for('login_page'))
+
+    status = request.form.get('status', 'Pending')
+    if status not in work_queue.QUEUE_STATUSES:
+        flash(gettext("Invalid status"), "error")
+        return redirect(url_for('admin_queue'))
+    try:
+        count = max(1, min(int(request.form.get('count', '5')), work_queue.MAX_CLAIM))
+    except ValueError:
+        count = 5
+
+    claimed = repo.claim_requests(session['user_id'], count, status,
+                                  request.form.get('document_type', '').strip() or None,
+                                  lease_seconds=CLAIM_LEASE_SECONDS)
+    if claimed:
+        flash(gettext("Claimed %(num)s request(s).", num=len(claimed)), "success")
+    else:
+        flash(gettext("No unclaimed requests match."), "warning")
+    return redirect(url_for('admin_queue'))
+
+
+@app.route('/admin/queue/release', methods=['POST'])
+def release_requests():
+    """Hand claimed requests back to the queue (all of them, or the selected ones)"""
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return redirect(url_for('login_page'))
+
+    selected = [int(i) for i in request.form.getlist('request_ids') if i.isdigit()]
+    released = repo.release_claims(session['user_id'], selected or None)
+    flash(gettext("Released %(num)s request(s).", num=released), "success")
+    return redirect(url_for('admin_queue'))
+
+
+@app.route('/admin/reports')
+def admin_reports():
+    """Monthly volume, status mix and turnaround, read from the report rollups"""
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return redirect(url_for('login_page'))
+
+    try:
+        month = datetime.strptime(request.args.get('month', ''), '%Y-%m').date()
+    except ValueError:
+        month = datetime.now().date().replace(day=1)
+    rows, months = repo.monthly_report(month)
 
-    lang = session.get('lang', 'en')
     return render_template(
-        'all_records_tl.html' if lang == 'tl' else 'all_records.html',
-        requests=requests_list
+        'admin_reports.html',
+        rows=rows,
+        months=months,
+        month=month,
+        statuses=VALID_STATUSES,
+        format_hours=reports.format_hours
     )
 
+@app.route('/admin/export/<name>.csv')
+def export_csv(name):
+    """Stream requests or all_records as CSV (?status=&date_from=&date_to=&gzip=1)"""
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return redirect(url_for('login_page'))
+    if name not in export.EXPORTS:
+        return render_template('404.html'), 404
+
+    try:
+        date_from = export.parse_date(request.args.get('date_from', '').strip())
+        date_to = export.parse_date(request.args.get('date_to', '').strip())
+    except ValueError:
+        flash(gettext("Dates must be in YYYY-MM-DD format."), "error")
+        return redirect(url_for('admin_dashboard' if name == 'requests' else 'all_records'))
+
+    gzip = request.args.get('gzip') == '1'
+    sql, params = export.build_query(name, request.args.get('status', '').strip(), date_from, date_to)
+    filename = f"{name}-{datetime.now():%Y%m%d-%H%M%S}.csv" + ('.gz' if gzip else '')
+    return Response(
+        export.stream_csv(backend, sql, params, gzip=gzip),
+        mimetype='application/gzip' if gzip else 'text/csv',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"',
+                 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/admin/certificate/<int:req_id>.pdf')
+def print_certificate(req_id):
+    """The request's certificate as a PDF, from the render cache when this
+    exact certificate was rendered before (see certificates.py)"""
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return redirect(url_for('login_page'))
+
+    rows = repo.certificate_rows(req_ids=[req_id])
+    if not rows:
+        return render_template('404.html'), 404
+    if not certificates.is_printable(rows[0]):
+        flash(gettext("No certificate can be printed for this request yet."), "warning")
+        return redirect(url_for('admin_dashboard'))
+
+    path, _ = certificates.ensure(rows[0])
+    response = send_file(path, mimetype='application/pdf', download_name=f'certificate-{req_id}.pdf',
+                         etag=os.path.basename(path)[:-4], conditional=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
 @app.route('/admin/delete_selected_requests', methods=['POST'])
 def delete_selected_requests():
     """Delete multiple selected requests permanently"""
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return redirect(url_for('login_page'))
+
     selected_ids = request.form.getlist('request_ids')
 
     if not selected_ids:
-        flash("No requests selected for deletion.", "warning")
+        flash(gettext("No requests selected for deletion."), "warning")
         return redirect(url_for('all_records'))
 
-    conn = get_db()
-    cur = conn.cursor()
     try:
-        format_strings = ','.join(['%s'] * len(selected_ids))
-        query = f"DELETE FROM requests WHERE id IN ({format_strings})"
-        cur.execute(query, tuple(selected_ids))
-        conn.commit()
-        flash(f"Successfully deleted {len(selected_ids)} request(s).", "success")
+        deleted = repo.delete_requests(selected_ids)
+        flash(gettext("Successfully deleted %(num)s request(s).", num=deleted), "success")
     except Exception as e:
-        flash(f"Error deleting requests: {str(e)}", "danger")
-    finally:
-        cur.close()
-        conn.close()
+        flash(gettext("Error deleting requests: %(error)s", error=e), "danger")
 
     return redirect(url_for('all_records'))
 
@@ -458,19 +652,11 @@ def delete_selected_records():
     selected_ids = request.form.getlist('record_ids')
 
     if not selected_ids:
-        flash('No records selected for deletion.', 'warning')
+        flash(gettext('No records selected for deletion.'), 'warning')
         return redirect(url_for('all_records'))
 
-    conn = get_db()
-    cur = conn.cursor()
-
-    format_strings = ','.join(['%s'] * len(selected_ids))
-    cur.execute(f"DELETE FROM all_records WHERE id IN ({format_strings})", tuple(selected_ids))
-    conn.commit()
-
-    cur.close()
-    conn.close()
-    flash('Selected records deleted successfully.', 'success')
+    repo.delete_records(selected_ids)
+    flash(gettext('Selected records deleted successfully.'), 'success')
     return redirect(url_for('all_records'))
 
 @app.route('/update_status/<int:req_id>/<status>')
@@ -478,50 +664,92 @@ def update_status(req_id, status):
     if 'user_id' not in session or session.get('role') != 'admin':
         return redirect(url_for('login_page'))
 
-    valid_statuses = ['Pending', 'Processing', 'Verifying', 'Ready to be Claim', 'Completed', 'Rejected']
-    if status not in valid_statuses:
-        flash("Invalid status", "error")
+    if status not in VALID_STATUSES:
+        flash(gettext("Invalid status"), "error")
         return redirect(url_for('admin_dashboard'))
 
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute('UPDATE requests SET status=%s WHERE id=%s', (status, req_id))
-    conn.commit()
-    cur.close()
-    conn.close()
+    back = safe_next_url(request.args.get('next'), url_for('admin_dashboard'))
+    result = repo.transition_requests([req_id], status, STATUS_TRANSITIONS,
+                                      admin_id=session['user_id'])[req_id]
+    if result == 'claimed':
+        flash(gettext("Another admin is working on this request."), "warning")
+    elif result == 'not_found':
+        flash(gettext("Request not found."), "warning")
+    elif result.startswith('invalid_transition'):
+        flash(gettext("A request cannot move from its current status to %(status)s.",
+                      status=gettext(status)), "error")
+    else:
+        flash(gettext("Request status updated to %(status)s!", status=gettext(status)), "success")
+    return redirect(back)
 
-    flash(f"Request status updated to {status}!", "success")
-    return redirect(url_for('admin_dashboard'))
+
+@app.route('/admin/bulk_update_status', methods=['POST'])
+def bulk_update_status():
+    """Move many requests to one status in a single transaction"""
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return redirect(url_for('login_page'))
+
+    status = request.form.get('status', '')
+    wants_json = request.accept_mimetypes.best == 'application/json'
+    back = safe_next_url(request.form.get('next'), url_for('admin_dashboard'))
+    req_ids = []
+    for raw in request.form.getlist('request_ids'):
+        if raw.isdigit() and int(raw) not in req_ids:
+            req_ids.append(int(raw))
+
+    if status not in VALID_STATUSES or not req_ids:
+        if wants_json:
+            return jsonify(error="A valid status and at least one request id are required."), 400
+        flash(gettext("Select at least one request and a valid status."), "error")
+        return redirect(back)
+
+    results = repo.transition_requests(req_ids, status, STATUS_TRANSITIONS, admin_id=session['user_id'])
+    updated = [req_id for req_id, result in results.items() if result == 'updated']
+
+    if wants_json:
+        return jsonify(status=status, updated=len(updated),
+                       results=[{'id': req_id, 'result': result} for req_id, result in results.items()])
+
+    flash(gettext("%(moved)s of %(total)s request(s) moved to %(status)s.",
+                  moved=len(updated), total=len(req_ids), status=gettext(status)),
+          "success" if updated else "warning")
+    skipped = [f"#{req_id} ({result})" for req_id, result in results.items() if result != 'updated']
+    if skipped:
+        flash(gettext("Skipped: %(requests)s", requests=', '.join(skipped)), "warning")
+    return redirect(back)
 
 
 @app.route('/delete_request/<int:req_id>')
 def delete_request(req_id):
-    conn = get_db()
-    cur = conn.cursor()
-
-    # Kunin muna ang request bago burahin
-    cur.execute("SELECT * FROM requests WHERE id = %s", (req_id,))
-    req = cur.fetchone()
-
-    if req:
-        # Insert muna sa all_records table (backup log)
-        cur.execute("""
-            INSERT INTO all_records (request_id, user_id, fullname, document_type, status, date_submitted, archived_at)
-            VALUES (%s, %s, %s, %s, %s, %s, NOW())
-        """, (req['id'], req['user_id'], req['full_name'], req['document_type'], req['status'], req['date_submitted']))
-
-        # Burahin sa main requests table
-        cur.execute("DELETE FROM requests WHERE id = %s", (req_id,))
-        conn.commit()
-        flash("Request has been moved to All Records.", "success")
-    else:
-        flash("Request not found.", "warning")
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return redirect(url_for('login_page'))
 
-    cur.close()
-    conn.close()
+    # Ilipat sa all_records (backup log) at burahin sa main requests table
+    if repo.archive([req_id]):
+        flash(gettext("Request has been moved to All Records."), "success")
+    else:
+        flash(gettext("Request not found."), "warning")
     return redirect(url_for('admin_dashboard'))
 
 
+@app.route('/admin/archive_requests', methods=['POST'])
+def archive_selected_requests():
+    """Move the selected Completed/Rejected requests to All Records"""
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return redirect(url_for('login_page'))
+
+    back = safe_next_url(request.form.get('next'), url_for('admin_dashboard'))
+    selected_ids = [i for i in request.form.getlist('request_ids') if i.isdigit()]
+    if not selected_ids:
+        flash(gettext("No requests selected."), "warning")
+        return redirect(back)
+
+    moved = repo.archive(selected_ids, statuses=ARCHIVABLE_STATUSES)
+    flash(gettext("%(moved)s of %(total)s request(s) moved to All Records "
+                  "(only Completed or Rejected requests are archived).", moved=moved, total=len(selected_ids)),
+          "success" if moved else "warning")
+    return redirect(back)
+
 
 @app.errorhandler(404)
 def page_not_found(e):
@@ -533,20 +761,29 @@ def delete_user(user_id):
     if 'user_id' not in session or session.get('role') != 'admin':
         return redirect(url_for('login_page'))
 
-    conn = get_db()
-    cur = conn.cursor()
     try:
-        cur.execute('DELETE FROM users WHERE id = %s', (user_id,))
-        conn.commit()
-        flash('User deleted successfully!', 'success')
+        repo.delete_user(user_id)
+        flash(gettext('User deleted successfully!'), 'success')
     except Exception as e:
-        flash(f'Error deleting user: {str(e)}', 'danger')
-    finally:
-        cur.close()
-        conn.close()
+        flash(gettext('Error deleting user: %(error)s', error=e), 'danger')
 
     return redirect(url_for('admin_dashboard'))
 
 
+@app.route('/admin/db_pool')
+def db_pool_stats():
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return redirect(url_for('login_page'))
+    return jsonify(backend.stats())
+
+
+@app.route('/admin/cache_stats')
+def cache_stats():
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return redirect(url_for('login_page'))
+    return jsonify(profiles=profile_cache.stats(),
+                   login_email_throttle=login_email_throttle.stats(), login_ip_throttle=login_ip_throttle.stats())
+
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,138 @@
+"""Move finished requests from requests into all_records in bounded chunks.
+
+Each chunk is one transaction: lock up to `chunk_size` request rows by
+primary key, copy them with INSERT ... SELECT, update the status counters
+and DELETE them. A crash mid-chunk rolls the whole chunk back, so re-running the
+sweeper after an interruption simply picks up where it stopped; no row
+is ever archived twice or lost.
+
+Usage (cron / Heroku Scheduler):
+    python archive.py sweep [--older-than-days 90] [--chunk-size 500] [--pause 0.05] [--dry-run]
+"""
+import sys
+import time
+from datetime import datetime, timedelta
+
+import counters
+
+ARCHIVABLE_STATUSES = ('Completed', 'Rejected')
+DEFAULT_CHUNK_SIZE = 500
+
+
+def _archive_chunk(cur, ids, statuses=None):
+    """Lock `ids` by primary key, re-check their status and move them"""
+    placeholders = ','.join(['%s'] * len(ids))
+    sql = f'SELECT id FROM requests WHERE id IN ({placeholders})'
+    params = list(ids)
+    if statuses:
+        sql += f" AND status IN ({','.join(['%s'] * len(statuses))})"
+        params.extend(statuses)
+    cur.execute(sql + ' FOR UPDATE', tuple(params))
+    ids = [row['id'] for row in cur.fetchall()]
+    if not ids:
+        return 0
+
+    placeholders = ','.join(['%s'] * len(ids))
+    groups = counters.lock_request_groups(cur, ids)
+    cur.execute(f'''INSERT INTO all_records (request_id, user_id, fullname, document_type, status, date_submitted, archived_at)
+                    SELECT id, user_id, full_name, document_type, status, date_submitted, %s
+                    FROM requests WHERE id IN ({placeholders})''', (datetime.now().replace(microsecond=0), *ids))
+    cur.execute(f'DELETE FROM requests WHERE id IN ({placeholders})', tuple(ids))
+    deleted = cur.rowcount
+    counters.requests_removed(cur, groups)
+    return deleted
+
+
+def archive_requests(conn, ids, statuses=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Archive the given request ids and return how many rows moved.
+
+    With `statuses`, only requests currently in one of those statuses are
+    moved; the rest are left alone.
+    """
+    ids = sorted({int(i) for i in ids})
+    moved = 0
+    cur = conn.cursor()
+    try:
+        for start in range(0, len(ids), chunk_size):
+            moved += _archive_chunk(cur, ids[start:start + chunk_size], statuses)
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return moved
+
+
+def sweep(conn, older_than_days=90, chunk_size=DEFAULT_CHUNK_SIZE, pause=0.05,
+          dry_run=False, log=print):
+    """Archive every Completed/Rejected request submitted before the cutoff.
+
+    Candidates are found with a plain (non-locking) read, then each chunk
+    is locked by primary key only, re-checked and moved in its own short
+    transaction. An optional pause between chunks keeps admin writes on
+    `requests` from queueing behind the sweeper. Returns (rows_moved, seconds).
+    """
+    placeholders = ','.join(['%s'] * len(ARCHIVABLE_STATUSES))
+    select = f'''SELECT id FROM requests
+                 WHERE status IN ({placeholders})
+                 AND date_submitted < %s
+                 AND id > %s
+                 ORDER BY id LIMIT %s'''
+    cur = conn.cursor()
+    started = time.perf_counter()
+    moved = 0
+    last_id = 0
+    cutoff = datetime.now() - timedelta(days=older_than_days)
+    try:
+        while True:
+            cur.execute(select, (*ARCHIVABLE_STATUSES, cutoff, last_id, chunk_size))
+            ids = [row['id'] for row in cur.fetchall()]
+            conn.commit()
+            if not ids:
+                break
+            last_id = ids[-1]
+            if dry_run:
+                moved += len(ids)
+                continue
+            moved += _archive_chunk(cur, ids, ARCHIVABLE_STATUSES)
+            conn.commit()
+
+            elapsed = time.perf_counter() - started
+            log(f"archived {moved} rows, up to request #{last_id} ({moved / elapsed:.0f} rows/s)")
+            if pause:
+                time.sleep(pause)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return moved, time.perf_counter() - started
+
+
+def main(argv):
+    import argparse
+    from app import get_db
+
+    parser = argparse.ArgumentParser(description='Archive finished requests into all_records')
+    sub = parser.add_subparsers(dest='command', required=True)
+    s = sub.add_parser('sweep')
+    s.add_argument('--older-than-days', type=int, default=90)
+    s.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    s.add_argument('--pause', type=float, default=0.05, help='seconds to sleep between chunks')
+    s.add_argument('--dry-run', action='store_true', help='count matching rows without moving them')
+    args = parser.parse_args(argv[1:])
+
+    conn = get_db()
+    try:
+        moved, seconds = sweep(conn, args.older_than_days, args.chunk_size, args.pause, args.dry_run)
+    finally:
+        conn.close()
+    verb = 'would archive' if args.dry_run else 'archived'
+    rate = moved / seconds if seconds else 0
+    print(f"Done: {verb} {moved} request(s) in {seconds:.1f}s ({rate:.0f} rows/s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
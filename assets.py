@@ -0,0 +1,202 @@
+"""Fingerprinted, precompressed static assets.
+
+`python assets.py build` copies everything under static/ (except uploads)
+into static/dist/ under a content-hashed name, e.g. style.3f9a0c1d2e.css,
+and writes next to it:
+
+  * a .gz twin for text assets (CSS, JS, SVG) when gzip makes them smaller,
+  * resized WebP variants of raster images (needs Pillow),
+  * manifest.json mapping each source name to the files built from it.
+
+url() references inside CSS are rewritten to the fingerprinted names
+before the CSS itself is hashed, so a changed image changes the
+stylesheet's name too.
+
+At runtime asset_url('style.css') is a drop-in for
+url_for('static', filename='style.css'): with a manifest it points at
+/assets/<fingerprinted name>, served with an immutable one-year
+Cache-Control and the .gz twin when the client accepts gzip; without one
+(a fresh checkout) it falls back to the plain static URL.
+
+Usage (run at deploy, see bin/post_compile):
+    python assets.py build
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+import sys
+
+from flask import request, send_from_directory, url_for
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_NAME = 'manifest.json'
+SKIP_DIRS = ('dist', 'uploads')
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt')
+RASTER_IMAGES = ('.jpg', '.jpeg', '.jfif', '.png')
+WEBP_WIDTHS = (480, 960, 1600)
+WEBP_QUALITY = 80
+MAX_AGE = 365 * 24 * 3600
+
+_CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+# .jfif is plain JPEG, but mimetypes does not know the extension
+mimetypes.add_type('image/jpeg', '.jfif')
+
+
+def fingerprint(name, data):
+    """'images/hall.jfif' -> 'images/hall.<10 hex digits>.jfif'"""
+    root, ext = posixpath.splitext(name)
+    return f"{root}.{hashlib.sha256(data).hexdigest()[:10]}{ext}"
+
+
+def _source_files(static_dir):
+    for directory, dirs, files in os.walk(static_dir):
+        if directory == static_dir:
+            dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+        for filename in files:
+            path = os.path.join(directory, filename)
+            yield os.path.relpath(path, static_dir).replace(os.sep, '/'), path
+
+
+def _write(dist_dir, name, data):
+    path = os.path.join(dist_dir, *name.split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def _rewrite_css(name, css, manifest):
+    """Point url() references at the fingerprinted files, relative to the
+    built stylesheet so it works under any URL prefix"""
+    def replace(match):
+        ref = match.group(2)
+        if ref.startswith(('data:', 'http:', 'https:', '//', '#')):
+            return match.group(0)
+        target = posixpath.normpath(posixpath.join('/static', posixpath.dirname(name), ref))
+        entry = manifest.get(target[len('/static/'):]) if target.startswith('/static/') else None
+        if entry is None:
+            return match.group(0)
+        return f'url("{posixpath.relpath(entry["path"], posixpath.dirname(name) or ".")}")'
+    return _CSS_URL.sub(replace, css)
+
+
+def _webp_variants(name, path, dist_dir, built_name):
+    """Write resized WebP copies of an image; return [[width, name], ...]"""
+    try:
+        from PIL import Image
+    except ImportError:
+        print(f"  skipping WebP for {name}: Pillow is not installed")
+        return []
+    variants = []
+    with Image.open(path) as image:
+        image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        for width in [w for w in WEBP_WIDTHS if w < image.width] or [image.width]:
+            resized = image if width == image.width else image.resize(
+                (width, round(image.height * width / image.width)), Image.LANCZOS)
+            variant = f"{posixpath.splitext(built_name)[0]}.{width}w.webp"
+            out = os.path.join(dist_dir, *variant.split('/'))
+            resized.save(out, 'WEBP', quality=WEBP_QUALITY, method=6)
+            variants.append([width, variant])
+    return variants
+
+
+def build(static_dir=STATIC_DIR, dist_dir=DIST_DIR):
+    """Rebuild dist_dir from scratch and return the manifest"""
+    if os.path.isdir(dist_dir):
+        shutil.rmtree(dist_dir)
+    os.makedirs(dist_dir)
+
+    manifest = {}
+    # Stylesheets last, so their url()s can be rewritten to built names.
+    sources = sorted(_source_files(static_dir), key=lambda s: (s[0].endswith('.css'), s[0]))
+    for name, path in sources:
+        with open(path, 'rb') as f:
+            data = f.read()
+        ext = posixpath.splitext(name)[1].lower()
+        if ext == '.css':
+            data = _rewrite_css(name, data.decode('utf-8'), manifest).encode('utf-8')
+
+        built = fingerprint(name, data)
+        _write(dist_dir, built, data)
+        entry = {'path': built, 'size': len(data)}
+
+        if ext in COMPRESSIBLE:
+            packed = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(packed) < len(data):
+                _write(dist_dir, built + '.gz', packed)
+                entry['gzip'] = len(packed)
+        if ext in RASTER_IMAGES:
+            entry['webp'] = _webp_variants(name, path, dist_dir, built)
+
+        manifest[name] = entry
+        notes = [f"{len(data)} B"]
+        if 'gzip' in entry:
+            notes.append(f"gzip {entry['gzip']} B")
+        notes.extend(f"{width}w.webp" for width, _ in entry.get('webp', []))
+        print(f"  {name} -> {built} ({', '.join(notes)})")
+
+    with open(os.path.join(dist_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.write('\n')
+    return manifest
+
+
+def load_manifest(dist_dir=DIST_DIR):
+    try:
+        with open(os.path.join(dist_dir, MANIFEST_NAME), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def init_app(app, dist_dir=DIST_DIR):
+    manifest = load_manifest(dist_dir)
+    gzipped = {entry['path'] for entry in manifest.values() if 'gzip' in entry}
+
+    def asset_url(filename, **values):
+        entry = manifest.get(filename)
+        if entry is None:
+            return url_for('static', filename=filename, **values)
+        return url_for('assets', filename=entry['path'], **values)
+
+    def asset_srcset(filename):
+        """srcset of the WebP variants, or '' when none were built"""
+        entry = manifest.get(filename) or {}
+        return ', '.join(f"{url_for('assets', filename=path)} {width}w"
+                         for width, path in entry.get('webp', []))
+
+    @app.route('/assets/<path:filename>')
+    def assets(filename):
+        encoded = filename in gzipped and 'gzip' in request.accept_encodings
+        mimetype = mimetypes.guess_type(filename)[0]
+        response = send_from_directory(dist_dir, filename + '.gz' if encoded else filename,
+                                       mimetype=mimetype, max_age=MAX_AGE)
+        if encoded:
+            response.headers['Content-Encoding'] = 'gzip'
+        if filename in gzipped:
+            response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    app.jinja_env.globals.update(asset_url=asset_url, asset_srcset=asset_srcset)
+
+
+def main(argv):
+    if len(argv) < 2 or argv[1] != 'build':
+        print(__doc__)
+        return 2
+    manifest = build()
+    print(f"Built {len(manifest)} asset(s) into {os.path.relpath(DIST_DIR)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,295 @@
+"""Storage backends: where connections come from and the SQL dialect they speak.
+
+The application SQL is written once, in MySQL's pymysql style (`%s`
+placeholders, `... FOR UPDATE` for locking reads). Each backend hands out
+connections that accept that SQL:
+
+  * MySQLBackend wraps the db_pool.ConnectionPool.
+  * SQLiteBackend keeps one connection per thread to a local database
+    file in WAL mode, so readers never block the writer and there is no
+    network round-trip at all. Its cursors translate `%s` to `?`, return
+    dict rows, and turn a locking read (or the first write) into
+    BEGIN IMMEDIATE, which takes SQLite's single write lock up front the
+    way SELECT ... FOR UPDATE takes row locks in InnoDB.
+
+The few statements that cannot be written portably ask the connection or
+cursor for its `dialect` (see dialect_of()).
+"""
+import re
+import sqlite3
+import threading
+from datetime import date, datetime
+
+MYSQL = 'mysql'
+SQLITE = 'sqlite'
+
+# journal_mode=WAL persists in the file; the rest are per connection.
+SQLITE_PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),      # fsync at checkpoints only; safe with WAL
+    ('foreign_keys', 'ON'),
+    ('busy_timeout', '5000'),       # ms to wait for the write lock
+    ('cache_size', '-32000'),       # 32 MB page cache
+    ('temp_store', 'MEMORY'),
+    ('mmap_size', '268435456'),     # 256 MB of the file memory-mapped
+)
+
+_FOR_UPDATE = re.compile(r'\s+FOR\s+UPDATE(\s+SKIP\s+LOCKED)?\s*$', re.I)
+_READ_ONLY = re.compile(r'^\s*(SELECT|WITH|EXPLAIN|PRAGMA)\b', re.I)
+
+
+def dialect_of(conn_or_cursor):
+    """'mysql' or 'sqlite' for a connection or cursor from either backend"""
+    return getattr(conn_or_cursor, 'dialect', MYSQL)
+
+
+def integrity_error(conn_or_cursor):
+    """The driver's IntegrityError (duplicate key, failed constraint)"""
+    if dialect_of(conn_or_cursor) == SQLITE:
+        return sqlite3.IntegrityError
+    import pymysql
+
+    return pymysql.err.IntegrityError
+
+
+def upsert_add_sql(cur, table, key_columns, value_column):
+    """INSERT that adds to `value_column` when the key already exists"""
+    columns = ', '.join(key_columns + (value_column,))
+    placeholders = ', '.join(['%s'] * (len(key_columns) + 1))
+    sql = f'INSERT INTO {table} ({columns}) VALUES ({placeholders})'
+    if dialect_of(cur) == SQLITE:
+        return (sql + f" ON CONFLICT ({', '.join(key_columns)}) "
+                f"DO UPDATE SET {value_column} = {value_column} + excluded.{value_column}")
+    return sql + f' ON DUPLICATE KEY UPDATE {value_column} = {value_column} + VALUES({value_column})'
+
+
+def nocase(cur, column):
+    """`column` for a case-insensitive comparison. MySQL's default
+    collation already is one; SQLite needs COLLATE NOCASE, which uses an
+    index declared the same way (idx_users_email_nocase)."""
+    if dialect_of(cur) == SQLITE:
+        return f'{column} COLLATE NOCASE'
+    return column
+
+
+def prefix_match(cur, column, prefix):
+    """(condition, param) for "`column` starts with `prefix`" that can use
+    an index on `column`. SQLite's LIKE is case-insensitive and so skips a
+    plain index; its case-sensitive GLOB does not."""
+    if dialect_of(cur) == SQLITE:
+        return f'{column} GLOB %s', prefix + '*'
+    return f'{column} LIKE %s', prefix + '%'
+
+
+# ==================== MYSQL ====================
+
+class MySQLBackend:
+    dialect = MYSQL
+
+    def __init__(self, pool):
+        import pymysql
+
+        self.pool = pool
+        self.IntegrityError = pymysql.err.IntegrityError
+
+    def acquire(self):
+        return self.pool.acquire()
+
+    def release(self, conn):
+        self.pool.release(conn)
+
+    def discard(self, conn):
+        self.pool.discard(conn)
+
+    def streaming_cursor(self, conn):
+        """Unbuffered cursor: rows are read off the socket as they are fetched"""
+        from pymysql.cursors import SSCursor
+
+        return conn.cursor(SSCursor)
+
+    def close_all(self):
+        """Close idle connections, e.g. in gunicorn's master before it forks
+        workers that must not share its sockets"""
+        self.pool.close_all()
+
+    def saturated(self):
+        stats = self.pool.stats()
+        return stats['waiting'] > 0 and stats['checked_out'] >= stats['max_size']
+
+    def stats(self):
+        return dict(self.pool.stats(), backend=self.dialect)
+
+
+# ==================== SQLITE ====================
+
+def _adapt_datetime(value):
+    # Microseconds only when present, as MySQL prints TIMESTAMP(6) values.
+    return value.isoformat(' ')
+
+
+def _convert_timestamp(value):
+    return datetime.fromisoformat(value.decode())
+
+
+def _convert_date(value):
+    return date.fromisoformat(value.decode())
+
+
+# TIMESTAMP and DATE columns round-trip as datetime / date, like pymysql
+# returns them (and without sqlite3's deprecated default adapters).
+sqlite3.register_adapter(datetime, _adapt_datetime)
+sqlite3.register_converter('TIMESTAMP', _convert_timestamp)
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_converter('DATE', _convert_date)
+
+
+def _dict_row(cursor, row):
+    return {col[0]: value for col, value in zip(cursor.description, row)}
+
+
+class SQLiteCursor:
+    """pymysql-style cursor over sqlite3: %s placeholders, dict rows
+    (tuples with dict_rows=False, like pymysql's plain Cursor/SSCursor)"""
+
+    dialect = SQLITE
+
+    def __init__(self, conn, dict_rows=True):
+        self.connection = conn
+        self._cursor = conn._raw.cursor()
+        if not dict_rows:
+            self._cursor.row_factory = None
+
+    def _prepare(self, sql):
+        sql, locking = _FOR_UPDATE.subn('', sql)
+        if (locking or not _READ_ONLY.match(sql)) and not self.connection._raw.in_transaction:
+            self._cursor.execute('BEGIN IMMEDIATE')
+        return sql.replace('%s', '?')
+
+    def execute(self, sql, args=None):
+        self._cursor.execute(self._prepare(sql), tuple(args) if args is not None else ())
+        return self._cursor.rowcount
+
+    def executemany(self, sql, args):
+        self._cursor.executemany(self._prepare(sql), [tuple(a) for a in args])
+        return self._cursor.rowcount
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=None):
+        return self._cursor.fetchmany(size or self._cursor.arraysize)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """Per-thread connection with the same close()/request_scoped
+    contract as db_pool.PooledConnection"""
+
+    dialect = SQLITE
+
+    def __init__(self, backend, raw):
+        self._backend = backend
+        self._raw = raw
+        self.request_scoped = False
+
+    def cursor(self, dict_rows=True):
+        cur = SQLiteCursor(self, dict_rows)
+        wrapper = self._backend.cursor_wrapper
+        return wrapper(cur) if wrapper else cur
+
+    def commit(self):
+        if self._raw.in_transaction:
+            self._raw.execute('COMMIT')
+
+    def rollback(self):
+        if self._raw.in_transaction:
+            self._raw.execute('ROLLBACK')
+
+    def in_transaction(self):
+        return self._raw.in_transaction
+
+    def close(self):
+        if not self.request_scoped:
+            self._backend.release(self)
+
+
+class SQLiteBackend:
+    dialect = SQLITE
+    IntegrityError = sqlite3.IntegrityError
+
+    def __init__(self, path, cursor_wrapper=None, pragmas=SQLITE_PRAGMAS):
+        self.path = path
+        self.cursor_wrapper = cursor_wrapper
+        self.pragmas = pragmas
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._rolled_back = 0
+
+    def _connect(self):
+        # isolation_level=None: no implicit BEGINs; SQLiteCursor starts
+        # transactions itself, so plain reads never hold a snapshot open.
+        raw = sqlite3.connect(self.path, isolation_level=None, detect_types=sqlite3.PARSE_DECLTYPES)
+        raw.row_factory = _dict_row
+        for name, value in self.pragmas:
+            raw.execute(f'PRAGMA {name} = {value}')
+        with self._lock:
+            self._opened += 1
+        return SQLiteConnection(self, raw)
+
+    def acquire(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def release(self, conn):
+        """Roll back anything the caller left uncommitted; the connection
+        itself stays open for the thread's next request"""
+        conn.request_scoped = False
+        if conn.in_transaction():
+            conn.rollback()
+            with self._lock:
+                self._rolled_back += 1
+
+    discard = release
+
+    def close_all(self):
+        """Close the calling thread's connection (see MySQLBackend.close_all)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = None
+            conn._raw.close()
+
+    def saturated(self):
+        return False
+
+    def streaming_cursor(self, conn):
+        # sqlite3 cursors already step through the result lazily; tuple rows
+        # match what SSCursor returns.
+        return conn.cursor(dict_rows=False)
+
+    def stats(self):
+        with self._lock:
+            return {'backend': self.dialect, 'path': self.path, 'opened': self._opened,
+                    'rolled_back': self._rolled_back}
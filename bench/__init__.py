@@ -0,0 +1,9 @@
+"""Reproducible load tests for the Barangay e-Document app.
+
+    seed.py       deterministic residents / requests / archived records
+    scenarios.py  the user journeys that are timed (login, dashboards, ...)
+    runner.py     drives the scenarios concurrently and summarises latency
+    compare.py    diffs two result files and flags regressions
+
+See bench/__main__.py for the command line.
+"""
@@ -0,0 +1,130 @@
+"""Load-test command line.
+
+Point DB_* (or DB_BACKEND=sqlite with SQLITE_PATH) at a scratch database
+first; seeding only adds (and --reset only deletes) accounts under the
+loadtest.invalid domain.
+
+Usage:
+    python -m bench seed [--residents 1000] [--requests 5000] [--records 2000] [--seed 42] [--reset]
+    python -m bench run [--url http://127.0.0.1:8000 | --in-process] [--users 8] [--admins 2]
+                        [--duration 30] [--warmup 5] [--seed 42] [--out bench/results/<commit>.json]
+    python -m bench compare BASE.json NEW.json [--threshold 0.10]
+    python -m bench claims [--admins 16] [--batch 5] [--status Pending]
+    python -m bench startup [--runs 3] [--port 8190]
+
+`run` against --url expects the server to be up already, e.g.
+    gunicorn -w 4 -b 127.0.0.1:8000 app:app
+`compare` exits with status 1 when any route regressed; `claims` (the
+work-queue contention check, see bench/claims.py) when any request was
+claimed twice, left behind, or waited on a row lock. `startup` boots
+gunicorn bare and with gunicorn.conf.py and compares boot time and
+first-request latency (see bench/startup.py); it needs no seeded data.
+"""
+import os
+import sys
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def main(argv):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='python -m bench', description='Seed, load-test and compare')
+    sub = parser.add_subparsers(dest='command', required=True)
+    s = sub.add_parser('seed')
+    s.add_argument('--residents', type=int, default=1000)
+    s.add_argument('--requests', type=int, default=5000)
+    s.add_argument('--records', type=int, default=2000)
+    s.add_argument('--seed', type=int, default=42)
+    s.add_argument('--reset', action='store_true', help='delete previously seeded accounts first')
+    r = sub.add_parser('run')
+    target = r.add_mutually_exclusive_group()
+    target.add_argument('--url', default='http://127.0.0.1:8000')
+    target.add_argument('--in-process', action='store_true', help="use Flask's test client, no server")
+    r.add_argument('--users', type=int, default=8, help='concurrent residents')
+    r.add_argument('--admins', type=int, default=2, help='concurrent admins')
+    r.add_argument('--duration', type=float, default=30.0, help='measured seconds')
+    r.add_argument('--warmup', type=float, default=5.0, help='seconds discarded before measuring')
+    r.add_argument('--seed', type=int, default=42)
+    r.add_argument('--out')
+    c = sub.add_parser('compare')
+    c.add_argument('base')
+    c.add_argument('new')
+    c.add_argument('--threshold', type=float, default=0.10, help='allowed fractional change')
+    q = sub.add_parser('claims')
+    q.add_argument('--admins', type=int, default=16, help='concurrent simulated admins')
+    q.add_argument('--batch', type=int, default=5, help='requests per claim')
+    q.add_argument('--status', default='Pending')
+    st = sub.add_parser('startup')
+    st.add_argument('--runs', type=int, default=3, help='boots per profile (the median is reported)')
+    st.add_argument('--port', type=int, default=8190)
+    args = parser.parse_args(argv[1:])
+
+    if args.command == 'compare':
+        from bench.compare import compare, load, print_report
+
+        base, new = load(args.base), load(args.new)
+        rows, regressions = compare(base, new, args.threshold)
+        print_report(base, new, rows, regressions, args.threshold)
+        return 1 if regressions else 0
+
+    if args.command == 'startup':
+        from bench import startup
+
+        startup.print_report(startup.run(args.runs, args.port))
+        return 0
+
+    from app import app, backend, get_db
+    from bench import runner, scenarios, seed
+
+    if args.command == 'claims':
+        from app import repo
+        from bench import claims
+
+        result = claims.run(repo, get_db, args.admins, args.batch, args.status)
+        claims.print_report(result)
+        return 0 if result['ok'] else 1
+
+    conn = get_db()
+    try:
+        if args.command == 'seed':
+            if args.reset:
+                print(f"Removed {seed.clear(conn)} previously seeded account(s).")
+            elif seed.dataset(conn)['residents']:
+                print("The database is already seeded; pass --reset to replace the seeded data.")
+                return 2
+            counts = seed.seed(conn, args.residents, args.requests, args.records, args.seed)
+            print(f"Seeded {counts['residents']} residents, {counts['requests']} requests, "
+                  f"{counts['records']} archived records (password: {seed.PASSWORD}).")
+            return 0
+        dataset = seed.dataset(conn)
+    finally:
+        conn.close()
+    if not dataset['residents']:
+        print("No seeded residents found; run `python -m bench seed` first.")
+        return 2
+
+    if args.in_process:
+        target = 'in-process'
+        make_client = lambda: scenarios.FlaskClient(app)  # noqa: E731
+    else:
+        target = args.url
+        make_client = lambda: scenarios.HttpClient(args.url)  # noqa: E731
+    options = {'users': args.users, 'admins': args.admins, 'duration': args.duration,
+               'warmup': args.warmup, 'seed': args.seed, 'backend': backend.dialect}
+    print(f"Running {args.users} resident(s) + {args.admins} admin(s) against {target} "
+          f"for {args.warmup:g}s warm-up + {args.duration:g}s...")
+    samples, seconds = runner.run(make_client, dataset['residents'], args.users, args.admins,
+                                  args.duration, args.warmup, args.seed)
+    routes = runner.summarize(samples, seconds)
+    runner.print_table(routes)
+
+    data = runner.result(routes, seconds, target, dataset, options)
+    out = args.out or os.path.join(RESULTS_DIR, f"{data['commit']}-{data['created_at'][:19].replace(':', '')}.json")
+    runner.save(data, out)
+    print(f"Saved {out}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
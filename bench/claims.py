@@ -0,0 +1,123 @@
+"""Work-queue contention check: many simulated admins claiming at once.
+
+Every simulated admin (a thread with its own connection and an admin id
+no real account has) starts on the same barrier and keeps claiming
+batches from the Pending queue until it comes back empty, holding every
+claim. Afterwards each request must have been handed to exactly one
+admin, and the queue must be drained. On MySQL the InnoDB row-lock wait
+counter is read before and after; SKIP LOCKED should leave it unchanged.
+All simulated claims are released at the end.
+"""
+import threading
+import time
+from datetime import datetime
+
+from backends import MYSQL
+
+FIRST_ADMIN_ID = 900000
+
+
+def _lock_waits(conn):
+    if conn.dialect != MYSQL:
+        return None
+    cur = conn.cursor()
+    try:
+        cur.execute("SHOW GLOBAL STATUS LIKE 'Innodb_row_lock_waits'")
+        return int(cur.fetchone()['Value'])
+    finally:
+        cur.close()
+        conn.commit()
+
+
+def _unclaimed(conn, status):
+    cur = conn.cursor()
+    try:
+        cur.execute('SELECT COUNT(*) AS n FROM requests WHERE status = %s AND (claimed_by IS NULL OR claim_expires_at <= %s)',
+                    (status, datetime.now()))
+        return cur.fetchone()['n']
+    finally:
+        cur.close()
+        conn.commit()
+
+
+def run(repo, connect, admins=16, batch=5, status='Pending', log=print):
+    """Returns a dict of results; 'ok' is False on any double assignment,
+    undrained queue or error"""
+    conn = connect()
+    try:
+        available = _unclaimed(conn, status)
+        waits_before = _lock_waits(conn)
+    finally:
+        conn.close()
+    log(f"{admins} admin(s) claiming {batch} at a time from {available} unclaimed {status} request(s)...")
+
+    barrier = threading.Barrier(admins)
+    claimed = {}            # admin id -> [request ids]
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def admin(admin_id):
+        mine, timings = [], []
+        try:
+            barrier.wait()
+            while True:
+                started = time.perf_counter()
+                ids = repo.claim_requests(admin_id, batch, status, lease_seconds=3600)
+                timings.append(time.perf_counter() - started)
+                if not ids:
+                    break
+                mine.extend(ids)
+        except Exception as e:  # reported below, not swallowed
+            errors.append(f"admin {admin_id}: {e!r}")
+        with lock:
+            claimed[admin_id] = mine
+            latencies.extend(timings)
+
+    threads = [threading.Thread(target=admin, args=(FIRST_ADMIN_ID + i,)) for i in range(admins)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    seconds = time.perf_counter() - started
+
+    conn = connect()
+    try:
+        waits_after = _lock_waits(conn)
+        left = _unclaimed(conn, status)
+    finally:
+        conn.close()
+    for admin_id in claimed:
+        repo.release_claims(admin_id)
+
+    owners = {}
+    for admin_id, ids in claimed.items():
+        for req_id in ids:
+            owners.setdefault(req_id, []).append(admin_id)
+    doubles = {req_id: who for req_id, who in owners.items() if len(who) > 1}
+    latencies.sort()
+
+    def pct(q):
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else 0.0
+
+    lock_waits = None if waits_before is None else waits_after - waits_before
+    return {
+        'ok': not doubles and not errors and left == 0 and not lock_waits,
+        'admins': admins, 'batch': batch, 'available': available, 'claimed': len(owners),
+        'double_assigned': len(doubles), 'left_unclaimed': left, 'errors': errors,
+        'claims': len(latencies), 'seconds': seconds, 'p50_ms': pct(0.5), 'p99_ms': pct(0.99),
+        'max_ms': latencies[-1] * 1000 if latencies else 0.0, 'lock_waits': lock_waits,
+    }
+
+
+def print_report(r):
+    waits = 'n/a (SQLite serialises writers)' if r['lock_waits'] is None else r['lock_waits']
+    print(f"Claimed {r['claimed']}/{r['available']} in {r['claims']} claim(s) over {r['seconds']:.2f}s; "
+          f"{r['left_unclaimed']} left unclaimed")
+    print(f"Claim latency p50 {r['p50_ms']:.1f} ms, p99 {r['p99_ms']:.1f} ms, max {r['max_ms']:.1f} ms; "
+          f"InnoDB row-lock waits: {waits}")
+    print(f"Double-assigned requests: {r['double_assigned']}")
+    for error in r['errors']:
+        print(f"ERROR {error}")
+    print('OK' if r['ok'] else 'FAILED')
@@ -0,0 +1,62 @@
+"""Compare two load-test result files and flag regressions.
+
+A route regresses when its p50/p95/p99 latency grows, or its throughput
+drops, by more than `threshold` (a fraction, 0.10 = 10%), or when it
+starts returning errors. Routes with fewer than MIN_SAMPLES requests in
+either run are reported but never flagged; their percentiles are noise.
+"""
+import json
+
+LATENCY_KEYS = ('p50_ms', 'p95_ms', 'p99_ms')
+MIN_SAMPLES = 20
+
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _change(old, new):
+    if not old:
+        return 0.0
+    return (new - old) / old
+
+
+def compare(base, new, threshold=0.10):
+    """Return (rows, regressions) where rows are per-route deltas and
+    regressions is a list of (route, reason) strings"""
+    rows, regressions = [], []
+    for route in sorted(set(base['routes']) | set(new['routes'])):
+        old, cur = base['routes'].get(route), new['routes'].get(route)
+        if old is None or cur is None:
+            rows.append((route, old, cur, {}))
+            continue
+        changes = {key: _change(old[key], cur[key]) for key in LATENCY_KEYS + ('rps',)}
+        rows.append((route, old, cur, changes))
+        if min(old['count'], cur['count']) < MIN_SAMPLES:
+            continue
+        for key in LATENCY_KEYS:
+            if changes[key] > threshold:
+                regressions.append((route, f"{key} {old[key]:.2f} -> {cur[key]:.2f} ({changes[key]:+.0%})"))
+        if changes['rps'] < -threshold:
+            regressions.append((route, f"rps {old['rps']:.1f} -> {cur['rps']:.1f} ({changes['rps']:+.0%})"))
+        if cur['errors'] > old['errors']:
+            regressions.append((route, f"errors {old['errors']} -> {cur['errors']}"))
+    return rows, regressions
+
+
+def print_report(base, new, rows, regressions, threshold):
+    print(f"base {base['commit']} ({base['created_at']})  vs  new {new['commit']} ({new['created_at']})")
+    if base.get('dataset') != new.get('dataset') or base.get('options') != new.get('options'):
+        print("WARNING: the runs used different data sets or options; deltas may not be comparable")
+    print(f"{'route':<26}{'p50 ms':>16}{'p95 ms':>16}{'p99 ms':>16}{'rps':>14}")
+    for route, old, cur, changes in rows:
+        if not changes:
+            print(f"{route:<26}  only in {'new' if old is None else 'base'} run")
+            continue
+        cells = ''.join(f"{cur[k]:>9.2f} {changes[k]:>+5.0%}" for k in LATENCY_KEYS)
+        print(f"{route:<26}{cells}{cur['rps']:>8.1f} {changes['rps']:>+5.0%}")
+    for route, reason in regressions:
+        print(f"REGRESSION {route}: {reason}")
+    if not regressions:
+        print(f"No regressions beyond {threshold:.0%}.")
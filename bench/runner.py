@@ -0,0 +1,110 @@
+"""Run the scenario mix with N concurrent virtual users and summarise it.
+
+Each virtual user logs in once, then loops: pick a scenario from its
+role's mix, run it. Samples taken during the warm-up are thrown away.
+Every virtual user has its own RNG derived from --seed, so two runs issue
+the same sequence of requests (timing aside).
+"""
+import json
+import os
+import platform
+import random
+import subprocess
+import threading
+import time
+from datetime import datetime, timezone
+
+from bench import scenarios
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(p / 100.0 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(samples, seconds):
+    """samples: (label, elapsed, ok) -> per-label and total statistics"""
+    by_label = {}
+    for label, elapsed, ok in samples:
+        by_label.setdefault(label, []).append((elapsed, ok))
+    by_label['TOTAL'] = [(elapsed, ok) for _, elapsed, ok in samples]
+
+    routes = {}
+    for label, values in sorted(by_label.items()):
+        latencies = sorted(v[0] * 1000 for v in values)
+        routes[label] = {
+            'count': len(values),
+            'errors': sum(1 for v in values if not v[1]),
+            'rps': round(len(values) / seconds, 2) if seconds else 0.0,
+            'mean_ms': round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'max_ms': round(latencies[-1], 3) if latencies else 0.0,
+        }
+    return routes
+
+
+def git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+        return out.stdout.strip() or 'unknown'
+    except (OSError, subprocess.SubprocessError):
+        return 'unknown'
+
+
+def run(make_client, residents, users=8, admins=2, duration=30.0, warmup=5.0, seed=42):
+    """Drive the mix and return (samples, measured_seconds)"""
+    samples = []
+    lock = threading.Lock()
+    start = time.perf_counter()
+    measure_from = start + warmup
+    stop_at = measure_from + duration
+
+    def virtual_user(n, role):
+        rng = random.Random(f'{seed}:{role}:{n}')
+        session = scenarios.Session(make_client(), role, rng.randrange(residents) if role == 'user' else None)
+        session.login()
+        while time.perf_counter() < stop_at:
+            scenarios.pick(rng, role)(session, rng)
+        with lock:
+            samples.extend(s[:3] for s in session.samples if s[3] >= measure_from)
+
+    threads = [threading.Thread(target=virtual_user, args=(n, 'user'), daemon=True) for n in range(users)]
+    threads += [threading.Thread(target=virtual_user, args=(n, 'admin'), daemon=True) for n in range(admins)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return samples, time.perf_counter() - measure_from
+
+
+def result(routes, seconds, target, dataset, options):
+    return {
+        'commit': git_commit(),
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'target': target,
+        'dataset': dataset,
+        'options': options,
+        'seconds': round(seconds, 2),
+        'routes': routes,
+    }
+
+
+def save(data, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def print_table(routes):
+    print(f"{'route':<26}{'count':>8}{'err':>6}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for label, r in routes.items():
+        print(f"{label:<26}{r['count']:>8}{r['errors']:>6}{r['rps']:>9.1f}"
+              f"{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}")
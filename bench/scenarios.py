@@ -0,0 +1,141 @@
+"""The user journeys a load test times, and the clients that run them.
+
+A scenario is a function (session, rng) that issues one timed request
+through `session.timed(label, method, path, data)`. The label, not the
+URL, is what results are grouped by, so `admin_dashboard?search=...` and
+the plain dashboard are reported separately.
+
+Two clients are available: HttpClient talks to a running server (e.g.
+gunicorn) over HTTP; FlaskClient drives the app in-process through
+Flask's test client, which needs no server but shares this process's GIL.
+"""
+import http.cookiejar
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from resident_search import BENCH_LAST_NAMES
+
+from bench.seed import ADMIN_EMAIL, DOCUMENT_WEIGHTS, PASSWORD, PURPOSES, STATUS_WEIGHTS, resident_email
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpClient:
+    """Cookie-keeping HTTP client that does not follow redirects, so a
+    login POST is timed on its own and not together with the dashboard"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect)
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, method=method)
+        try:
+            with self.opener.open(req, timeout=30) as resp:
+                resp.read()
+                return resp.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+
+class FlaskClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        return self.client.open(path, method=method, data=data).status_code
+
+
+class Session:
+    """One virtual user: a client plus the (label, seconds, ok, started)
+    samples it has recorded"""
+
+    def __init__(self, client, role, user_n=None):
+        self.client = client
+        self.role = role
+        self.user_n = user_n
+        self.samples = []
+
+    def timed(self, label, method, path, data=None):
+        started = time.perf_counter()
+        try:
+            status = self.client.request(method, path, data)
+        except Exception:
+            status = 0
+        elapsed = time.perf_counter() - started
+        # Redirects are the normal answer to a login or form POST.
+        self.samples.append((label, elapsed, 0 < status < 400, started))
+        return status
+
+    def login(self):
+        email = ADMIN_EMAIL if self.role == 'admin' else resident_email(self.user_n)
+        return self.timed('login', 'POST', '/login', {'email': email, 'password': PASSWORD})
+
+
+# ==================== SCENARIOS ====================
+
+def login(session, rng):
+    session.login()
+
+
+def user_dashboard(session, rng):
+    session.timed('user_dashboard', 'GET', '/user/dashboard')
+
+
+def submit_request(session, rng):
+    session.timed('submit_request', 'POST', '/user/dashboard', {
+        'document_type': rng.choices(list(DOCUMENT_WEIGHTS), weights=list(DOCUMENT_WEIGHTS.values()))[0],
+        'full_name': f'Resident {session.user_n}',
+        'address': 'Purok 1, San Isidro, Sapac, Lipa City',
+        'contact': '09171234567',
+        'purpose': rng.choice(PURPOSES),
+    })
+
+
+def status(session, rng):
+    session.timed('status', 'GET', '/status')
+
+
+def admin_dashboard(session, rng):
+    session.timed('admin_dashboard', 'GET', '/admin/dashboard')
+
+
+def admin_search(session, rng):
+    query = rng.choice(BENCH_LAST_NAMES)
+    session.timed('admin_dashboard?search', 'GET', '/admin/dashboard?' + urllib.parse.urlencode(
+        {'search': query[:rng.randint(3, len(query))]}))
+
+
+def admin_filter(session, rng):
+    session.timed('admin_dashboard?status', 'GET', '/admin/dashboard?' + urllib.parse.urlencode(
+        {'status': rng.choice(list(STATUS_WEIGHTS))}))
+
+
+def all_records(session, rng):
+    session.timed('all_records', 'GET', '/admin/all-records')
+
+
+def all_records_filter(session, rng):
+    session.timed('all_records?status', 'GET', '/admin/all-records?status=' + rng.choice(['Completed', 'Rejected']))
+
+
+# (scenario, weight) per role. Residents mostly read; a few submit and a
+# few log in again, which is where password hashing shows up.
+MIXES = {
+    'user': [(user_dashboard, 40), (status, 30), (submit_request, 10), (login, 5)],
+    'admin': [(admin_dashboard, 30), (admin_search, 20), (admin_filter, 15),
+              (all_records, 10), (all_records_filter, 5), (login, 2)],
+}
+
+
+def pick(rng, role):
+    scenarios, weights = zip(*MIXES[role])
+    return rng.choices(scenarios, weights=weights)[0]
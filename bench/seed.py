@@ -0,0 +1,152 @@
+"""Seed the database with a deterministic, realistically shaped data set.
+
+Every seeded account uses the SEED_EMAIL_DOMAIN address domain, so a
+re-seed (or `--reset`) only ever touches rows this module created; real
+residents in the same database are left alone. The same --seed always
+produces the same names, statuses, document types and dates.
+"""
+import random
+from datetime import datetime, timedelta
+
+import counters
+import passwords
+import reports
+from resident_search import BENCH_FIRST_NAMES, BENCH_LAST_NAMES, index_user
+
+SEED_EMAIL_DOMAIN = 'loadtest.invalid'
+# Residents an older `resident_search.py bench` inserted; clear() removes them too
+LEGACY_EMAIL_DOMAINS = ('search-bench.invalid',)
+ADMIN_EMAIL = f'admin@{SEED_EMAIL_DOMAIN}'
+PASSWORD = 'loadtest-password'
+BATCH_SIZE = 1000
+
+# Rough shape of a live barangay queue: most requests are still moving,
+# clearances and indigency certificates dominate.
+STATUS_WEIGHTS = {'Pending': 30, 'Processing': 18, 'Verifying': 10, 'Ready to be Claim': 10,
+                  'Completed': 24, 'Rejected': 8}
+ARCHIVED_STATUS_WEIGHTS = {'Completed': 85, 'Rejected': 15}
+DOCUMENT_WEIGHTS = {'Barangay Clearance': 35, 'Certificate of residencies': 20,
+                    'Certificate of indigency - Financial': 10, 'Certificate of indigency - Medical': 10,
+                    'Certificate of indigency - educational': 6, 'Certificate of indigency - Scholarship': 6,
+                    'First time job seeker': 8, 'Certificate of solo parent': 5}
+PURPOSES = ['Employment requirement', 'Scholarship application', 'Hospital bill assistance',
+            'Bank account opening', 'School enrollment', 'Loan application', 'Travel requirement']
+CIVIL_STATUSES = ['Single', 'Married', 'Widowed', 'Separated']
+PUROKS = ['Purok 1', 'Purok 2', 'Purok 3', 'Purok 4', 'Purok 5', 'Purok 6']
+
+
+def resident_email(n):
+    return f'r{n}@{SEED_EMAIL_DOMAIN}'
+
+
+def _weighted(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def _batches(rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        yield rows[start:start + BATCH_SIZE]
+
+
+def clear(conn):
+    """Delete every seeded account; their requests cascade with them"""
+    cur = conn.cursor()
+    ids = []
+    for domain in (SEED_EMAIL_DOMAIN, *LEGACY_EMAIL_DOMAINS):
+        cur.execute('SELECT id FROM users WHERE email LIKE %s', ('%@' + domain,))
+        ids.extend(row['id'] for row in cur.fetchall())
+    for batch in _batches(ids):
+        placeholders = ','.join(['%s'] * len(batch))
+        cur.execute(f'DELETE FROM all_records WHERE user_id IN ({placeholders})', tuple(batch))
+        cur.execute(f'DELETE FROM users WHERE id IN ({placeholders})', tuple(batch))
+        conn.commit()
+    reports.seed_volume(cur)
+    conn.commit()
+    cur.close()
+    counters.reconcile(conn, fix=True)
+    return len(ids)
+
+
+def seed(conn, residents=1000, requests=5000, records=2000, seed=42, now=None):
+    """Insert `residents` residents (plus one admin), `requests` open
+    requests and `records` archived ones. Returns the row counts."""
+    rng = random.Random(seed)
+    now = now or datetime(2025, 6, 1, 9, 0)
+    password = passwords.hash_password(PASSWORD)
+    cur = conn.cursor()
+
+    cur.execute('''INSERT INTO users (first_name, last_name, fullname, email, password, role)
+                   VALUES (%s, %s, %s, %s, %s, %s)''',
+                ('Load', 'Admin', 'Load Admin', ADMIN_EMAIL, password, 'admin'))
+
+    users = []
+    for n in range(residents):
+        first, last = rng.choice(BENCH_FIRST_NAMES), rng.choice(BENCH_LAST_NAMES)
+        birthdate = (now - timedelta(days=rng.randint(18 * 365, 80 * 365))).strftime('%Y-%m-%d')
+        users.append((first, last, f'{first} {last}', resident_email(n), password,
+                      '09' + ''.join(rng.choice('0123456789') for _ in range(9)), birthdate,
+                      rng.choice(CIVIL_STATUSES), f'{rng.choice(PUROKS)}, San Isidro, Sapac, Lipa City'))
+    for batch in _batches(users):
+        cur.executemany('''INSERT INTO users (first_name, last_name, fullname, email, password, contact,
+                                              birthdate, civil_status, address)
+                           VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)''', batch)
+        conn.commit()
+
+    cur.execute('SELECT id, first_name, last_name, fullname, email, contact, address FROM users '
+                'WHERE email LIKE %s AND role = %s ORDER BY id', ('%@' + SEED_EMAIL_DOMAIN, 'user'))
+    people = cur.fetchall()
+    for batch in _batches(people):
+        for p in batch:
+            index_user(cur, p['id'], p['first_name'], p['last_name'])
+        conn.commit()
+
+    def submitted():
+        return now - timedelta(minutes=rng.randint(0, 365 * 24 * 60))
+
+    open_rows = []
+    for _ in range(requests if people else 0):
+        p = rng.choice(people)
+        at = submitted()
+        open_rows.append((p['id'], p['fullname'], p['email'], _weighted(rng, DOCUMENT_WEIGHTS), p['address'],
+                          p['contact'], rng.choice(PURPOSES), _weighted(rng, STATUS_WEIGHTS), at, at))
+    for batch in _batches(open_rows):
+        cur.executemany('''INSERT INTO requests (user_id, full_name, email, document_type, address, contact,
+                                                 purpose, status, date_submitted, updated_at)
+                           VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)''', batch)
+        conn.commit()
+
+    archived = []
+    for n in range(records if people else 0):
+        p = rng.choice(people)
+        date = submitted()
+        archived.append((100000000 + n, p['id'], p['fullname'], _weighted(rng, DOCUMENT_WEIGHTS),
+                         _weighted(rng, ARCHIVED_STATUS_WEIGHTS), date,
+                         date + timedelta(days=rng.randint(1, 30))))
+    for batch in _batches(archived):
+        cur.executemany('''INSERT INTO all_records (request_id, user_id, fullname, document_type, status,
+                                                    date_submitted, archived_at)
+                           VALUES (%s, %s, %s, %s, %s, %s, %s)''', batch)
+        conn.commit()
+
+    # Counters and report rollups are derived data; rebuild them once
+    # instead of per row.
+    reports.seed_volume(cur)
+    conn.commit()
+    cur.close()
+    counters.reconcile(conn, fix=True)
+    return {'residents': len(people), 'requests': len(open_rows), 'records': len(archived)}
+
+
+def dataset(conn):
+    """Sizes of the seeded data set, recorded alongside every result"""
+    cur = conn.cursor()
+    like = '%@' + SEED_EMAIL_DOMAIN
+    cur.execute('SELECT COUNT(*) AS cnt FROM users WHERE email LIKE %s AND role = %s', (like, 'user'))
+    residents = cur.fetchone()['cnt']
+    cur.execute('SELECT COUNT(*) AS cnt FROM requests')
+    requests = cur.fetchone()['cnt']
+    cur.execute('SELECT COUNT(*) AS cnt FROM all_records')
+    records = cur.fetchone()['cnt']
+    cur.close()
+    conn.rollback()
+    return {'residents': residents, 'requests': requests, 'records': records}
@@ -0,0 +1,125 @@
+"""Startup time and cold-request latency, bare gunicorn versus gunicorn.conf.py.
+
+Each run starts a fresh gunicorn with one worker and an empty Jinja
+bytecode cache (as on a new dyno), then records:
+
+  * ready:        seconds from spawn until /healthz first answers
+  * cold:         each page's first response from that worker
+  * warm:         the median of the next `repeat` responses
+  * replacement:  seconds from killing the worker (as max_requests
+                  recycling or a crash would) until /login answers
+                  from its replacement
+
+"bare" is `gunicorn app:app` with an empty config (one sync worker,
+nothing preloaded); "tuned" is gunicorn.conf.py, pinned to one worker so
+both measure a single worker's first requests. The medians over `runs`
+runs are reported.
+"""
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench.scenarios import HttpClient
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATHS = ('/login', '/register', '/', '/readyz')
+READY_PATH = '/healthz'
+PROFILES = ('bare', 'tuned')
+
+
+def _median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def _wait_ready(client, deadline):
+    while time.monotonic() < deadline:
+        try:
+            if client.request('GET', READY_PATH) == 200:
+                return True
+        except OSError:
+            time.sleep(0.005)
+    return False
+
+
+def _worker_pid(server_pid):
+    with open(f'/proc/{server_pid}/task/{server_pid}/children') as f:
+        return int(f.read().split()[0])
+
+
+def _timed(client, path):
+    started = time.perf_counter()
+    status = client.request('GET', path)
+    return status, time.perf_counter() - started
+
+
+def run_once(profile, port, repeat=10, boot_timeout=60.0):
+    with tempfile.TemporaryDirectory() as scratch:
+        if profile == 'bare':
+            config = os.path.join(scratch, 'empty.conf.py')
+            open(config, 'w').close()
+        else:
+            config = os.path.join(ROOT, 'gunicorn.conf.py')
+        env = dict(os.environ, JINJA_CACHE_DIR=os.path.join(scratch, 'jinja'))
+        command = [sys.executable, '-m', 'gunicorn', '--config', config, '--workers', '1',
+                   '--bind', f'127.0.0.1:{port}', 'app:app']
+        client = HttpClient(f'http://127.0.0.1:{port}')
+        started = time.monotonic()
+        server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        try:
+            if not _wait_ready(client, started + boot_timeout):
+                raise RuntimeError(f'{profile}: gunicorn did not start: {server.stderr.read(4000).decode()}')
+            result = {'ready': time.monotonic() - started, 'cold': {}, 'warm': {}}
+            for path in PATHS:
+                status, seconds = _timed(client, path)
+                if status != 200:
+                    raise RuntimeError(f'{profile}: GET {path} returned {status}')
+                result['cold'][path] = seconds
+            for path in PATHS:
+                result['warm'][path] = _median([_timed(client, path)[1] for _ in range(repeat)])
+
+            killed = time.monotonic()
+            os.kill(_worker_pid(server.pid), signal.SIGKILL)
+            while True:
+                try:
+                    if client.request('GET', PATHS[0]) == 200:
+                        break
+                except OSError:
+                    pass
+                time.sleep(0.005)
+            result['replacement'] = time.monotonic() - killed
+            return result
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+
+def run(runs=3, port=8190, repeat=10, log=print):
+    """{profile: median result}"""
+    results = {}
+    for profile in PROFILES:
+        samples = []
+        for n in range(runs):
+            log(f"{profile}: run {n + 1}/{runs}...")
+            samples.append(run_once(profile, port, repeat))
+        results[profile] = {
+            'ready': _median([s['ready'] for s in samples]),
+            'replacement': _median([s['replacement'] for s in samples]),
+            'cold': {p: _median([s['cold'][p] for s in samples]) for p in PATHS},
+            'warm': {p: _median([s['warm'][p] for s in samples]) for p in PATHS},
+        }
+    return results
+
+
+def print_report(results):
+    print(f"{'':<22}" + ''.join(f"{profile:>12}" for profile in PROFILES))
+    rows = [('ready (s)', lambda r: r['ready'], 1), ('replacement (s)', lambda r: r['replacement'], 1)]
+    for path in PATHS:
+        rows.append((f'cold {path} (ms)', lambda r, p=path: r['cold'][p], 1000))
+    for path in PATHS:
+        rows.append((f'warm {path} (ms)', lambda r, p=path: r['warm'][p], 1000))
+    for label, value, scale in rows:
+        print(f"{label:<22}" + ''.join(f"{value(results[profile]) * scale:>12.3f}" for profile in PROFILES))
@@ -0,0 +1,311 @@
+"""PDF certificates for document requests, with a rendered-document cache.
+
+Each printable document_type maps to a certificate template: a title and
+paragraphs with {placeholders} filled from the request (name, address,
+purpose) and the resident's profile in users (birthdate, civil status,
+birthplace, parents' names). PDFs are drawn with fpdf2, a pure-Python
+writer, on A4 in the PDF core Times font.
+
+Every rendered file is stored under CERTIFICATE_CACHE_DIR named by the
+SHA-256 of everything that goes onto the page (template, fields, office
+details, ENGINE_VERSION), so a reprint of an unchanged certificate is a
+file read and any change to the request or profile renders a new one.
+The issue date is the day the request last changed status, which keeps
+reprints of the same certificate byte-for-byte identical.
+
+Batch mode renders a whole queue in a process pool, e.g. every request
+that is ready to be claimed, so the staff's print clicks are cache hits.
+
+Usage:
+    python certificates.py batch [--status "Ready to be Claim"] [--ids 1,2,3] [--workers N]
+    python certificates.py prune [--older-than-days 90]
+"""
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+
+ENGINE_VERSION = 1
+PRINTABLE_STATUSES = ('Ready to be Claim', 'Completed')
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'generated', 'certificates')
+
+OFFICE = {
+    'barangay': os.getenv('BARANGAY_NAME', 'San Isidro'),
+    'city': os.getenv('BARANGAY_CITY', 'Lipa City'),
+    'province': os.getenv('BARANGAY_PROVINCE', 'Batangas'),
+    'captain': os.getenv('PUNONG_BARANGAY', ''),
+}
+
+_RESIDENT = ('This is to certify that {full_name}, {age_clause}{civil_status}, born on {birthdate} in '
+             '{birthplace}, is a bona fide resident of {address}.')
+_ISSUED = ('Issued this {issued_day} day of {issued_month} {issued_year} at Barangay {barangay}, {city}, '
+           '{province}, upon the request of the above-named person for {purpose}.')
+
+
+def _indigency(assistance):
+    return ('CERTIFICATE OF INDIGENCY', [
+        _RESIDENT,
+        'Based on the records of this office, the above-named person belongs to an indigent family '
+        'of this barangay.',
+        f'This certification is issued to support an application for {assistance}.',
+    ])
+
+
+CERTIFICATES = {
+    'Barangay Clearance': ('BARANGAY CLEARANCE', [
+        _RESIDENT,
+        'The above-named person is known to be of good moral character and a law-abiding member of '
+        'this community, and has no derogatory record on file in this office.',
+    ]),
+    'Certificate of residencies': ('CERTIFICATE OF RESIDENCY', [
+        _RESIDENT,
+        'Father: {fathers_name}. Mother: {mothers_name}.',
+    ]),
+    'Certificate of indigency - educational': _indigency('educational assistance'),
+    'Certificate of indigency - Financial': _indigency('financial assistance'),
+    'Certificate of indigency - Medical': _indigency('medical assistance'),
+    'Certificate of indigency - Scholarship': _indigency('a scholarship'),
+    'Certificate of solo parent': ('CERTIFICATION OF SOLO PARENT', [
+        _RESIDENT,
+        'This is to further certify that the above-named person is a solo parent in this barangay '
+        'within the meaning of Republic Act No. 11861, the Expanded Solo Parents Welfare Act.',
+    ]),
+    'First time job seeker': ('BARANGAY CERTIFICATION (FIRST TIME JOBSEEKER)', [
+        _RESIDENT,
+        'Father: {fathers_name}. Mother: {mothers_name}.',
+        'This is to further certify that the above-named person is a qualified availee of Republic Act '
+        'No. 11261, the First Time Jobseekers Assistance Act of 2019. This certification is valid for one '
+        '(1) year from the date of issuance.',
+    ]),
+}
+
+
+# ==================== FIELDS ====================
+
+def _ordinal(n):
+    suffix = 'th' if 10 <= n % 100 <= 20 else {1: 'st', 2: 'nd', 3: 'rd'}.get(n % 10, 'th')
+    return f'{n}{suffix}'
+
+
+def _parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return datetime.strptime(str(value or '')[:10], '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
+def certificate_fields(row):
+    """Everything printed on the certificate for one request row (see
+    Repository.certificate_rows), as plain strings"""
+    issued = _parse_date(row['updated_at']) or date.today()
+    born = _parse_date(row['birthdate'])
+    age = None
+    if born:
+        age = issued.year - born.year - ((issued.month, issued.day) < (born.month, born.day))
+    fields = {
+        'request_id': str(row['id']),
+        'full_name': row['full_name'],
+        'age_clause': f'{age} years of age, ' if age is not None and age >= 0 else '',
+        'civil_status': (row['civil_status'] or 'N/A').lower(),
+        'birthdate': born.strftime('%B %d, %Y') if born else (row['birthdate'] or 'N/A'),
+        'birthplace': row['birthplace'] or 'N/A',
+        'address': row['address'],
+        'fathers_name': row['fathers_name'] or 'N/A',
+        'mothers_name': row['mothers_name'] or 'N/A',
+        'purpose': row['purpose'],
+        'issued_day': _ordinal(issued.day),
+        'issued_month': issued.strftime('%B'),
+        'issued_year': str(issued.year),
+        'issued_on': issued.isoformat(),
+    }
+    fields.update(OFFICE)
+    return fields
+
+
+def content_hash(document_type, fields):
+    payload = json.dumps({'engine': ENGINE_VERSION, 'template': CERTIFICATES[document_type], 'fields': fields},
+                         sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def is_printable(row):
+    return row['document_type'] in CERTIFICATES and row['status'] in PRINTABLE_STATUSES
+
+
+# ==================== RENDERING ====================
+
+def _latin1(text):
+    # The PDF core fonts cover Latin-1 (ñ, é ...); anything else becomes '?'.
+    return text.encode('latin-1', 'replace').decode('latin-1')
+
+
+def render_pdf(document_type, fields):
+    """The certificate as PDF bytes"""
+    from fpdf import FPDF
+
+    title, paragraphs = CERTIFICATES[document_type]
+    pdf = FPDF(format='A4')
+    pdf.set_creation_date(datetime.strptime(fields['issued_on'], '%Y-%m-%d'))
+    pdf.set_title(f"{title} - {fields['full_name']}")
+    pdf.set_producer('Barangay e-Document')
+    pdf.set_margins(25, 20, 25)
+    pdf.add_page()
+
+    def line(text, size, style='', height=6):
+        pdf.set_font('Times', style, size)
+        pdf.cell(0, height, _latin1(text), align='C', new_x='LMARGIN', new_y='NEXT')
+
+    line('Republic of the Philippines', 11)
+    line(f"Province of {fields['province']}", 11)
+    line(fields['city'], 11)
+    line(f"BARANGAY {fields['barangay'].upper()}", 13, 'B', 8)
+    pdf.ln(2)
+    pdf.line(25, pdf.get_y(), pdf.w - 25, pdf.get_y())
+    pdf.ln(4)
+    line('OFFICE OF THE PUNONG BARANGAY', 11, 'B')
+    pdf.ln(10)
+    line(title, 16, 'B', 9)
+    pdf.ln(10)
+
+    pdf.set_font('Times', 'B', 12)
+    pdf.cell(0, 7, 'TO WHOM IT MAY CONCERN:', new_x='LMARGIN', new_y='NEXT')
+    pdf.ln(4)
+    pdf.set_font('Times', '', 12)
+    for paragraph in paragraphs + [_ISSUED]:
+        pdf.multi_cell(0, 7, _latin1('        ' + paragraph.format(**fields)), align='J',
+                       new_x='LMARGIN', new_y='NEXT')
+        pdf.ln(4)
+
+    pdf.ln(18)
+    signature_x = pdf.w - 25 - 70
+    pdf.set_x(signature_x)
+    pdf.set_font('Times', 'B', 12)
+    pdf.cell(70, 6, _latin1(fields['captain'].upper() or ' '), align='C', new_x='LMARGIN', new_y='NEXT')
+    pdf.line(signature_x, pdf.get_y(), signature_x + 70, pdf.get_y())
+    pdf.set_x(signature_x)
+    pdf.set_font('Times', '', 11)
+    pdf.cell(70, 6, 'Punong Barangay', align='C', new_x='LMARGIN', new_y='NEXT')
+
+    pdf.set_y(-30)
+    pdf.set_font('Times', 'I', 9)
+    pdf.cell(0, 5, f"Control No. {fields['request_id']}-{content_hash(document_type, fields)[:8].upper()}",
+             new_x='LMARGIN', new_y='NEXT')
+    pdf.cell(0, 5, 'Not valid without the official dry seal of the barangay.')
+    return bytes(pdf.output())
+
+
+# ==================== CACHE ====================
+
+def cache_dir():
+    return os.getenv('CERTIFICATE_CACHE_DIR', DEFAULT_CACHE_DIR)
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _render_job(job):
+    """Process-pool entry point: render one certificate into the cache"""
+    path, document_type, fields = job
+    _write_atomic(path, render_pdf(document_type, fields))
+    return path
+
+
+def plan(row, directory=None):
+    """(path, document_type, fields) for a printable request row"""
+    fields = certificate_fields(row)
+    name = content_hash(row['document_type'], fields) + '.pdf'
+    return os.path.join(directory or cache_dir(), name[:2], name), row['document_type'], fields
+
+
+def ensure(row, directory=None):
+    """Return (path, rendered) for the request's certificate, rendering it
+    only when the cache has no file for its content hash"""
+    job = plan(row, directory)
+    path = job[0]
+    if os.path.exists(path):
+        os.utime(path)      # keeps it off prune's list
+        return path, False
+    return _render_job(job), True
+
+
+def render_batch(rows, workers=None, directory=None, log=print):
+    """Render every uncached certificate in `rows` across a process pool.
+    Returns {'rendered': n, 'cached': n, 'skipped': n, 'seconds': s}."""
+    started = time.perf_counter()
+    jobs, cached, skipped = [], 0, 0
+    for row in rows:
+        if not is_printable(row):
+            skipped += 1
+            continue
+        job = plan(row, directory)
+        if os.path.exists(job[0]):
+            cached += 1
+        else:
+            jobs.append(job)
+    rendered = 0
+    if jobs:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for _ in pool.map(_render_job, jobs, chunksize=max(1, min(16, len(jobs) // 16))):
+                rendered += 1
+                if rendered % 100 == 0:
+                    log(f"rendered {rendered}/{len(jobs)}")
+    return {'rendered': rendered, 'cached': cached, 'skipped': skipped,
+            'seconds': time.perf_counter() - started}
+
+
+def prune(older_than_days=90, directory=None):
+    """Delete cached PDFs not rendered or served for `older_than_days`"""
+    cutoff = time.time() - older_than_days * 86400
+    removed = 0
+    for root, _, files in os.walk(directory or cache_dir()):
+        for name in files:
+            path = os.path.join(root, name)
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+    return removed
+
+
+def main(argv):
+    import argparse
+    from app import repo
+
+    parser = argparse.ArgumentParser(description='Render request certificates into the PDF cache')
+    sub = parser.add_subparsers(dest='command', required=True)
+    b = sub.add_parser('batch')
+    b.add_argument('--status', default='Ready to be Claim', help='render every request in this status')
+    b.add_argument('--ids', help='comma-separated request ids instead of --status')
+    b.add_argument('--workers', type=int, default=None, help='rendering processes (default: every core)')
+    p = sub.add_parser('prune')
+    p.add_argument('--older-than-days', type=int, default=90)
+    args = parser.parse_args(argv[1:])
+
+    if args.command == 'prune':
+        print(f"Removed {prune(args.older_than_days)} cached certificate(s).")
+        return 0
+
+    if args.ids:
+        rows = repo.certificate_rows(req_ids=[int(i) for i in args.ids.split(',') if i.strip()])
+    else:
+        rows = repo.certificate_rows(status=args.status)
+    stats = render_batch(rows, args.workers)
+    rate = stats['rendered'] / stats['seconds'] if stats['seconds'] else 0
+    print(f"Done: {stats['rendered']} rendered, {stats['cached']} already cached, {stats['skipped']} not printable "
+          f"in {stats['seconds']:.1f}s ({rate:.0f} documents/s) -> {cache_dir()}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
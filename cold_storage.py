@@ -0,0 +1,540 @@
+"""Move old all_records rows into compressed, month-partitioned files.
+
+Records archived more than COLD_STORAGE_DAYS ago leave the hot table for
+COLD_STORAGE_DIR/<YYYY-MM>/ (month of archived_at), written by `move` in
+chunks as segments:
+
+    segment-<first archived_at>-<id>.jsonl.gz     JSON Lines, one gzip member
+                                                  per block of BLOCK_RECORDS
+    segment-<first archived_at>-<id>.idx.json.gz  sidecar: each block's byte
+                                                  offset and length, which
+                                                  block holds each id,
+                                                  request_id and user_id, and
+                                                  the segment's volume by
+                                                  (day submitted, type, status)
+
+Concatenated gzip members are still one valid .gz file (zcat reads it
+whole). Lookups go through key files shared by all segments:
+
+    keys/<key>/<value // KEY_SPAN[key]>.tsv   value, segment, block offset,
+                                              block length; one line per
+                                              block holding the value
+    restored.tsv                              id, segment of each record
+                                              restored to all_records
+    segments.log                              JSON Lines journal: a segment
+                                              once its keys are written, and
+                                              again once its rows are deleted
+
+Every chunk appends a few lines to the key files it touches and never
+rewrites them, so a move costs the same per chunk however big the cold
+tier is. A lookup reads one key file, whose size is bounded by its span
+of values, then inflates just the blocks it names. Parsed key files are
+cached per process and re-read only when the file changes.
+
+A chunk's segments are written to temporary files, fsynced and renamed
+data first, index second; then its key lines are appended and the
+segment is journalled; only then are its rows deleted from all_records,
+and the deletion is journalled too. A segment without an index is an
+interrupted write and is ignored. Before it moves anything, `move`
+finishes what a crash left behind: a segment with an index but no
+journal entry gets its key lines and entry, and a journalled segment
+whose deletion is not gets its rows deleted, so re-running after a
+crash at any point neither loses nor duplicates a record.
+
+`restore` copies a record back with archived_at reset to now, so the
+next `move` leaves it hot for another COLD_STORAGE_DAYS, and lists its
+cold copy in restored.tsv so lookups and `volume` skip it.
+
+Usage (cron / Heroku Scheduler):
+    python cold_storage.py move [--older-than-days 365] [--chunk-size 5000] [--pause 0.05] [--dry-run]
+    python cold_storage.py status
+    python cold_storage.py lookup (--id N | --request-id N | --user-id N)
+    python cold_storage.py restore --id N
+"""
+import glob
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cold_storage')
+DEFAULT_DAYS = 365
+DEFAULT_CHUNK_SIZE = 5000
+BLOCK_RECORDS = 64
+INDEX_VERSION = 2
+KEYS = ('id', 'request_id', 'user_id')
+KEY_SPAN = {'id': 1024, 'request_id': 1024, 'user_id': 256}   # values per key file
+JOURNAL = 'segments.log'
+RESTORED = 'restored.tsv'
+
+COLUMNS = ('id', 'request_id', 'user_id', 'fullname', 'document_type', 'status', 'date_submitted', 'archived_at')
+_DATETIMES = ('date_submitted', 'archived_at')
+
+
+def storage_dir():
+    return os.getenv('COLD_STORAGE_DIR', DEFAULT_DIR)
+
+
+# ==================== SEGMENTS ====================
+
+def _encode(row):
+    record = {c: row[c] for c in COLUMNS}
+    for c in _DATETIMES:
+        if isinstance(record[c], datetime):
+            record[c] = record[c].isoformat(' ')
+    return json.dumps(record, separators=(',', ':'), ensure_ascii=False)
+
+
+def _decode(line):
+    record = json.loads(line)
+    for c in _DATETIMES:
+        if record[c]:
+            record[c] = datetime.fromisoformat(record[c])
+    return record
+
+
+def _volume_key(record):
+    """(day submitted, document_type, status) for reports.seed_volume"""
+    submitted = record['date_submitted']
+    if submitted is None:
+        return None
+    day = submitted.date() if isinstance(submitted, datetime) else submitted
+    return str(day)[:10], record['document_type'], record['status']
+
+
+def _replace_durably(tmp, path):
+    with open(tmp, 'rb+') as f:
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def write_segment(directory, month, rows):
+    """Write `rows` (one month, in (archived_at, id) order) as a segment;
+    returns (segment name, its index, bytes written, raw JSON bytes)"""
+    month_dir = os.path.join(directory, month)
+    os.makedirs(month_dir, exist_ok=True)
+    base = os.path.join(month_dir, f"segment-{rows[0]['archived_at']:%Y%m%d%H%M%S}-{rows[0]['id']:010d}")
+    index = {'version': INDEX_VERSION, 'month': month, 'count': len(rows), 'blocks': [],
+             'id': {}, 'request_id': {}, 'user_id': {}}
+    volume = {}
+    raw = 0
+    with open(base + '.jsonl.gz.tmp', 'wb') as f:
+        for start in range(0, len(rows), BLOCK_RECORDS):
+            block_rows = rows[start:start + BLOCK_RECORDS]
+            data = ''.join(_encode(r) + '\n' for r in block_rows).encode('utf-8')
+            member = gzip.compress(data, 6, mtime=0)
+            block = len(index['blocks'])
+            index['blocks'].append([f.tell(), len(member)])
+            f.write(member)
+            raw += len(data)
+            for r in block_rows:
+                index['id'][str(r['id'])] = block
+                for key in ('request_id', 'user_id'):
+                    blocks = index[key].setdefault(str(r[key]), [])
+                    if block not in blocks:
+                        blocks.append(block)
+                key = _volume_key(r)
+                if key:
+                    volume[key] = volume.get(key, 0) + 1
+        written = f.tell()
+    index['volume'] = [list(key) + [n] for key, n in sorted(volume.items())]
+    _replace_durably(base + '.jsonl.gz.tmp', base + '.jsonl.gz')
+    _write_gzip_json(base + '.idx.json.gz', index)
+    return os.path.relpath(base, directory), index, written, raw
+
+
+def _gunzip_json(path):
+    with open(path, 'rb') as f:
+        return json.loads(gzip.decompress(f.read()))
+
+
+def _write_gzip_json(path, data):
+    with open(path + '.tmp', 'wb') as f:
+        f.write(gzip.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'), 6, mtime=0))
+    _replace_durably(path + '.tmp', path)
+
+
+_cache = {}                 # path -> ((mtime_ns, size), parsed)
+_cache_lock = threading.Lock()
+
+
+def _cached(path, parse):
+    """parse(path), re-run only when the file's mtime or size changes"""
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _cache_lock:
+        hit = _cache.get(path)
+    if hit is not None and hit[0] == stamp:
+        return hit[1]
+    data = parse(path)
+    with _cache_lock:
+        _cache[path] = (stamp, data)
+    return data
+
+
+def segment_index(directory, name):
+    """Index of segment `name` ("<YYYY-MM>/segment-...")"""
+    return _cached(os.path.join(directory, name + '.idx.json.gz'), _gunzip_json)
+
+
+def _segment_names(directory):
+    """Every complete segment (one with an index), oldest first"""
+    suffix = '.idx.json.gz'
+    return sorted(os.path.relpath(path, directory)[:-len(suffix)]
+                  for path in glob.glob(os.path.join(directory, '*', 'segment-*' + suffix)))
+
+
+def _read_blocks(path, spans):
+    records = []
+    with open(path, 'rb') as f:
+        for offset, length in spans:
+            f.seek(offset)
+            records.extend(_decode(line) for line in gzip.decompress(f.read(length)).decode('utf-8').splitlines())
+    return records
+
+
+# ==================== KEY FILES AND JOURNAL ====================
+
+def _append_lines(path, lines):
+    """Append `lines` and fsync. A last line torn by a crash (readers skip
+    a line without its newline) is cut off first."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a+b') as f:
+        end = f.seek(0, os.SEEK_END)
+        if end:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                start = max(0, end - 65536)
+                f.seek(start)
+                f.truncate(start + f.read().rfind(b'\n') + 1)
+        f.write(''.join(line + '\n' for line in lines).encode('utf-8'))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _tsv_rows(path):
+    with open(path, encoding='utf-8') as f:
+        return [line.rstrip('\n').split('\t') for line in f if line.endswith('\n')]
+
+
+def _key_path(directory, key, value):
+    return os.path.join(directory, 'keys', key, f'{int(value) // KEY_SPAN[key]}.tsv')
+
+
+def _parse_keys(path):
+    """{value: [(segment, offset, length)]} of one key file"""
+    entries = {}
+    for row in _tsv_rows(path):
+        if len(row) == 4:
+            span = (row[1], int(row[2]), int(row[3]))
+            spans = entries.setdefault(row[0], [])
+            if span not in spans:
+                spans.append(span)
+    return entries
+
+
+def _write_keys(directory, segments):
+    """Append the key lines of [(segment name, index)] to the key files"""
+    files = {}
+    for name, index in segments:
+        for key in KEYS:
+            for value, blocks in index[key].items():
+                for block in ([blocks] if key == 'id' else blocks):
+                    offset, length = index['blocks'][block]
+                    files.setdefault(_key_path(directory, key, value), []).append(
+                        f'{value}\t{name}\t{offset}\t{length}')
+    for path, lines in sorted(files.items()):
+        _append_lines(path, lines)
+
+
+def _parse_restored(path):
+    return {(int(row[0]), row[1]) for row in _tsv_rows(path) if len(row) == 2}
+
+
+def _restored(directory):
+    """{(record id, segment)} of cold copies restored to all_records"""
+    path = os.path.join(directory, RESTORED)
+    return _cached(path, _parse_restored) if os.path.exists(path) else set()
+
+
+def _parse_journal(path):
+    segments, deleted = {}, set()
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.endswith('\n'):
+                continue
+            entry = json.loads(line)
+            if 'segment' in entry:
+                segments[entry['segment']] = entry
+            else:
+                deleted.add(entry['deleted'])
+    return segments, deleted
+
+
+def journal(directory=None):
+    """({segment: {'segment', 'month', 'count'}} of every segment whose keys
+    are written, oldest first, and the set of those whose rows are deleted)"""
+    directory = directory or storage_dir()
+    path = os.path.join(directory, JOURNAL)
+    return _cached(path, _parse_journal) if os.path.exists(path) else ({}, set())
+
+
+def _journal(directory, entries):
+    _append_lines(os.path.join(directory, JOURNAL), [json.dumps(e, separators=(',', ':')) for e in entries])
+
+
+def _lookup(key, value, directory):
+    """[(segment, record)] for the cold copies whose `key` equals `value`"""
+    path = _key_path(directory, key, value)
+    if not os.path.exists(path):
+        return []
+    by_segment = {}
+    for name, offset, length in _cached(path, _parse_keys).get(str(value), []):
+        by_segment.setdefault(name, []).append((offset, length))
+    restored = _restored(directory)
+    found = []
+    for name, spans in by_segment.items():
+        for r in _read_blocks(os.path.join(directory, name + '.jsonl.gz'), sorted(spans)):
+            if r[key] == value and (r['id'], name) not in restored:
+                found.append((name, r))
+    return found
+
+
+def lookup(key, value, directory=None):
+    """Cold records whose `key` (id, request_id or user_id) equals `value`,
+    reading one key file and only the blocks that hold them"""
+    if key not in KEYS:
+        raise ValueError(f'cannot look up cold records by {key}')
+    return [record for _, record in _lookup(key, value, directory or storage_dir())]
+
+
+def volume(directory=None):
+    """{(day submitted 'YYYY-MM-DD', document_type, status): count} of the
+    records in cold storage, for reports.seed_volume"""
+    directory = directory or storage_dir()
+    counts = {}
+    for name in journal(directory)[0]:
+        index = segment_index(directory, name)
+        if 'volume' in index:
+            rows = index['volume']
+        else:
+            # Written before segments carried their volume (INDEX_VERSION 1)
+            records = _read_blocks(os.path.join(directory, name + '.jsonl.gz'), index['blocks'])
+            rows = [list(k) + [1] for k in map(_volume_key, records) if k]
+        for day, document_type, status, n in rows:
+            key = (day, document_type, status)
+            counts[key] = counts.get(key, 0) + n
+    for record_id, name in _restored(directory):
+        index = segment_index(directory, name)
+        records = _read_blocks(os.path.join(directory, name + '.jsonl.gz'),
+                               [index['blocks'][index['id'][str(record_id)]]])
+        key = next((_volume_key(r) for r in records if r['id'] == record_id), None)
+        if key in counts:
+            counts[key] -= 1
+    return {key: n for key, n in counts.items() if n}
+
+
+# ==================== MOVE / RESTORE ====================
+
+def _delete(conn, cur, ids, chunk_size):
+    for start in range(0, len(ids), chunk_size):
+        part = ids[start:start + chunk_size]
+        cur.execute(f"DELETE FROM all_records WHERE id IN ({','.join(['%s'] * len(part))})", tuple(part))
+        conn.commit()
+
+
+def recover(conn, directory=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Finish the chunks an interrupted `move` left behind; returns the
+    number of segments it had to finish"""
+    directory = directory or storage_dir()
+    segments, deleted = journal(directory)
+    unlisted = [name for name in _segment_names(directory) if name not in segments]
+    if unlisted:
+        indexes = [(name, segment_index(directory, name)) for name in unlisted]
+        _write_keys(directory, indexes)
+        _journal(directory, [{'segment': name, 'month': index['month'], 'count': index['count']}
+                             for name, index in indexes])
+        segments, deleted = journal(directory)
+    pending = [name for name in segments if name not in deleted]
+    if pending:
+        cur = conn.cursor()
+        try:
+            for name in pending:
+                _delete(conn, cur, [int(i) for i in segment_index(directory, name)['id']], chunk_size)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+        _journal(directory, [{'deleted': name} for name in pending])
+    return len(pending)
+
+
+def move(conn, older_than_days=DEFAULT_DAYS, chunk_size=DEFAULT_CHUNK_SIZE, pause=0.05, dry_run=False,
+         directory=None, log=print):
+    """Move records archived before the cutoff into cold storage. Returns
+    {'moved', 'segments', 'bytes', 'raw_bytes', 'seconds'}."""
+    directory = directory or storage_dir()
+    cutoff = datetime.now() - timedelta(days=older_than_days)
+    if not dry_run:
+        finished = recover(conn, directory, chunk_size)
+        if finished:
+            log(f"finished {finished} segment(s) left by an interrupted move")
+    # Keyset walk of idx_all_records_archived; moved rows are deleted as it
+    # goes, but a dry run has to step past the ones it only counted.
+    select = f'''SELECT {', '.join(COLUMNS)} FROM all_records
+                 WHERE archived_at < %s AND (archived_at > %s OR (archived_at = %s AND id > %s))
+                 ORDER BY archived_at, id LIMIT %s'''
+    stats = {'moved': 0, 'segments': 0, 'bytes': 0, 'raw_bytes': 0}
+    started = time.perf_counter()
+    last = (datetime.min, 0)
+    cur = conn.cursor()
+    try:
+        while True:
+            cur.execute(select, (cutoff, last[0], last[0], last[1], chunk_size))
+            rows = cur.fetchall()
+            conn.commit()
+            if not rows:
+                break
+            last = (rows[-1]['archived_at'], rows[-1]['id'])
+            if dry_run:
+                stats['moved'] += len(rows)
+                continue
+
+            by_month = {}
+            for row in rows:
+                by_month.setdefault(row['archived_at'].strftime('%Y-%m'), []).append(row)
+            written = []
+            for month, month_rows in sorted(by_month.items()):
+                name, index, size, raw = write_segment(directory, month, month_rows)
+                written.append((name, index))
+                stats['segments'] += 1
+                stats['bytes'] += size
+                stats['raw_bytes'] += raw
+            _write_keys(directory, written)
+            _journal(directory, [{'segment': name, 'month': index['month'], 'count': index['count']}
+                                 for name, index in written])
+
+            # The files are durable and findable; only now do the rows leave
+            # the hot table.
+            _delete(conn, cur, [row['id'] for row in rows], chunk_size)
+            _journal(directory, [{'deleted': name} for name, _ in written])
+            stats['moved'] += len(rows)
+
+            elapsed = time.perf_counter() - started
+            log(f"moved {stats['moved']} records, archived up to {last[0]} ({stats['moved'] / elapsed:.0f} rows/s, "
+                f"{stats['bytes'] / 1024:.0f} KB written)")
+            if pause:
+                time.sleep(pause)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    stats['seconds'] = time.perf_counter() - started
+    return stats
+
+
+def restore(conn, record_id, directory=None):
+    """Put one cold record back into all_records (same id, archived_at now)
+    and list its cold copy as restored; False if it is not in cold storage
+    or already in all_records"""
+    directory = directory or storage_dir()
+    found = _lookup('id', record_id, directory)
+    if not found:
+        return False
+    name, record = found[-1]
+    cur = conn.cursor()
+    try:
+        cur.execute('SELECT id FROM all_records WHERE id = %s', (record_id,))
+        hot = cur.fetchone() is not None
+        if not hot:
+            values = dict(record, archived_at=datetime.now().replace(microsecond=0))
+            cur.execute(f"INSERT INTO all_records ({', '.join(COLUMNS)}) "
+                        f"VALUES ({', '.join(['%s'] * len(COLUMNS))})", tuple(values[c] for c in COLUMNS))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    # After the commit: a crash in between leaves the record in both places,
+    # and restoring it again just writes this line.
+    _append_lines(os.path.join(directory, RESTORED), [f'{record_id}\t{name}'])
+    return not hot
+
+
+def status(directory=None):
+    """{month: {'segments', 'records', 'bytes'}}"""
+    directory = directory or storage_dir()
+    months = {}
+    for name, entry in journal(directory)[0].items():
+        m = months.setdefault(entry['month'], {'segments': 0, 'records': 0, 'bytes': 0})
+        m['segments'] += 1
+        m['records'] += entry['count']
+        m['bytes'] += os.path.getsize(os.path.join(directory, name + '.jsonl.gz'))
+    for _, name in _restored(directory):
+        month = os.path.dirname(name)
+        if month in months:
+            months[month]['records'] -= 1
+    return months
+
+
+def main(argv):
+    import argparse
+    from app import get_db
+
+    parser = argparse.ArgumentParser(description='Tier old all_records rows into compressed monthly files')
+    sub = parser.add_subparsers(dest='command', required=True)
+    m = sub.add_parser('move')
+    m.add_argument('--older-than-days', type=int, default=int(os.getenv('COLD_STORAGE_DAYS', DEFAULT_DAYS)))
+    m.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    m.add_argument('--pause', type=float, default=0.05, help='seconds to sleep between chunks')
+    m.add_argument('--dry-run', action='store_true', help='count matching rows without moving them')
+    sub.add_parser('status')
+    lk = sub.add_parser('lookup')
+    key = lk.add_mutually_exclusive_group(required=True)
+    key.add_argument('--id', type=int)
+    key.add_argument('--request-id', type=int)
+    key.add_argument('--user-id', type=int)
+    r = sub.add_parser('restore')
+    r.add_argument('--id', type=int, required=True)
+    args = parser.parse_args(argv[1:])
+
+    if args.command == 'status':
+        months = status()
+        for month, m in sorted(months.items()):
+            print(f"{month}  {m['records']:>8} record(s)  {m['segments']:>4} segment(s)  {m['bytes'] / 1024:>9.1f} KB")
+        print(f"Total: {sum(m['records'] for m in months.values())} record(s) in {storage_dir()}")
+        return 0
+    if args.command == 'lookup':
+        for name in ('id', 'request_id', 'user_id'):
+            if getattr(args, name) is not None:
+                records = lookup(name, getattr(args, name))
+        for record in records:
+            print(json.dumps(record, default=str))
+        return 0 if records else 1
+
+    conn = get_db()
+    try:
+        if args.command == 'restore':
+            restored = restore(conn, args.id)
+            print(f"Restored record #{args.id}." if restored else f"Record #{args.id} is not in cold storage "
+                                                                  f"or is already in all_records.")
+            return 0 if restored else 1
+        stats = move(conn, args.older_than_days, args.chunk_size, args.pause, args.dry_run)
+    finally:
+        conn.close()
+    verb = 'would move' if args.dry_run else 'moved'
+    rate = stats['moved'] / stats['seconds'] if stats['seconds'] else 0
+    ratio = stats['raw_bytes'] / stats['bytes'] if stats['bytes'] else 0
+    print(f"Done: {verb} {stats['moved']} record(s) in {stats['seconds']:.1f}s ({rate:.0f} rows/s); "
+          f"{stats['segments']} segment(s), {stats['bytes'] / 1024:.0f} KB ({ratio:.1f}x compression)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
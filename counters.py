@@ -0,0 +1,170 @@
+"""Request-status and resident counters kept in step with every write.
+
+request_counters holds one row per (user_id, status); user_id 0 is the
+global total across all residents. app_counters holds named totals such
+as the number of registered residents, and the profile version that
+cached profiles are checked against. Every helper here runs on the
+caller's cursor, so the counter change commits (or rolls back) together
+with the write it describes.
+
+Usage:
+    python counters.py reconcile [--fix]
+"""
+import sys
+
+from backends import upsert_add_sql
+
+GLOBAL = 0
+RESIDENTS = 'residents'
+PROFILES = 'profiles'       # bumped by every profile write; see app.get_profile
+
+
+# ==================== WRITES ====================
+
+def _bump(cur, rows):
+    """rows: iterable of (user_id, status, delta)"""
+    rows = [r for r in rows if r[2]]
+    if rows:
+        cur.executemany(upsert_add_sql(cur, 'request_counters', ('user_id', 'status'), 'cnt'), rows)
+
+
+def request_added(cur, user_id, status='Pending', n=1):
+    _bump(cur, [(user_id, status, n), (GLOBAL, status, n)])
+
+
+def request_moved(cur, user_id, old_status, new_status, n=1):
+    if old_status == new_status:
+        return
+    _bump(cur, [(user_id, old_status, -n), (user_id, new_status, n),
+                (GLOBAL, old_status, -n), (GLOBAL, new_status, n)])
+
+
+def requests_removed(cur, groups):
+    """groups: rows with user_id, status and cnt for the requests deleted"""
+    rows = []
+    for g in groups:
+        rows.append((g['user_id'], g['status'], -g['cnt']))
+        rows.append((GLOBAL, g['status'], -g['cnt']))
+    _bump(cur, rows)
+
+
+def lock_request_groups(cur, ids):
+    """Lock the given requests and return their (user_id, status) counts"""
+    if not ids:
+        return []
+    placeholders = ','.join(['%s'] * len(ids))
+    cur.execute(f'''SELECT user_id, status, COUNT(*) AS cnt FROM requests
+                    WHERE id IN ({placeholders}) GROUP BY user_id, status FOR UPDATE''', tuple(ids))
+    return cur.fetchall()
+
+
+def user_removed(cur, user_id, was_resident=True):
+    """Drop a user's counters and take their requests off the global totals"""
+    cur.execute('SELECT user_id, status, cnt FROM request_counters WHERE user_id = %s FOR UPDATE', (user_id,))
+    groups = cur.fetchall()
+    _bump(cur, [(GLOBAL, g['status'], -g['cnt']) for g in groups])
+    cur.execute('DELETE FROM request_counters WHERE user_id = %s', (user_id,))
+    if was_resident:
+        resident_added(cur, -1)
+
+
+def resident_added(cur, n=1):
+    cur.execute(upsert_add_sql(cur, 'app_counters', ('name',), 'value'), (RESIDENTS, n))
+
+
+def profile_changed(cur):
+    cur.execute(upsert_add_sql(cur, 'app_counters', ('name',), 'value'), (PROFILES, 1))
+
+
+# ==================== READS ====================
+
+def status_counts(cur, user_id=GLOBAL):
+    cur.execute('SELECT status, cnt FROM request_counters WHERE user_id = %s', (user_id,))
+    return {row['status']: row['cnt'] for row in cur.fetchall() if row['cnt']}
+
+
+def _named(cur, name):
+    cur.execute('SELECT value FROM app_counters WHERE name = %s', (name,))
+    row = cur.fetchone()
+    return row['value'] if row else 0
+
+
+def resident_count(cur):
+    return _named(cur, RESIDENTS)
+
+
+def profile_version(cur):
+    return _named(cur, PROFILES)
+
+
+# ==================== RECONCILE ====================
+
+def expected_counts(cur):
+    cur.execute('SELECT user_id, status, COUNT(*) AS cnt FROM requests GROUP BY user_id, status')
+    expected = {}
+    for row in cur.fetchall():
+        expected[(row['user_id'], row['status'])] = row['cnt']
+        key = (GLOBAL, row['status'])
+        expected[key] = expected.get(key, 0) + row['cnt']
+    cur.execute("SELECT COUNT(*) AS cnt FROM users WHERE role = 'user'")
+    return expected, cur.fetchone()['cnt']
+
+
+def reconcile(conn, fix=False):
+    """Recompute every counter from scratch and return the drift found.
+
+    Drift is a list of (key, stored, actual). With fix=True the counter
+    tables are rewritten in one transaction, holding the requests rows
+    locked so no write can slip in between the count and the rewrite.
+    """
+    cur = conn.cursor()
+    if fix:
+        cur.execute('SELECT id FROM requests FOR UPDATE')
+    expected, residents = expected_counts(cur)
+    cur.execute('SELECT user_id, status, cnt FROM request_counters')
+    stored = {(row['user_id'], row['status']): row['cnt'] for row in cur.fetchall()}
+
+    drift = []
+    for key in sorted(set(expected) | set(stored), key=lambda k: (k[0], str(k[1]))):
+        if expected.get(key, 0) != stored.get(key, 0):
+            drift.append((key, stored.get(key, 0), expected.get(key, 0)))
+    stored_residents = resident_count(cur)
+    if stored_residents != residents:
+        drift.append((RESIDENTS, stored_residents, residents))
+
+    if fix:
+        cur.execute('DELETE FROM request_counters')
+        cur.executemany('INSERT INTO request_counters (user_id, status, cnt) VALUES (%s, %s, %s)',
+                        [(u, s, c) for (u, s), c in expected.items()])
+        cur.execute('DELETE FROM app_counters WHERE name = %s', (RESIDENTS,))
+        cur.execute('INSERT INTO app_counters (name, value) VALUES (%s, %s)', (RESIDENTS, residents))
+        conn.commit()
+    else:
+        conn.rollback()
+    cur.close()
+    return drift
+
+
+def main(argv):
+    from app import get_db
+
+    if len(argv) < 2 or argv[1] != 'reconcile':
+        print(__doc__)
+        return 2
+    fix = '--fix' in argv[2:]
+    conn = get_db()
+    try:
+        drift = reconcile(conn, fix=fix)
+    finally:
+        conn.close()
+    for key, stored, actual in drift:
+        print(f"DRIFT {key}: stored={stored} actual={actual}")
+    if not drift:
+        print("Counters match the requests and users tables.")
+    elif fix:
+        print(f"Rewrote counters ({len(drift)} value(s) corrected).")
+    return 1 if drift and not fix else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,198 @@
+import threading
+import time
+from collections import deque
+
+import pymysql
+from pymysql.constants import SERVER_STATUS
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out before the timeout"""
+
+
+class PooledConnection:
+    """Wrapper around a pymysql connection that remembers its age.
+
+    Calling close() hands the connection back to the pool instead of
+    closing the socket, so existing `conn.close()` calls in the routes keep
+    working. When the connection is bound to a Flask request, close() is a
+    no-op and the connection goes back on teardown.
+    """
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.request_scoped = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def cursor(self, *args, **kwargs):
+        cur = self._raw.cursor(*args, **kwargs)
+        wrapper = self._pool.cursor_wrapper
+        return wrapper(cur) if wrapper else cur
+
+    def close(self):
+        if not self.request_scoped:
+            self._pool.release(self)
+
+    def in_transaction(self):
+        return bool(self._raw.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS)
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of MySQL connections.
+
+    `cursor_wrapper`, if given, is called with every cursor the pooled
+    connections create and its return value is used instead, e.g. to time
+    queries.
+    """
+
+    def __init__(self, connect_kwargs, max_size=10, timeout=10.0,
+                 max_idle=300.0, max_lifetime=3600.0, ping_interval=30.0, cursor_wrapper=None):
+        self.connect_kwargs = connect_kwargs
+        self.cursor_wrapper = cursor_wrapper
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.ping_interval = ping_interval
+
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._open = 0
+        self._checked_out = 0
+        self._waiting = 0
+        self._created = 0
+        self._recycled = 0
+        self._rolled_back = 0
+
+    def _connect(self):
+        raw = pymysql.connect(**self.connect_kwargs)
+        with self._lock:
+            self._created += 1
+        return PooledConnection(self, raw)
+
+    def _discard(self, conn):
+        try:
+            conn._raw.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._open -= 1
+            self._recycled += 1
+            self._available.notify()
+
+    def _is_stale(self, conn, now):
+        if self.max_lifetime and now - conn.created_at > self.max_lifetime:
+            return True
+        if self.max_idle and now - conn.last_used > self.max_idle:
+            return True
+        return False
+
+    def _is_alive(self, conn, now):
+        if now - conn.last_used < self.ping_interval:
+            return True
+        try:
+            conn._raw.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def acquire(self):
+        """Check out a live connection, waiting up to `timeout` seconds"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            conn = None
+            with self._lock:
+                while not self._idle and self._open >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(f"No database connection available after {self.timeout}s")
+                    self._waiting += 1
+                    try:
+                        self._available.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+                if self._idle:
+                    conn = self._idle.pop()
+                else:
+                    self._open += 1
+                self._checked_out += 1
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._open -= 1
+                        self._checked_out -= 1
+                        self._available.notify()
+                    raise
+                return conn
+
+            now = time.monotonic()
+            if self._is_stale(conn, now) or not self._is_alive(conn, now):
+                with self._lock:
+                    self._checked_out -= 1
+                self._discard(conn)
+                continue
+            return conn
+
+    def release(self, conn):
+        """Return a connection to the pool, rolling back any open transaction"""
+        conn.request_scoped = False
+        try:
+            if conn.open and conn.in_transaction():
+                conn._raw.rollback()
+                with self._lock:
+                    self._rolled_back += 1
+        except Exception:
+            with self._lock:
+                self._checked_out -= 1
+            self._discard(conn)
+            return
+
+        if not conn.open or self._is_stale(conn, time.monotonic()):
+            with self._lock:
+                self._checked_out -= 1
+            self._discard(conn)
+            return
+
+        conn.last_used = time.monotonic()
+        with self._lock:
+            self._checked_out -= 1
+            self._idle.append(conn)
+            self._available.notify()
+
+    def discard(self, conn):
+        """Drop a checked-out connection instead of returning it, e.g. when
+        an unbuffered result was abandoned half-way through"""
+        conn.request_scoped = False
+        with self._lock:
+            self._checked_out -= 1
+        self._discard(conn)
+
+    def close_all(self):
+        """Close every idle connection (checked-out ones close on release)"""
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+        for conn in idle:
+            self._discard(conn)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_size': self.max_size,
+                'open': self._open,
+                'idle': len(self._idle),
+                'checked_out': self._checked_out,
+                'waiting': self._waiting,
+                'created': self._created,
+                'recycled': self._recycled,
+                'rolled_back': self._rolled_back,
+            }
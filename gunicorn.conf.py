@@ -0,0 +1,58 @@
+"""Gunicorn settings for the web process (Procfile: gunicorn --config gunicorn.conf.py app:app).
+
+Workers are processes, sized from the CPU count; each runs a pool of
+threads because most of a request is spent waiting on the database and
+every open /live/requests stream holds a thread for up to
+LIVE_STREAM_SECONDS. The app is preloaded and warmed in the master (see
+warmup.py), so a worker starts, and restarts, as a cheap fork with
+compiled templates instead of a fresh import. Workers are recycled after
+max_requests, jittered so they do not all restart at the same moment.
+
+Every setting can be overridden from the environment:
+    WEB_CONCURRENCY         worker processes (default: 2 x CPUs + 1, at most 12)
+    GUNICORN_THREADS        threads per worker (default: 4 x CPUs, at most 32 and at
+                            least LIVE_MAX_STREAMS + 4)
+    GUNICORN_MAX_REQUESTS   requests before a worker is replaced (default 1000, 0 = never)
+    GUNICORN_TIMEOUT        seconds before a silent worker is killed (default 30)
+    PORT                    listen port (default 8000)
+
+Measure the effect with `python -m bench startup`.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+cpus = multiprocessing.cpu_count()
+workers = int(os.getenv('WEB_CONCURRENCY', min(2 * cpus + 1, 12)))
+worker_class = 'gthread'
+# Streams are capped at LIVE_MAX_STREAMS per worker; the floor keeps four
+# threads serving pages while that many are open.
+threads = int(os.getenv('GUNICORN_THREADS', max(min(4 * cpus, 32), int(os.getenv('LIVE_MAX_STREAMS', '8')) + 4)))
+
+preload_app = True
+
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '1000'))
+max_requests_jitter = max_requests // 10
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+# Long enough for open live streams to finish on their own on a restart
+graceful_timeout = int(float(os.getenv('LIVE_STREAM_SECONDS', '55'))) + 5
+keepalive = 5
+
+# The worker heartbeat file goes on tmpfs where there is one, so a slow
+# disk cannot make a busy worker look dead.
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+
+def when_ready(server):
+    # Runs in the master after the preloaded app is imported and before
+    # the first worker is forked.
+    import warmup
+    from app import app, backend
+
+    warmup.warm(app, backend, log=server.log.info)
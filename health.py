@@ -0,0 +1,51 @@
+"""Liveness and readiness endpoints for the load balancer and uptime checks.
+
+/healthz answers as long as the worker can run a request at all; it never
+touches the database, so a database outage does not get every worker
+restarted. /readyz says whether this worker can serve real pages: it
+fails fast with 503 when the connection pool is saturated (every
+connection checked out and requests already queueing for one) and
+otherwise runs SELECT 1 on a pooled connection, reporting how long that
+took and the pool's counters.
+
+Both are unauthenticated and cheap, and neither sets a session cookie.
+"""
+import time
+
+from flask import jsonify
+
+
+def init_app(app, backend):
+    def reply(body, status=200):
+        response = jsonify(body)
+        response.status_code = status
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+    @app.route('/healthz')
+    def healthz():
+        return reply({'status': 'ok'})
+
+    @app.route('/readyz')
+    def readyz():
+        pool = backend.stats()
+        if backend.saturated():
+            return reply({'status': 'unavailable', 'reason': 'connection pool saturated', 'pool': pool}, 503)
+        started = time.perf_counter()
+        conn = None
+        try:
+            conn = backend.acquire()
+            cur = conn.cursor()
+            try:
+                cur.execute('SELECT 1')
+                cur.fetchall()
+            finally:
+                cur.close()
+        except Exception as e:
+            if conn is not None:
+                backend.discard(conn)
+            app.logger.warning('readyz: database check failed: %r', e)
+            return reply({'status': 'unavailable', 'reason': 'database check failed', 'pool': backend.stats()}, 503)
+        backend.release(conn)
+        return reply({'status': 'ok', 'database_ms': round((time.perf_counter() - started) * 1000, 2),
+                      'pool': backend.stats()})
@@ -0,0 +1,183 @@
+"""English / Tagalog message catalogs for templates and flash messages.
+
+Every page is a single template written in English. Translatable text is
+wrapped in `{{ _('...') }}` or `{% trans %}...{% endtrans %}`; the Tagalog
+text lives in translations/tl.json keyed by the English source string.
+
+Catalogs are loaded, checked and compiled once at import: each language
+gets its own gettext() over a dict of ready-made Markup strings, and the
+request's language picks which one a template sees. A lookup at render
+time is then one dict get, with no session access or re-escaping per
+string. A string missing from a catalog falls back to English.
+
+Usage:
+    python i18n.py check    # strings missing from (or stale in) a catalog
+"""
+import ast
+import json
+import os
+import re
+import sys
+
+from flask import has_request_context, session
+from markupsafe import Markup
+
+LANGUAGES = ('en', 'tl')
+DEFAULT_LANGUAGE = 'en'
+CATALOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'translations')
+
+_PLACEHOLDER = re.compile(r'%\((\w+)\)s')
+
+
+def load_catalogs(directory=CATALOG_DIR):
+    """Read every non-default language catalog into {lang: {msgid: text}}.
+
+    A translation that drops or invents a %(name)s placeholder would blow
+    up (or silently lose data) at render time, so it is rejected here.
+    """
+    catalogs = {}
+    for lang in LANGUAGES:
+        if lang == DEFAULT_LANGUAGE:
+            continue
+        with open(os.path.join(directory, f'{lang}.json'), encoding='utf-8') as f:
+            messages = json.load(f)
+        for msgid, text in messages.items():
+            if set(_PLACEHOLDER.findall(msgid)) != set(_PLACEHOLDER.findall(text)):
+                raise ValueError(f"{lang}.json: placeholders differ for {msgid!r}")
+        catalogs[lang] = messages
+    return catalogs
+
+
+def compile_template_callables(catalogs):
+    """Build the gettext/ngettext pair templates use for each language.
+
+    Catalog text is trusted markup (it may hold <strong>), so it is wrapped
+    in Markup once here; %(name)s values are escaped when formatted in.
+    Jinja's newstyle gettext leaves that formatting to the callable, and
+    literal percent signs are written as %% in the templates.
+    """
+    msgids = set().union(*catalogs.values()) if catalogs else set()
+    compiled = {}
+    for lang in LANGUAGES:
+        messages = catalogs.get(lang, {})
+        table = {msgid: Markup(messages.get(msgid, msgid)) for msgid in msgids}
+
+        def gettext(message, _table=table, **variables):
+            rv = _table.get(message)
+            if rv is None:
+                rv = Markup(message)
+            return rv % variables if '%' in rv else rv
+
+        def ngettext(singular, plural, n, _gettext=gettext, **variables):
+            variables.setdefault('num', n)
+            return _gettext(singular if n == 1 else plural, **variables)
+
+        compiled[lang] = {'gettext': gettext, '_': gettext, 'ngettext': ngettext}
+    return compiled
+
+
+CATALOGS = load_catalogs()
+TEMPLATE_CALLABLES = compile_template_callables(CATALOGS)
+
+
+def current_language():
+    lang = session.get('lang', DEFAULT_LANGUAGE) if has_request_context() else DEFAULT_LANGUAGE
+    return lang if lang in LANGUAGES else DEFAULT_LANGUAGE
+
+
+def gettext(message, **variables):
+    """Translate `message` into the session's language, for Python code
+    such as flash(). Returns a plain string, so it is escaped on output."""
+    catalog = CATALOGS.get(current_language())
+    if catalog:
+        message = catalog.get(message, message)
+    return message % variables if variables else message
+
+
+def ngettext(singular, plural, n, **variables):
+    variables.setdefault('num', n)
+    return gettext(singular if n == 1 else plural, **variables)
+
+
+def translate(value):
+    """Jinja filter for data values such as a request's status.
+
+    Unlike _(), which marks catalog text as safe HTML, this returns a
+    plain string so the value is still escaped when it is not in the
+    catalog.
+    """
+    return gettext(str(value))
+
+
+def init_app(app):
+    env = app.jinja_env
+    env.add_extension('jinja2.ext.i18n')
+    env.policies['ext.i18n.trimmed'] = True
+    # The globals cover templates rendered outside a context processor; a
+    # request gets its language's compiled callables injected below.
+    env.install_gettext_callables(gettext, ngettext, newstyle=True)
+    env.filters['translate'] = translate
+
+    @app.context_processor
+    def inject_language():
+        lang = current_language()
+        return {'lang': lang, **TEMPLATE_CALLABLES[lang]}
+
+
+# ==================== TOOLS ====================
+
+def template_messages(env):
+    """Yield (template, msgid) for every translatable string in the templates"""
+    for name in env.list_templates(extensions=['html']):
+        source = env.loader.get_source(env, name)[0]
+        for _lineno, _func, msgid in env.extract_translations(source):
+            if isinstance(msgid, tuple):
+                yield from ((name, m) for m in msgid if m)
+            else:
+                yield name, msgid
+
+
+def python_messages(path):
+    """Yield (file, msgid) for every gettext('literal') call in a module"""
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), path)
+    for node in ast.walk(tree):
+        if (isinstance(node, ast.Call) and getattr(node.func, 'id', None) in ('gettext', '_')
+                and node.args and isinstance(node.args[0], ast.Constant)):
+            yield os.path.basename(path), node.args[0].value
+
+
+def check(env, sources=()):
+    """Return (missing, unused): strings the templates or `sources` use
+    that a catalog lacks, and catalog entries nothing uses any more"""
+    used = {}
+    for where, msgid in template_messages(env):
+        used.setdefault(msgid, where)
+    for path in sources:
+        for where, msgid in python_messages(path):
+            used.setdefault(msgid, where)
+    missing, unused = [], []
+    for lang, catalog in CATALOGS.items():
+        missing.extend((lang, used[m], m) for m in sorted(used) if m not in catalog)
+        unused.extend((lang, m) for m in sorted(catalog) if m not in used)
+    return missing, unused
+
+
+def main(argv):
+    from app import app
+
+    if len(argv) < 2 or argv[1] != 'check':
+        print(__doc__)
+        return 2
+    missing, unused = check(app.jinja_env, [os.path.join(app.root_path, 'app.py')])
+    for lang, where, msgid in missing:
+        print(f"MISSING [{lang}] {where}: {msgid}")
+    for lang, msgid in unused:
+        print(f"UNUSED [{lang}]: {msgid}")
+    if not missing and not unused:
+        print("Catalogs match the templates and flash messages.")
+    return 1 if missing else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,248 @@
+"""Conditional GET and live push for the resident status pages.
+
+/status and the user dashboard only change when one of the resident's
+requests does, so both carry a strong ETag built from the user's request
+version: how many requests they have and the latest updated_at, one
+covered read of idx_requests_user_updated (see
+Repository.request_versions). A browser revalidating an unchanged page
+gets a 304 without the page's other queries or its render.
+
+An open page also listens on /live/requests, a Server-Sent Events stream
+that emits `changed` when that user's requests change; static/live.js
+then re-fetches the page (itself a conditional GET) and swaps in the
+elements marked data-live. Changes made in this process are pushed at
+once through notify(); changes made by other workers are picked up by a
+single batched version query every LIVE_POLL_SECONDS covering every user
+with a stream open here, so the database sees one small query per worker
+per interval no matter how many pages are waiting.
+
+Each stream holds a worker thread, so streams are capped per process
+(LIVE_MAX_STREAMS) and closed after LIVE_STREAM_SECONDS; EventSource
+reconnects on its own. Run gunicorn with more threads than that (see
+gunicorn.conf.py).
+"""
+import hashlib
+import os
+import threading
+import time
+
+from flask import Response, request, session
+
+POLL_SECONDS = 2.0
+STREAM_SECONDS = 55.0
+HEARTBEAT_SECONDS = 15.0
+MAX_STREAMS = 8
+RETRY_MS = 3000
+BUSY_RETRY_MS = 30000
+
+# Hashed into every ETag so a deploy that changes a template, a
+# translation or an asset invalidates the pages browsers already hold.
+RELEASE_PATHS = ('templates', 'translations', os.path.join('static', 'dist', 'manifest.json'))
+
+
+class ChangeBroker:
+    """Per-process fan-out of "user X's requests changed" to open streams"""
+
+    def __init__(self, versions, poll_seconds=POLL_SECONDS, max_streams=MAX_STREAMS, log=None):
+        self._versions = versions      # [user_id] -> {user_id: version}
+        self.poll_seconds = poll_seconds
+        self.max_streams = max_streams
+        self._log = log
+        self._cond = threading.Condition()
+        self._watchers = {}            # user_id -> open streams
+        self._known = {}               # user_id -> version last seen by the poller
+        self._seq = {}                 # user_id -> change counter the streams wait on
+        self._streams = 0
+        self._poller = None
+
+    def _bump(self, user_ids):
+        for user_id in user_ids:
+            if user_id in self._watchers:
+                self._seq[user_id] = self._seq.get(user_id, 0) + 1
+        self._cond.notify_all()
+
+    def notify(self, user_ids):
+        """Called after a commit that changed these users' requests. The
+        poller will see the same change again a moment later; the page's
+        second refresh is then a 304."""
+        with self._cond:
+            self._bump(user_ids)
+
+    def watch(self, user_id):
+        """Register a stream; False when this process is at max_streams"""
+        with self._cond:
+            if self._streams >= self.max_streams:
+                return False
+            self._streams += 1
+            self._watchers[user_id] = self._watchers.get(user_id, 0) + 1
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._poll, name='live-poller', daemon=True)
+                self._poller.start()
+            return True
+
+    def unwatch(self, user_id):
+        with self._cond:
+            self._streams -= 1
+            remaining = self._watchers.get(user_id, 1) - 1
+            if remaining:
+                self._watchers[user_id] = remaining
+            else:
+                self._watchers.pop(user_id, None)
+                self._known.pop(user_id, None)
+                self._seq.pop(user_id, None)
+
+    def seen(self, user_id, version):
+        """Baseline for the poller, taken when a stream opens, so a change
+        made before its first poll is still reported"""
+        with self._cond:
+            if user_id in self._watchers:
+                self._known.setdefault(user_id, version)
+
+    def sequence(self, user_id):
+        with self._cond:
+            return self._seq.get(user_id, 0)
+
+    def wait(self, user_id, seq, timeout):
+        """Block until user_id's counter moves past `seq` or `timeout`
+        passes; return the current counter"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq.get(user_id, 0) != seq, timeout)
+            return self._seq.get(user_id, 0)
+
+    def poll_once(self):
+        with self._cond:
+            watched = list(self._watchers)
+        if not watched:
+            return
+        versions = self._versions(watched)
+        with self._cond:
+            changed = []
+            for user_id, version in versions.items():
+                if user_id not in self._watchers:
+                    continue
+                previous = self._known.get(user_id)
+                self._known[user_id] = version
+                if previous is not None and previous != version:
+                    changed.append(user_id)
+            if changed:
+                self._bump(changed)
+
+    def _poll(self):
+        while True:
+            time.sleep(self.poll_seconds)
+            try:
+                self.poll_once()
+            except Exception:
+                if self._log is not None:
+                    self._log.exception('live: version poll failed')
+
+    def stats(self):
+        with self._cond:
+            return {'streams': self._streams, 'users': len(self._watchers), 'max_streams': self.max_streams}
+
+
+_broker = None
+_versions = None
+_release = ''
+
+
+def _release_tag(root):
+    digest = hashlib.sha1()
+    for relative in RELEASE_PATHS:
+        path = os.path.join(root, relative)
+        if os.path.isfile(path):
+            files = [path]
+        else:
+            files = sorted(os.path.join(d, f) for d, _, names in os.walk(path) for f in names)
+        for name in files:
+            digest.update(os.path.relpath(name, root).encode())
+            with open(name, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+def version(user_id):
+    return _versions([user_id])[user_id]
+
+
+def notify(user_ids):
+    """Repository hook: push a change to the owners' open pages"""
+    if _broker is not None:
+        _broker.notify(user_ids)
+
+
+def page_etag(version, *extra):
+    """Strong ETag for a resident page at `version`, or None when the page
+    is about to show a flashed message (those must never be revalidated)"""
+    if '_flashes' in session:
+        return None
+    parts = (_release, request.endpoint, session.get('lang', ''), version) + extra
+    return hashlib.sha1('\0'.join(map(str, parts)).encode()).hexdigest()[:32]
+
+
+def not_modified(etag):
+    """A 304 for `etag` if the browser already holds it, otherwise None"""
+    if etag is None or not request.if_none_match.contains(etag):
+        return None
+    return tag(Response(status=304), etag)
+
+
+def tag(response, etag):
+    # private: the page is per user; no-cache: revalidate on every view.
+    if etag is not None:
+        response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _events(broker, user_id, seq, stale, stream_seconds):
+    yield f'retry: {RETRY_MS}\n\n'
+    if stale:
+        yield f'event: changed\ndata: {seq}\n\n'
+    deadline = time.monotonic() + stream_seconds
+    while True:
+        left = deadline - time.monotonic()
+        if left <= 0:
+            break
+        current = broker.wait(user_id, seq, min(HEARTBEAT_SECONDS, left))
+        if current != seq:
+            seq = current
+            yield f'event: changed\ndata: {seq}\n\n'
+        else:
+            # Comment line: keeps proxies from timing out and lets a
+            # write to a closed socket end the stream.
+            yield ': keep-alive\n\n'
+
+
+def init_app(app, versions, poll_seconds=POLL_SECONDS, stream_seconds=STREAM_SECONDS, max_streams=MAX_STREAMS):
+    """Register /live/requests. `versions` maps a list of user ids to
+    {user_id: version} (Repository.request_versions)."""
+    global _broker, _versions, _release
+    _versions = versions
+    _release = _release_tag(app.root_path)
+    _broker = app.extensions['live'] = ChangeBroker(versions, poll_seconds, max_streams, app.logger)
+
+    @app.route('/live/requests')
+    def live_requests():
+        if 'user_id' not in session or session.get('role') != 'user':
+            return Response(status=204)     # tells EventSource to stop reconnecting
+        user_id = session['user_id']
+        if not _broker.watch(user_id):
+            return Response(f'retry: {BUSY_RETRY_MS}\n\n', mimetype='text/event-stream')
+        seq = _broker.sequence(user_id)
+        try:
+            # The one query a stream makes; after this it only waits on the broker,
+            # so no database connection is held while the stream is open.
+            current = version(user_id)
+            _broker.seen(user_id, current)
+        except Exception:
+            _broker.unwatch(user_id)
+            raise
+        stale = request.args.get('v') != current
+        response = Response(_events(_broker, user_id, seq, stale, stream_seconds), mimetype='text/event-stream')
+        # The server closes the response however the stream ends, even if
+        # the client went away before the first byte.
+        response.call_on_close(lambda: _broker.unwatch(user_id))
+        response.headers['Cache-Control'] = 'no-store'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
@@ -0,0 +1,224 @@
+"""Per-request timings: wall time, SQL time and count, template render time.
+
+init_app() hooks Flask's request lifecycle and template signals; SQL is
+timed by wrapping every cursor handed out by the connection pool (see
+ConnectionPool(cursor_wrapper=...)). Each finished request is folded into
+per-endpoint histograms, exposed in Prometheus text format at /metrics,
+and a request slower than SLOW_REQUEST_MS is logged together with the
+statements it ran (query text only, never the bound parameters, so
+passwords and hashes stay out of the log).
+
+The numbers are per process: with several gunicorn workers each one
+keeps, and reports, its own histograms.
+"""
+import bisect
+import threading
+import time
+
+from flask import (Response, before_render_template, g, has_request_context, redirect, request, session,
+                   template_rendered, url_for)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+MAX_LOGGED_QUERIES = 100
+
+
+class Histogram:
+    """Thread-safe Prometheus-style histogram with one series per label value"""
+
+    def __init__(self, name, help, label, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = sorted((k, list(v[0]), v[1], v[2]) for k, v in self._series.items())
+        for label_value, counts, total, count in snapshot:
+            label = f'{self.label}="{_escape(label_value)}"'
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f'{self.name}_bucket{{{label},le="{bound:g}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{label}}} {total:.6f}')
+            lines.append(f'{self.name}_count{{{label}}} {count}')
+        return lines
+
+
+class Counter:
+    """Thread-safe counter keyed by a tuple of label values"""
+
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + 1
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = sorted(self._values.items())
+        for label_values, value in snapshot:
+            labels = ','.join(f'{k}="{_escape(v)}"' for k, v in zip(self.labels, label_values))
+            lines.append(f'{self.name}{{{labels}}} {value}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REQUEST_SECONDS = Histogram('http_request_duration_seconds', 'Wall time per request', 'endpoint')
+SQL_SECONDS = Histogram('http_request_sql_seconds', 'Time spent executing SQL per request', 'endpoint')
+SQL_QUERIES = Histogram('http_request_sql_queries', 'SQL statements executed per request', 'endpoint',
+                        QUERY_COUNT_BUCKETS)
+RENDER_SECONDS = Histogram('http_request_render_seconds', 'Time spent rendering templates per request',
+                           'endpoint')
+REQUESTS = Counter('http_requests_total', 'Finished requests', ('endpoint', 'method', 'status'))
+ALL_METRICS = [REQUEST_SECONDS, SQL_SECONDS, SQL_QUERIES, RENDER_SECONDS, REQUESTS]
+
+
+class RequestStats:
+    """Timings collected for the request being handled (stored on flask.g)"""
+
+    __slots__ = ('started', 'sql_seconds', 'sql_count', 'queries', 'render_seconds', 'render_started')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_seconds = 0.0
+        self.sql_count = 0
+        self.queries = []
+        self.render_seconds = 0.0
+        self.render_started = None
+
+    def add_query(self, sql, seconds):
+        self.sql_seconds += seconds
+        self.sql_count += 1
+        if len(self.queries) < MAX_LOGGED_QUERIES:
+            self.queries.append((sql, seconds))
+
+
+def _current_stats():
+    return g.get('request_stats') if has_request_context() else None
+
+
+class InstrumentedCursor:
+    """Cursor proxy that times execute()/executemany() for the current request"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def _timed(self, method, query, args):
+        stats = _current_stats()
+        if stats is None:
+            return method(query, args)
+        started = time.perf_counter()
+        try:
+            return method(query, args)
+        finally:
+            stats.add_query(' '.join(str(query).split()), time.perf_counter() - started)
+
+    def execute(self, query, args=None):
+        return self._timed(self._cursor.execute, query, args)
+
+    def executemany(self, query, args):
+        return self._timed(self._cursor.executemany, query, args)
+
+
+def instrument_cursor(cursor):
+    return InstrumentedCursor(cursor)
+
+
+def expose():
+    lines = []
+    for metric in ALL_METRICS:
+        lines.extend(metric.expose())
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app, slow_request_ms=500.0, metrics_token=None):
+    """Record every request and register the admin-only /metrics endpoint.
+
+    /metrics is open to a logged-in admin session, or to a scraper that
+    sends `Authorization: Bearer <metrics_token>` when a token is set.
+    """
+    slow_seconds = slow_request_ms / 1000.0
+
+    @app.before_request
+    def start_request_stats():
+        g.request_stats = RequestStats()
+
+    def render_started(sender, template, context, **extra):
+        stats = _current_stats()
+        if stats is not None:
+            stats.render_started = time.perf_counter()
+
+    def render_finished(sender, template, context, **extra):
+        stats = _current_stats()
+        if stats is not None and stats.render_started is not None:
+            stats.render_seconds += time.perf_counter() - stats.render_started
+            stats.render_started = None
+
+    before_render_template.connect(render_started, app)
+    template_rendered.connect(render_finished, app)
+
+    @app.after_request
+    def record_request_stats(response):
+        stats = g.pop('request_stats', None)
+        if stats is None:
+            return response
+        elapsed = time.perf_counter() - stats.started
+        endpoint = request.endpoint or '<unmatched>'
+        REQUEST_SECONDS.observe(endpoint, elapsed)
+        SQL_SECONDS.observe(endpoint, stats.sql_seconds)
+        SQL_QUERIES.observe(endpoint, stats.sql_count)
+        RENDER_SECONDS.observe(endpoint, stats.render_seconds)
+        REQUESTS.inc(endpoint, request.method, str(response.status_code))
+        if elapsed >= slow_seconds:
+            _log_slow_request(app, endpoint, response.status_code, elapsed, stats)
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        token = request.headers.get('Authorization', '')
+        if not (metrics_token and token == f'Bearer {metrics_token}'):
+            if 'user_id' not in session or session.get('role') != 'admin':
+                return redirect(url_for('login_page'))
+        return Response(expose(), mimetype='text/plain; version=0.0.4')
+
+
+def _log_slow_request(app, endpoint, status, elapsed, stats):
+    lines = [f"Slow request: {request.method} {request.path} ({endpoint}) -> {status} "
+             f"in {elapsed * 1000:.1f} ms; SQL {stats.sql_count} quer{'y' if stats.sql_count == 1 else 'ies'} "
+             f"{stats.sql_seconds * 1000:.1f} ms; render {stats.render_seconds * 1000:.1f} ms"]
+    lines.extend(f"  {seconds * 1000:8.2f} ms  {sql}" for sql, seconds in stats.queries)
+    if stats.sql_count > len(stats.queries):
+        lines.append(f"  ... {stats.sql_count - len(stats.queries)} more statement(s) not shown")
+    app.logger.warning('\n'.join(lines))
@@ -0,0 +1,715 @@
+"""Versioned schema migrations for the Barangay e-Document database.
+
+Migrations are written against MySQL; on the SQLite backend the helpers
+below translate the handful of MySQL-only DDL bits (AUTO_INCREMENT,
+ENGINE=, inline KEYs, CHANGE / AFTER) and read the catalog from PRAGMAs
+instead of information_schema.
+
+Usage:
+    python migrations.py upgrade     # apply pending migrations
+    python migrations.py status      # list applied / pending versions
+    python migrations.py check       # compare column types, EXPLAIN every route query
+"""
+import re
+import sys
+import unicodedata
+
+from backends import MYSQL, SQLITE, dialect_of
+
+
+# ==================== HELPERS ====================
+
+def column_exists(cur, table, column):
+    if dialect_of(cur) == SQLITE:
+        cur.execute(f'PRAGMA table_info({table})')
+        return any(row['name'] == column for row in cur.fetchall())
+    cur.execute('''SELECT COUNT(*) AS cnt FROM information_schema.COLUMNS
+                   WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s''',
+                (table, column))
+    return cur.fetchone()['cnt'] > 0
+
+
+def index_exists(cur, table, index):
+    if dialect_of(cur) == SQLITE:
+        cur.execute("SELECT COUNT(*) AS cnt FROM sqlite_master WHERE type = 'index' AND name = %s", (index,))
+        return cur.fetchone()['cnt'] > 0
+    cur.execute('''SELECT COUNT(*) AS cnt FROM information_schema.STATISTICS
+                   WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s''',
+                (table, index))
+    return cur.fetchone()['cnt'] > 0
+
+
+def create_index(cur, table, index, columns):
+    if not index_exists(cur, table, index):
+        cur.execute(f'CREATE INDEX {index} ON {table} ({columns})')
+
+
+def create_table(cur, sql):
+    """CREATE TABLE IF NOT EXISTS written for MySQL, translated for SQLite"""
+    if dialect_of(cur) != SQLITE:
+        cur.execute(sql)
+        return
+    table = re.search(r'CREATE TABLE IF NOT EXISTS (\w+)', sql).group(1)
+    keys = re.findall(r'^\s*KEY (\w+) \(([^)]*)\),?\s*$', sql, re.M)
+    sql = re.sub(r'^\s*KEY \w+ \([^)]*\),?[ \t]*\n', '', sql, flags=re.M)
+    sql = re.sub(r'\b(BIG)?INT AUTO_INCREMENT PRIMARY KEY', 'INTEGER PRIMARY KEY AUTOINCREMENT', sql)
+    sql = re.sub(r'\)\s*ENGINE=\w+', ')', sql)
+    cur.execute(sql)
+    for index, columns in keys:
+        create_index(cur, table, index, columns)
+
+
+def add_column(cur, table, column, definition, after=None):
+    if not column_exists(cur, table, column):
+        position = f' AFTER {after}' if after and dialect_of(cur) != SQLITE else ''
+        cur.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}{position}')
+
+
+# ==================== MIGRATIONS ====================
+
+def m001_base_tables(cur):
+    """Canonical users / requests / all_records tables"""
+    create_table(cur, '''
+    CREATE TABLE IF NOT EXISTS users (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        first_name VARCHAR(255) NOT NULL,
+        last_name VARCHAR(255) NOT NULL,
+        fullname VARCHAR(511) NOT NULL,
+        email VARCHAR(255) NOT NULL UNIQUE,
+        password VARCHAR(255) NOT NULL,
+        contact VARCHAR(50),
+        birthdate VARCHAR(50),
+        civil_status VARCHAR(50),
+        address TEXT,
+        fathers_name VARCHAR(255),
+        mothers_name VARCHAR(255),
+        birthplace VARCHAR(255),
+        role VARCHAR(50) DEFAULT 'user',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    ) ENGINE=InnoDB
+    ''')
+
+    create_table(cur, '''
+    CREATE TABLE IF NOT EXISTS requests (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        user_id INT NOT NULL,
+        full_name VARCHAR(511) NOT NULL,
+        email VARCHAR(255) NOT NULL DEFAULT '',
+        document_type VARCHAR(255) NOT NULL,
+        address TEXT NOT NULL,
+        contact VARCHAR(50) NOT NULL,
+        purpose TEXT NOT NULL,
+        status VARCHAR(50) DEFAULT 'Pending',
+        date_submitted TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+    ) ENGINE=InnoDB
+    ''')
+
+    create_table(cur, '''
+    CREATE TABLE IF NOT EXISTS all_records (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        request_id INT NOT NULL,
+        user_id INT NOT NULL,
+        fullname VARCHAR(511) NOT NULL,
+        document_type VARCHAR(255) NOT NULL,
+        status VARCHAR(50) NOT NULL,
+        date_submitted TIMESTAMP NULL,
+        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    ) ENGINE=InnoDB
+    ''')
+
+
+def m002_reconcile_columns(cur):
+    """Bring tables created by the old init_db() / init_mysql.py in line"""
+    # init_db() used created_at, the routes and init_mysql.py use date_submitted
+    if column_exists(cur, 'requests', 'created_at') and not column_exists(cur, 'requests', 'date_submitted'):
+        if dialect_of(cur) == SQLITE:
+            cur.execute('ALTER TABLE requests RENAME COLUMN created_at TO date_submitted')
+        else:
+            cur.execute('ALTER TABLE requests CHANGE created_at date_submitted TIMESTAMP DEFAULT CURRENT_TIMESTAMP')
+
+    # init_db() had no email on requests, user_dashboard inserts one
+    if not column_exists(cur, 'requests', 'email'):
+        add_column(cur, 'requests', 'email', "VARCHAR(255) NOT NULL DEFAULT ''", after='full_name')
+        cur.execute('UPDATE requests SET email = (SELECT u.email FROM users u WHERE u.id = requests.user_id)')
+
+    # init_mysql.py had no role column, so there was no way to be admin
+    add_column(cur, 'users', 'role', "VARCHAR(50) DEFAULT 'user'", after='birthplace')
+
+
+def m003_hot_query_indexes(cur):
+    """Indexes backing the dashboard, status and archive queries"""
+    # InnoDB appends the primary key to every secondary index, so these
+    # also serve the (date_submitted, id) / (archived_at, id) keyset order.
+    create_index(cur, 'requests', 'idx_requests_date', 'date_submitted')
+    create_index(cur, 'requests', 'idx_requests_status_date', 'status, date_submitted')
+    create_index(cur, 'requests', 'idx_requests_user_status', 'user_id, status')
+    create_index(cur, 'requests', 'idx_requests_user_date', 'user_id, date_submitted')
+    create_index(cur, 'all_records', 'idx_all_records_archived', 'archived_at')
+    create_index(cur, 'all_records', 'idx_all_records_status_archived', 'status, archived_at')
+    create_index(cur, 'users', 'idx_users_role', 'role')
+
+
+# m004's backfill uses its own copy of resident_search's tokeniser as it was
+# then, so later changes to that module cannot change what m004 does.
+_M004_PARTICLES = {'de', 'del', 'dela', 'della', 'delas', 'delos', 'la', 'las', 'los',
+                   'san', 'sta', 'sto', 'santa', 'santo', 'y'}
+_M004_SUFFIXES = {'jr', 'sr', 'ii', 'iii', 'iv'}
+
+
+def _m004_name_terms(first_name, last_name):
+    text = unicodedata.normalize('NFKD', f"{first_name or ''} {last_name or ''}")
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    terms = []
+    run = []
+    for word in re.sub(r'[^a-z0-9]+', ' ', text.lower()).split():
+        if word in _M004_SUFFIXES:
+            continue
+        if word in _M004_PARTICLES:
+            run.append(word)
+            continue
+        if run:
+            terms.append(''.join(run) + word)
+            run = []
+        terms.append(word)
+    if run:
+        terms.append(''.join(run))
+    return list(dict.fromkeys(t[:64] for t in terms))
+
+
+def _m004_trigrams(term):
+    padded = f'${term}$'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def m004_resident_search_index(cur):
+    """Term and trigram tables for resident name search"""
+    create_table(cur, '''
+    CREATE TABLE IF NOT EXISTS user_search_terms (
+        term VARCHAR(64) NOT NULL,
+        user_id INT NOT NULL,
+        PRIMARY KEY (term, user_id),
+        KEY idx_user_search_terms_user (user_id),
+        FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+    ) ENGINE=InnoDB
+    ''')
+    create_table(cur, '''
+    CREATE TABLE IF NOT EXISTS user_search_trigrams (
+        trigram CHAR(3) NOT NULL,
+        user_id INT NOT NULL,
+        PRIMARY KEY (trigram, user_id),
+        KEY idx_user_search_trigrams_user (user_id),
+        FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+    ) ENGINE=InnoDB
+    ''')
+
+    cur.execute('DELETE FROM user_search_terms')
+    cur.execute('DELETE FROM user_search_trigrams')
+    cur.execute('SELECT id, first_name, last_name FROM users')
+    for row in cur.fetchall():
+        terms = _m004_name_terms(row['first_name'], row['last_name'])
+        grams = set()
+        for t in terms:
+            grams |= _m004_trigrams(t)
+        cur.executemany('INSERT INTO user_search_terms (term, user_id) VALUES (%s, %s)',
+                        [(t, row['id']) for t in terms])
+        cur.executemany('INSERT INTO user_search_trigrams (trigram, user_id) VALUES (%s, %s)',
+                        [(g, row['id']) for g in sorted(grams)])
+
+
+def m005_status_counters(cur):
+    """Per-user and global request-status counters"""
+    create_table(cur, '''
+    CREATE TABLE IF NOT EXISTS request_counters (
+        user_id INT NOT NULL,
+        status VARCHAR(50) NOT NULL,
+        cnt INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, status)
+    ) ENGINE=InnoDB
+    ''')
+    create_table(cur, '''
+    CREATE TABLE IF NOT EXISTS app_counters (
+        name VARCHAR(64) PRIMARY KEY,
+        value BIGINT NOT NULL DEFAULT 0
+    ) ENGINE=InnoDB
+    ''')
+
+    # user_id 0 holds the totals across all residents
+    cur.execute('DELETE FROM request_counters')
+    cur.execute('''INSERT INTO request_counters (user_id, status, cnt)
+                   SELECT user_id, status, COUNT(*) FROM requests GROUP BY user_id, status''')
+    cur.execute('''INSERT INTO request_counters (user_id, status, cnt)
+                   SELECT 0, status, COUNT(*) FROM requests GROUP BY status''')
+    cur.execute("REPLACE INTO app_counters (name, value) SELECT 'residents', COUNT(*) FROM users WHERE role = 'user'")
+
+
+def m006_request_updated_at(cur):
+    """requests.updated_at for status-page ETags and live updates"""
+    # Microsecond precision: two status changes in the same second must
+    # still produce different page versions. SQLite cannot ADD COLUMN with
+    # a CURRENT_TIMESTAMP default; the application sets it on every write.
+    if dialect_of(cur) == SQLITE:
+        add_column(cur, 'requests', 'updated_at', 'TIMESTAMP(6) NULL')
+    else:
+        add_column(cur, 'requests', 'updated_at',
+                   'TIMESTAMP(6) NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)',
+                   after='date_submitted')
+    cur.execute('UPDATE requests SET updated_at = date_submitted WHERE updated_at IS NULL')
+    create_index(cur, 'requests', 'idx_requests_user_updated', 'user_id, updated_at')
+
+
+def m007_notification_outbox(cur):
+    """Outbox of resident SMS / email notifications for the worker"""
+    create_table(cur, '''
+    CREATE TABLE IF NOT EXISTS notification_outbox (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        request_id INT NOT NULL,
+        user_id INT NOT NULL,
+        channel VARCHAR(16) NOT NULL,
+        recipient VARCHAR(255) NOT NULL,
+        subject VARCHAR(255) NOT NULL,
+        body TEXT NOT NULL,
+        state VARCHAR(16) NOT NULL DEFAULT 'pending',
+        attempts INT NOT NULL DEFAULT 0,
+        next_attempt_at TIMESTAMP NULL,
+        last_error VARCHAR(500) NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        sent_at TIMESTAMP NULL
+    ) ENGINE=InnoDB
+    ''')
+    # The worker's claim query: state = 'pending' AND next_attempt_at <= now
+    create_index(cur, 'notification_outbox', 'idx_outbox_due', 'state, next_attempt_at')
+
+
+def m008_document_type_indexes(cur):
+    """Indexes for the API's document_type filter on requests and records"""
+    create_index(cur, 'requests', 'idx_requests_type_date', 'document_type, date_submitted')
+    create_index(cur, 'all_records', 'idx_all_records_type_archived', 'document_type, archived_at')
+
+
+def m009_report_rollups(cur):
+    """Request status history and the daily report rollups"""
+    create_table(cur, '''
+    CREATE TABLE IF NOT EXISTS request_status_history (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        request_id INT NOT NULL,
+        user_id INT NOT NULL,
+        document_type VARCHAR(255) NOT NULL,
+        from_status VARCHAR(50) NULL,
+        to_status VARCHAR(50) NOT NULL,
+        changed_at TIMESTAMP(6) NOT NULL
+    ) ENGINE=InnoDB
+    ''')
+    create_index(cur, 'request_status_history', 'idx_status_history_request', 'request_id, changed_at')
+    create_table(cur, '''
+    CREATE TABLE IF NOT EXISTS report_daily_requests (
+        day DATE NOT NULL,
+        document_type VARCHAR(255) NOT NULL,
+        status VARCHAR(50) NOT NULL,
+        cnt INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, document_type, status)
+    ) ENGINE=InnoDB
+    ''')
+    create_table(cur, '''
+    CREATE TABLE IF NOT EXISTS report_daily_turnaround (
+        day DATE NOT NULL,
+        document_type VARCHAR(255) NOT NULL,
+        bucket INT NOT NULL,
+        cnt INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, document_type, bucket)
+    ) ENGINE=InnoDB
+    ''')
+
+    # Only submissions have a known time; earlier status changes were never
+    # recorded, so the turnaround rollup starts empty.
+    cur.execute('''INSERT INTO request_status_history
+                   (request_id, user_id, document_type, from_status, to_status, changed_at)
+                   SELECT r.id, r.user_id, r.document_type, NULL, 'Pending', r.date_submitted FROM requests r
+                   WHERE r.date_submitted IS NOT NULL
+                     AND NOT EXISTS (SELECT 1 FROM request_status_history h WHERE h.request_id = r.id)''')
+    # Volume: every request and archived record, by the day it was submitted
+    cur.execute('DELETE FROM report_daily_requests')
+    cur.execute('''INSERT INTO report_daily_requests (day, document_type, status, cnt)
+                   SELECT DATE(date_submitted), document_type, status, COUNT(*) FROM (
+                       SELECT date_submitted, document_type, status FROM requests
+                       UNION ALL
+                       SELECT date_submitted, document_type, status FROM all_records
+                   ) submitted
+                   WHERE date_submitted IS NOT NULL
+                   GROUP BY DATE(date_submitted), document_type, status''')
+
+
+def m010_request_claims(cur):
+    """Admin work-queue claims on requests"""
+    add_column(cur, 'requests', 'claimed_by', 'INT NULL', after='status')
+    add_column(cur, 'requests', 'claim_expires_at', 'TIMESTAMP NULL', after='claimed_by')
+    # "My claims", oldest first; the claim itself walks
+    # idx_requests_status_date or idx_requests_type_date.
+    create_index(cur, 'requests', 'idx_requests_claimed', 'claimed_by, date_submitted')
+
+
+def m011_users_email_nocase(cur):
+    """Case-insensitive email index for SQLite"""
+    # MySQL's default collation already compares emails case-insensitively;
+    # SQLite needs a NOCASE index for email lookups (sign-in, registration
+    # and resident_import's duplicate check).
+    if dialect_of(cur) == SQLITE:
+        create_index(cur, 'users', 'idx_users_email_nocase', 'email COLLATE NOCASE')
+
+
+def m012_canonical_column_types(cur):
+    """One set of column types and widths for users and requests"""
+    # Tables made by the old init_mysql.py kept its narrower columns
+    # (VARCHAR(100) names, VARCHAR(150) emails, birthdate as DATE, nullable
+    # request contacts); m001's definitions are the canonical ones and each
+    # change here only widens. SQLite tables were only ever made by m001.
+    if dialect_of(cur) == SQLITE:
+        return
+    columns = {
+        'users': [
+            ('first_name', 'VARCHAR(255) NOT NULL'),
+            ('last_name', 'VARCHAR(255) NOT NULL'),
+            ('fullname', 'VARCHAR(511) NOT NULL'),
+            ('email', 'VARCHAR(255) NOT NULL'),
+            ('contact', 'VARCHAR(50) NULL'),
+            ('birthdate', 'VARCHAR(50) NULL'),
+            ('address', 'TEXT NULL'),
+            ('fathers_name', 'VARCHAR(255) NULL'),
+            ('mothers_name', 'VARCHAR(255) NULL'),
+            ('birthplace', 'VARCHAR(255) NULL'),
+        ],
+        'requests': [
+            ('full_name', 'VARCHAR(511) NOT NULL'),
+            ('email', "VARCHAR(255) NOT NULL DEFAULT ''"),
+            ('document_type', 'VARCHAR(255) NOT NULL'),
+            ('address', 'TEXT NOT NULL'),
+            ('contact', 'VARCHAR(50) NOT NULL'),
+        ],
+    }
+    cur.execute("UPDATE requests SET contact = '' WHERE contact IS NULL")
+    for table, definitions in columns.items():
+        cur.execute('''SELECT COLUMN_NAME AS name, COLUMN_TYPE AS type, IS_NULLABLE AS nullable
+                       FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s''',
+                    (table,))
+        current = {row['name']: (row['type'].lower(), row['nullable'] == 'YES') for row in cur.fetchall()}
+        changes = [f'MODIFY {column} {definition}' for column, definition in definitions
+                   if column in current
+                   and current[column] != (definition.split()[0].lower(), 'NOT NULL' not in definition)]
+        if changes:
+            cur.execute(f"ALTER TABLE {table} {', '.join(changes)}")
+
+
+MIGRATIONS = [
+    (1, m001_base_tables),
+    (2, m002_reconcile_columns),
+    (3, m003_hot_query_indexes),
+    (4, m004_resident_search_index),
+    (5, m005_status_counters),
+    (6, m006_request_updated_at),
+    (7, m007_notification_outbox),
+    (8, m008_document_type_indexes),
+    (9, m009_report_rollups),
+    (10, m010_request_claims),
+    (11, m011_users_email_nocase),
+    (12, m012_canonical_column_types),
+]
+
+
+# ==================== RUNNER ====================
+
+def ensure_versions_table(cur):
+    create_table(cur, '''
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        description VARCHAR(255) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    ) ENGINE=InnoDB
+    ''')
+
+
+def applied_versions(cur):
+    ensure_versions_table(cur)
+    cur.execute('SELECT version FROM schema_migrations')
+    return {row['version'] for row in cur.fetchall()}
+
+
+def migrate(conn):
+    """Apply every pending migration in order and return the versions applied.
+
+    MySQL commits DDL implicitly, so each migration is written to be
+    re-runnable; the version row is only recorded once it has finished.
+    (SQLite DDL is transactional, so there a migration is all or nothing.)
+    """
+    cur = conn.cursor()
+    done = applied_versions(cur)
+    applied = []
+    for version, fn in MIGRATIONS:
+        if version in done:
+            continue
+        fn(cur)
+        cur.execute('INSERT INTO schema_migrations (version, description) VALUES (%s, %s)',
+                    (version, fn.__doc__.strip()))
+        conn.commit()
+        applied.append(version)
+    conn.commit()
+    cur.close()
+    return applied
+
+
+# ==================== COLUMN TYPE CHECK ====================
+
+# What the migrations leave users, requests and all_records with, whichever
+# script first created them: the canonical schema `check` holds a database to.
+COLUMN_TYPES = {
+    'users': {
+        'id': 'int', 'first_name': 'varchar(255)', 'last_name': 'varchar(255)', 'fullname': 'varchar(511)',
+        'email': 'varchar(255)', 'password': 'varchar(255)', 'contact': 'varchar(50)', 'birthdate': 'varchar(50)',
+        'civil_status': 'varchar(50)', 'address': 'text', 'fathers_name': 'varchar(255)',
+        'mothers_name': 'varchar(255)', 'birthplace': 'varchar(255)', 'role': 'varchar(50)',
+        'created_at': 'timestamp',
+    },
+    'requests': {
+        'id': 'int', 'user_id': 'int', 'full_name': 'varchar(511)', 'email': 'varchar(255)',
+        'document_type': 'varchar(255)', 'address': 'text', 'contact': 'varchar(50)', 'purpose': 'text',
+        'status': 'varchar(50)', 'claimed_by': 'int', 'claim_expires_at': 'timestamp',
+        'date_submitted': 'timestamp', 'updated_at': 'timestamp(6)',
+    },
+    'all_records': {
+        'id': 'int', 'request_id': 'int', 'user_id': 'int', 'fullname': 'varchar(511)',
+        'document_type': 'varchar(255)', 'status': 'varchar(50)', 'date_submitted': 'timestamp',
+        'archived_at': 'timestamp',
+    },
+}
+
+
+def _column_type(declared):
+    """MySQL's COLUMN_TYPE or SQLite's declared type, compared the same way
+    (no INT display widths, SQLite's INTEGER primary keys read as int)"""
+    declared = declared.lower()
+    if declared == 'integer':
+        return 'int'
+    return re.sub(r'^((tiny|small|medium|big)?int)\(\d+\)', r'\1', declared)
+
+
+def check_column_types(conn):
+    """Compare the tables in COLUMN_TYPES with the database; return a list
+    of (table.column, problem)"""
+    cur = conn.cursor()
+    problems = []
+    for table, expected in COLUMN_TYPES.items():
+        if dialect_of(conn) == SQLITE:
+            cur.execute(f'PRAGMA table_info({table})')
+            actual = {row['name']: _column_type(row['type']) for row in cur.fetchall()}
+        else:
+            cur.execute('''SELECT COLUMN_NAME AS name, COLUMN_TYPE AS type FROM information_schema.COLUMNS
+                           WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s''', (table,))
+            actual = {row['name']: _column_type(row['type']) for row in cur.fetchall()}
+        for column, column_type in expected.items():
+            if column not in actual:
+                problems.append((f'{table}.{column}', 'missing'))
+            elif actual[column] != column_type:
+                problems.append((f'{table}.{column}', f'is {actual[column]}, expected {column_type}'))
+        for column in actual:
+            if column not in expected:
+                problems.append((f'{table}.{column}', 'not in COLUMN_TYPES'))
+    cur.close()
+    return problems
+
+
+# ==================== QUERY PLAN CHECK ====================
+
+_SELECT = re.compile(r'^\s*SELECT\b', re.I)
+# EXPLAIN the claim query without its row locks; the plan is the same
+_LOCKING = re.compile(r'\s+FOR\s+UPDATE(\s+SKIP\s+LOCKED)?\s*$', re.I)
+_FROM = re.compile(r'\bFROM\s+(\w+)', re.I)
+
+# Sorts no index can serve, allowed on purpose: the typo-tolerant search
+# ranks residents by how many trigrams they share with the query, and a
+# search of several terms ranks the residents matching all of them by
+# exact-term hits; both are counts computed per query (the lookups
+# themselves are index range scans).
+EXPECTED_SORTS = {'admin_dashboard.search:user_search_trigrams',
+                  'admin_dashboard.search_two_terms:user_search_terms',
+                  'admin_dashboard.search_two_terms:user_search_trigrams'}
+
+class _CapturingCursor:
+    """Records the SQL a helper would run without touching the database;
+    every read returns `rows` (default: nothing)"""
+
+    def __init__(self, dialect=MYSQL, rows=()):
+        self.dialect = dialect
+        self.rows = list(rows)
+        self.calls = []
+        self.rowcount = 0
+        self.lastrowid = None
+
+    def execute(self, sql, params=()):
+        self.calls.append((sql, tuple(params or ())))
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return list(self.rows)
+
+    def close(self):
+        pass
+
+
+class _CapturingConnection:
+    """Stands in for get_db() so a Repository runs its real statements
+    against a _CapturingCursor"""
+
+    def __init__(self, cursor):
+        self.dialect = cursor.dialect
+        self._cursor = cursor
+
+    def cursor(self):
+        return self._cursor
+
+    def commit(self):
+        pass
+
+    rollback = close = commit
+
+
+def _route_calls():
+    """(name, call, rows) for what each route asks the Repository on every
+    hit; `rows` is what every read returns, enough to reach the later
+    statements (a search with a match goes on to read terms and users)"""
+    from datetime import datetime
+
+    from flask import Flask
+
+    import api
+    from pagination import encode_cursor
+
+    cursor = encode_cursor([datetime(2025, 1, 1), 1000])
+
+    def api_page(resource, query, owner_id=None):
+        def call(repo):
+            with Flask(__name__).test_request_context(query_string=query):
+                select, keys, where, params, _ = api.build_page_query(resource, owner_id)
+            repo.page(select, keys, where, params, after=cursor)
+        return call
+
+    match = {'user_id': 1, 'id': 1, 'term': 'delacruz', 'hits': 6}
+    calls = [
+        ('login', lambda repo: repo.login_user('admin@example.com')),
+        ('user_dashboard.profile', lambda repo: repo.user_by_id(1)),
+        ('user_dashboard.profile_version', lambda repo: repo.profile_version()),
+        ('user_dashboard.version', lambda repo: repo.request_versions([1])),
+        ('user_dashboard.counts', lambda repo: repo.status_counts(1)),
+        ('user_dashboard.list', lambda repo: repo.user_requests(1)),
+        ('status', lambda repo: repo.user_requests(1, columns='id, document_type, status')),
+        ('admin_dashboard.stats', lambda repo: repo.admin_stats()),
+        ('admin_dashboard.search', lambda repo: repo.resident_page('delacr'), [match]),
+        ('admin_dashboard.search_two_terms', lambda repo: repo.resident_page('juan delacr'), [match]),
+        ('admin_dashboard.requests', lambda repo: repo.request_page()),
+        ('admin_dashboard.requests_next', lambda repo: repo.request_page(after=cursor)),
+        ('admin_dashboard.requests_by_status', lambda repo: repo.request_page('Pending', after=cursor)),
+        ('admin_dashboard.users', lambda repo: repo.resident_page('')),
+        ('all_records', lambda repo: repo.record_page(after=cursor)),
+        ('all_records.by_status', lambda repo: repo.record_page('Completed', after=cursor)),
+        ('api.requests_by_type', api_page('requests', {'fields': 'id,status', 'document_type': 'Barangay Clearance'})),
+        ('api.requests_by_date', api_page('requests', {'fields': 'id,status', 'date_from': '2025-01-01',
+                                                       'date_to': '2025-01-31'})),
+        ('api.resident_requests', api_page('requests', {'fields': 'id,status'}, owner_id=1)),
+        ('api.records_by_type', api_page('records', {'fields': 'id,status', 'document_type': 'Barangay Clearance'})),
+        ('admin_queue.claim', lambda repo: repo.claim_requests(1, 10)),
+        ('admin_queue.claim_by_type', lambda repo: repo.claim_requests(1, 10, document_type='Barangay Clearance')),
+        ('admin_queue.mine', lambda repo: repo.claimed_requests(1)),
+    ]
+    return [call if len(call) == 3 else (*call, ()) for call in calls]
+
+
+def route_queries(conn=None):
+    """(name, sql, params) for the SELECTs each route runs on every hit, in
+    the SQL dialect of `conn`. They are recorded from the real Repository
+    methods, so the check follows the routes' queries as they change."""
+    from repository import Repository
+
+    dialect = dialect_of(conn) if conn is not None else MYSQL
+    queries = []
+    for name, call, rows in _route_calls():
+        cur = _CapturingCursor(dialect, rows)
+        call(Repository(None, lambda: _CapturingConnection(cur)))
+        selects = [(_LOCKING.sub('', sql), params) for sql, params in cur.calls if _SELECT.match(sql)]
+        seen = {}
+        for sql, params in selects:
+            # A route with several statements names each after its table
+            label = name if len(selects) == 1 else f'{name}:{_FROM.search(sql).group(1)}'
+            seen[label] = seen.get(label, 0) + 1
+            queries.append((label if seen[label] == 1 else f'{label}#{seen[label]}', sql, params))
+    return queries
+
+
+def check_query_plans(conn):
+    """EXPLAIN each route query; return a list of (name, table, problem)"""
+    if dialect_of(conn) == SQLITE:
+        return _check_sqlite_query_plans(conn)
+    cur = conn.cursor()
+    problems = []
+    for name, sql, params in route_queries(conn):
+        cur.execute('EXPLAIN ' + sql, params)
+        for row in cur.fetchall():
+            extra = row.get('Extra') or ''
+            if row.get('type') == 'ALL':
+                problems.append((name, row.get('table'), 'full table scan'))
+            if 'Using filesort' in extra and name not in EXPECTED_SORTS:
+                problems.append((name, row.get('table'), 'filesort'))
+    cur.close()
+    return problems
+
+
+def _check_sqlite_query_plans(conn):
+    cur = conn.cursor()
+    problems = []
+    for name, sql, params in route_queries(conn):
+        cur.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        for row in cur.fetchall():
+            detail = row['detail']
+            if detail.startswith('SCAN ') and ' USING ' not in detail:
+                problems.append((name, detail.split()[1], 'full table scan'))
+            if 'USE TEMP B-TREE FOR ORDER BY' in detail and name not in EXPECTED_SORTS:
+                problems.append((name, '-', 'filesort'))
+    cur.close()
+    return problems
+
+
+def main(argv):
+    from app import get_db
+
+    command = argv[1] if len(argv) > 1 else 'upgrade'
+    conn = get_db()
+    try:
+        if command == 'upgrade':
+            applied = migrate(conn)
+            print(f"Applied migrations: {applied}" if applied else "Schema is up to date.")
+        elif command == 'status':
+            cur = conn.cursor()
+            done = applied_versions(cur)
+            cur.close()
+            for version, fn in MIGRATIONS:
+                mark = 'applied' if version in done else 'pending'
+                print(f"{version:03d} {mark:8} {fn.__doc__.strip()}")
+        elif command == 'check':
+            columns = check_column_types(conn)
+            for column, problem in columns:
+                print(f"FAIL {column}: {problem}")
+            problems = check_query_plans(conn)
+            for name, table, problem in problems:
+                print(f"FAIL {name}: {problem} on {table}")
+            if columns or problems:
+                return 1
+            print("Column types match and all route queries use an index.")
+        else:
+            print(__doc__)
+            return 2
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,345 @@
+"""Resident notifications (SMS / email) through a transactional outbox.
+
+When a request moves to one of NOTIFY_STATUSES, enqueue() writes an
+outbox row per channel (SMS to the request's contact number, email to
+its address) on the caller's cursor, so the notification commits or
+rolls back together with the status change and the admin's click never
+waits on a gateway.
+
+A separate worker process drains the outbox in batches:
+
+  * claim: lock up to --batch due rows and push their next_attempt_at out
+    by LEASE_SECONDS in one short transaction. A worker that dies mid-batch
+    leaves its rows to be picked up again once the lease runs out.
+  * send each message through the configured sender, paced per channel
+    by a token bucket (--rate messages per second);
+  * record the outcome: sent; pending again with exponential backoff and
+    jitter; or failed, after MAX_ATTEMPTS or a PermanentDeliveryError.
+
+Delivery is at least once: if the worker dies between a send and
+recording it, that message goes out again after the lease.
+
+Messages are in English: a resident's language lives only in their
+browser session.
+
+Senders are pluggable through NOTIFY_SENDER:
+  file (default)         append JSON lines to NOTIFY_OUTBOX_FILE, a local
+                         stand-in for the gateway
+  loopback               keep messages in memory (bench / dry runs)
+  package.module:factory a callable returning an object with send(message)
+
+Usage (the Procfile `worker:` process):
+    python notifications.py worker [--batch 50] [--rate 5] [--poll 2] [--once]
+    python notifications.py status
+    python notifications.py retry-failed
+    python notifications.py purge [--older-than-days 30]
+"""
+import importlib
+import json
+import os
+import random
+import re
+import signal
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+NOTIFY_STATUSES = ('Ready to be Claim', 'Rejected')
+SMS = 'sms'
+EMAIL = 'email'
+
+PENDING = 'pending'
+SENT = 'sent'
+FAILED = 'failed'
+
+DEFAULT_BATCH = 50
+DEFAULT_RATE = 5.0                  # messages per second, per channel
+LEASE_SECONDS = 300
+MAX_ATTEMPTS = 8
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 3600
+MAX_ERROR_LENGTH = 500
+
+DEFAULT_OUTBOX_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sent_notifications.jsonl')
+
+MESSAGES = {
+    'Ready to be Claim': (
+        'Your {document_type} is ready to claim',
+        'Hi {full_name}, your {document_type} request (#{request_id}) is ready to be claimed at the '
+        'barangay hall. Please bring a valid ID.',
+    ),
+    'Rejected': (
+        'Your {document_type} request was rejected',
+        'Hi {full_name}, your {document_type} request (#{request_id}) was rejected. Please check your '
+        'dashboard or visit the barangay hall for details.',
+    ),
+}
+
+_MOBILE = re.compile(r'^09\d{9}$')
+
+
+# ==================== ENQUEUE ====================
+
+def messages_for(request_row, status):
+    """Outbox rows for one request entering `status`: (request_id, user_id,
+    channel, recipient, subject, body)"""
+    if status not in MESSAGES:
+        return []
+    subject, body = MESSAGES[status]
+    values = {'full_name': request_row['full_name'], 'document_type': request_row['document_type'],
+              'request_id': request_row['id']}
+    subject, body = subject.format(**values), body.format(**values)
+    rows = []
+    if request_row.get('contact') and _MOBILE.match(request_row['contact']):
+        rows.append((request_row['id'], request_row['user_id'], SMS, request_row['contact'], subject, body))
+    if request_row.get('email'):
+        rows.append((request_row['id'], request_row['user_id'], EMAIL, request_row['email'], subject, body))
+    return rows
+
+
+def enqueue(cur, request_rows, status):
+    """Queue notifications for requests that just moved to `status`, on the
+    caller's cursor (and so in the caller's transaction)"""
+    rows = [m for r in request_rows for m in messages_for(r, status)]
+    if rows:
+        now = datetime.now()
+        cur.executemany('''INSERT INTO notification_outbox
+                           (request_id, user_id, channel, recipient, subject, body, state, next_attempt_at)
+                           VALUES (%s, %s, %s, %s, %s, %s, %s, %s)''',
+                        [row + (PENDING, now) for row in rows])
+    return len(rows)
+
+
+# ==================== SENDERS ====================
+
+class DeliveryError(Exception):
+    """The gateway failed for now; the message is retried with backoff"""
+
+
+class PermanentDeliveryError(DeliveryError):
+    """The message can never be delivered (bad number, rejected address)"""
+
+
+class FileSender:
+    """Appends each message as a JSON line; a stand-in for a real gateway"""
+
+    def __init__(self, path=DEFAULT_OUTBOX_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        line = json.dumps(dict(message, delivered_at=datetime.now().isoformat(timespec='seconds')))
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+
+
+class LoopbackSender:
+    """Keeps delivered messages in memory"""
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, message):
+        self.sent.append(message)
+
+
+def load_sender(spec=None):
+    spec = spec or os.getenv('NOTIFY_SENDER', 'file')
+    if spec == 'file':
+        return FileSender(os.getenv('NOTIFY_OUTBOX_FILE', DEFAULT_OUTBOX_FILE))
+    if spec == 'loopback':
+        return LoopbackSender()
+    module, _, factory = spec.partition(':')
+    if not factory:
+        raise ValueError(f"NOTIFY_SENDER must be 'file', 'loopback' or 'module:factory', not {spec!r}")
+    return getattr(importlib.import_module(module), factory)()
+
+
+class TokenBucket:
+    """At most `rate` takes per second on average, bursts of up to `burst`"""
+
+    def __init__(self, rate, burst=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.burst
+        self._clock = clock
+        self._sleep = sleep
+        self._last = clock()
+
+    def take(self):
+        now = self._clock()
+        self.tokens = min(self.burst, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+        if self.tokens < 1:
+            self._sleep((1 - self.tokens) / self.rate)
+            self._last = self._clock()
+            self.tokens = 1
+        self.tokens -= 1
+
+
+# ==================== WORKER ====================
+
+def backoff_seconds(attempts, rng=random):
+    """Exponential backoff with jitter: ~30s, 1m, 2m, 4m ... capped at an hour"""
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempts - 1))
+    return delay * rng.uniform(0.5, 1.0)
+
+
+def claim(conn, batch=DEFAULT_BATCH, lease_seconds=LEASE_SECONDS):
+    """Lock up to `batch` due messages and lease them to this worker"""
+    now = datetime.now()
+    cur = conn.cursor()
+    try:
+        cur.execute('''SELECT id, request_id, user_id, channel, recipient, subject, body, attempts
+                       FROM notification_outbox
+                       WHERE state = %s AND next_attempt_at <= %s
+                       ORDER BY next_attempt_at LIMIT %s FOR UPDATE''', (PENDING, now, batch))
+        rows = cur.fetchall()
+        if rows:
+            placeholders = ','.join(['%s'] * len(rows))
+            cur.execute(f'UPDATE notification_outbox SET next_attempt_at = %s WHERE id IN ({placeholders})',
+                        (now + timedelta(seconds=lease_seconds), *[row['id'] for row in rows]))
+        conn.commit()
+        return rows
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def _record(conn, message_id, sql, params):
+    cur = conn.cursor()
+    try:
+        cur.execute(sql, (*params, message_id))
+        conn.commit()
+    finally:
+        cur.close()
+
+
+def deliver(conn, rows, sender, buckets, log=print, rng=random):
+    """Send claimed rows one by one and record each outcome; returns
+    {'sent': n, 'retry': n, 'failed': n}"""
+    outcome = {SENT: 0, 'retry': 0, FAILED: 0}
+    for row in rows:
+        buckets[row['channel']].take()
+        message = {k: row[k] for k in ('id', 'request_id', 'user_id', 'channel', 'recipient', 'subject', 'body')}
+        attempts = row['attempts'] + 1
+        try:
+            sender.send(message)
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'[:MAX_ERROR_LENGTH]
+            if isinstance(e, PermanentDeliveryError) or attempts >= MAX_ATTEMPTS:
+                _record(conn, row['id'], 'UPDATE notification_outbox SET state = %s, attempts = %s, last_error = %s '
+                        'WHERE id = %s', (FAILED, attempts, error))
+                outcome[FAILED] += 1
+                log(f"message #{row['id']} ({row['channel']}) failed after {attempts} attempt(s): {error}")
+            else:
+                retry_at = datetime.now() + timedelta(seconds=backoff_seconds(attempts, rng))
+                _record(conn, row['id'], 'UPDATE notification_outbox SET attempts = %s, last_error = %s, '
+                        'next_attempt_at = %s WHERE id = %s', (attempts, error, retry_at))
+                outcome['retry'] += 1
+            continue
+        _record(conn, row['id'], 'UPDATE notification_outbox SET state = %s, attempts = %s, sent_at = %s '
+                'WHERE id = %s', (SENT, attempts, datetime.now()))
+        outcome[SENT] += 1
+    return outcome
+
+
+def run_worker(connect, sender, batch=DEFAULT_BATCH, rate=DEFAULT_RATE, poll=2.0, once=False,
+               stop=None, log=print):
+    """Drain the outbox until `stop` is set (or, with once=True, until
+    nothing is due). A fresh connection is used per batch so an idle
+    worker holds none."""
+    stop = stop or threading.Event()
+    buckets = {SMS: TokenBucket(rate), EMAIL: TokenBucket(rate)}
+    # The lease must outlast a rate-limited batch, or another worker
+    # would re-claim its tail while it is still being sent.
+    lease = max(LEASE_SECONDS, 2 * batch / rate)
+    totals = {SENT: 0, 'retry': 0, FAILED: 0}
+    while not stop.is_set():
+        try:
+            conn = connect()
+            try:
+                rows = claim(conn, batch, lease)
+                if rows:
+                    for key, n in deliver(conn, rows, sender, buckets, log).items():
+                        totals[key] += n
+            finally:
+                conn.close()
+        except Exception as e:
+            if once:
+                raise
+            # Database hiccup: the leased rows fall due again on their own.
+            log(f"outbox batch failed, retrying in {poll:g}s: {type(e).__name__}: {e}")
+            stop.wait(poll)
+            continue
+        if rows:
+            log(f"batch of {len(rows)}: {totals[SENT]} sent, {totals['retry']} to retry, "
+                f"{totals[FAILED]} failed so far")
+        elif once:
+            break
+        else:
+            stop.wait(poll)
+    return totals
+
+
+# ==================== MAINTENANCE ====================
+
+def state_counts(cur):
+    cur.execute('SELECT state, COUNT(*) AS cnt FROM notification_outbox GROUP BY state')
+    return {row['state']: row['cnt'] for row in cur.fetchall()}
+
+
+def main(argv):
+    import argparse
+    from app import get_db
+
+    parser = argparse.ArgumentParser(description='Deliver queued resident notifications')
+    sub = parser.add_subparsers(dest='command', required=True)
+    w = sub.add_parser('worker')
+    w.add_argument('--batch', type=int, default=DEFAULT_BATCH)
+    w.add_argument('--rate', type=float, default=float(os.getenv('NOTIFY_RATE', DEFAULT_RATE)),
+                   help='messages per second per channel')
+    w.add_argument('--poll', type=float, default=2.0, help='seconds to wait when nothing is due')
+    w.add_argument('--once', action='store_true', help='exit when nothing is due')
+    sub.add_parser('status')
+    sub.add_parser('retry-failed')
+    p = sub.add_parser('purge')
+    p.add_argument('--older-than-days', type=int, default=30)
+    args = parser.parse_args(argv[1:])
+
+    if args.command == 'worker':
+        stop = threading.Event()
+        # Heroku / gunicorn-style shutdown: finish the current message, then exit.
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        signal.signal(signal.SIGINT, lambda *_: stop.set())
+        totals = run_worker(get_db, load_sender(), args.batch, args.rate, args.poll, args.once, stop)
+        print(f"Stopped: {totals[SENT]} sent, {totals['retry']} to retry, {totals[FAILED]} failed")
+        return 0
+
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        if args.command == 'status':
+            counts = state_counts(cur)
+            for state in (PENDING, SENT, FAILED):
+                print(f"{state:<8} {counts.get(state, 0)}")
+        elif args.command == 'retry-failed':
+            cur.execute('UPDATE notification_outbox SET state = %s, attempts = 0, next_attempt_at = %s '
+                        'WHERE state = %s', (PENDING, datetime.now(), FAILED))
+            print(f"Re-queued {cur.rowcount} failed message(s).")
+        else:
+            cutoff = datetime.now() - timedelta(days=args.older_than_days)
+            cur.execute('DELETE FROM notification_outbox WHERE state = %s AND sent_at < %s', (SENT, cutoff))
+            print(f"Deleted {cur.rowcount} sent message(s) older than {args.older_than_days} days.")
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
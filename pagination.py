@@ -0,0 +1,129 @@
+import base64
+import json
+from datetime import datetime
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def page_size(value, default=DEFAULT_PAGE_SIZE):
+    """Parse a ?limit= value and clamp it to 1..MAX_PAGE_SIZE"""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def encode_cursor(values):
+    packed = []
+    for v in values:
+        if isinstance(v, datetime):
+            packed.append(['d', v.isoformat()])
+        elif isinstance(v, int):
+            packed.append(['i', v])
+        else:
+            packed.append(['s', '' if v is None else str(v)])
+    raw = json.dumps(packed, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, length):
+    """Return the key values stored in a cursor token, or None if invalid"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        packed = json.loads(raw)
+        values = []
+        for kind, v in packed:
+            if kind == 'd':
+                values.append(datetime.fromisoformat(v))
+            elif kind == 'i':
+                values.append(int(v))
+            else:
+                values.append(str(v))
+    except (ValueError, TypeError):
+        return None
+    if len(values) != length:
+        return None
+    return values
+
+
+def _seek_clause(columns, op):
+    # (a, b) < (x, y)  ->  a < x OR (a = x AND b < y), which MySQL can
+    # resolve as a range scan on a composite index.
+    parts = []
+    params_idx = []
+    for i, col in enumerate(columns):
+        eqs = [f"{columns[j]} = %s" for j in range(i)]
+        parts.append('(' + ' AND '.join(eqs + [f"{col} {op} %s"]) + ')')
+        params_idx.extend(list(range(i)) + [i])
+    return '(' + ' OR '.join(parts) + ')', params_idx
+
+
+class Page:
+    def __init__(self, rows, next_cursor=None, prev_cursor=None):
+        self.rows = rows
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+
+def fetch_page(cur, select_sql, key_columns, where=None, params=(),
+               after=None, before=None, limit=DEFAULT_PAGE_SIZE, descending=True):
+    """Run a keyset-paginated SELECT and return a Page.
+
+    `select_sql` is everything up to (not including) WHERE. `key_columns`
+    is a list of (sql_expression, row_key) pairs that together form a
+    unique sort key, e.g. [('r.date_submitted', 'date_submitted'),
+    ('r.id', 'id')]. `after` / `before` are cursor tokens taken from a
+    previous Page.
+    """
+    where = list(where or [])
+    params = list(params)
+    columns = [c for c, _ in key_columns]
+    keys = [k for _, k in key_columns]
+
+    after_vals = decode_cursor(after, len(columns))
+    before_vals = decode_cursor(before, len(columns)) if after_vals is None else None
+    backwards = before_vals is not None
+    cursor_vals = before_vals if backwards else after_vals
+
+    if cursor_vals is not None:
+        # Moving forward through a DESC list means smaller keys.
+        op = '<' if descending != backwards else '>'
+        clause, idx = _seek_clause(columns, op)
+        where.append(clause)
+        params.extend(cursor_vals[i] for i in idx)
+
+    scan_desc = descending != backwards
+    direction = 'DESC' if scan_desc else 'ASC'
+    sql = select_sql
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += ' ORDER BY ' + ', '.join(f"{c} {direction}" for c in columns)
+    sql += ' LIMIT %s'
+    params.append(limit + 1)
+
+    cur.execute(sql, tuple(params))
+    rows = list(cur.fetchall())
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+
+    def token(row):
+        return encode_cursor([row[k] for k in keys])
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if backwards:
+            next_cursor = token(rows[-1])
+            if has_more:
+                prev_cursor = token(rows[0])
+        else:
+            if has_more:
+                next_cursor = token(rows[-1])
+            if cursor_vals is not None:
+                prev_cursor = token(rows[0])
+    return Page(rows, next_cursor, prev_cursor)
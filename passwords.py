@@ -0,0 +1,166 @@
+"""Password hashing policy and its calibration.
+
+PASSWORD_HASH_METHOD is a werkzeug method string, "pbkdf2:sha256:<iterations>"
+or "scrypt:<n>:<r>:<p>". Every new hash uses it, and a successful login
+whose stored hash was made under any other method (an older iteration
+count, a different algorithm) is rehashed on the spot, so raising the cost
+needs no password resets and no migration.
+
+The right cost is whatever makes one verification take about
+PASSWORD_HASH_TARGET_MS on the machine that serves logins: high enough to
+make offline guessing expensive, low enough that a burst of logins does not
+tie up every worker thread. `calibrate` measures it:
+
+Usage:
+    python passwords.py calibrate [--target-ms 250] [--algorithm pbkdf2|scrypt]
+    python passwords.py bench [--method METHOD] [--rounds 5]
+    python passwords.py status
+"""
+import hashlib
+import os
+import secrets
+import sys
+import time
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_METHOD = 'pbkdf2:sha256:600000'
+DEFAULT_TARGET_MS = 250
+# Calibration never goes below these, however slow the machine
+MIN_PBKDF2_ITERATIONS = 100000
+MIN_SCRYPT_N = 2 ** 14
+# Werkzeug's defaults for the parts of a method string left out
+_DEFAULTS = {'pbkdf2': ('sha256', '600000'), 'scrypt': ('32768', '8', '1')}
+
+
+def canonical_method(method):
+    """`method` with werkzeug's defaults filled in, as it appears before the
+    first "$" of a hash it makes ("pbkdf2" -> "pbkdf2:sha256:600000")"""
+    algorithm, *args = method.split(':')
+    defaults = _DEFAULTS.get(algorithm)
+    if defaults is None:
+        raise ValueError(f'unsupported password hash method {method!r}')
+    return ':'.join([algorithm, *args, *defaults[len(args):]])
+
+
+def hash_method():
+    return canonical_method(os.getenv('PASSWORD_HASH_METHOD', DEFAULT_METHOD))
+
+
+def hash_password(password):
+    """Hash `password` under the current policy. A module-level function so
+    process pools can pickle it (see resident_import.py)."""
+    return generate_password_hash(password, hash_method())
+
+
+def needs_rehash(stored_hash, method=None):
+    return stored_hash.split('$', 1)[0] != (method or hash_method())
+
+
+def verify(stored_hash, password):
+    """(matches, new hash or None): the new hash is set when the password
+    matched but `stored_hash` predates the current policy"""
+    if not check_password_hash(stored_hash, password):
+        return False, None
+    if needs_rehash(stored_hash):
+        return True, hash_password(password)
+    return True, None
+
+
+# ==================== CALIBRATION ====================
+
+def time_verify(method, rounds=5):
+    """Median seconds for one check_password_hash under `method`"""
+    password = secrets.token_urlsafe(12)
+    stored = generate_password_hash(password, method)
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        check_password_hash(stored, password)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def _calibrate_pbkdf2(target):
+    # PBKDF2 time is linear in the iteration count: time a probe, scale it,
+    # round to 10k and check the result.
+    probe = 50000
+    started = time.perf_counter()
+    hashlib.pbkdf2_hmac('sha256', b'calibrate', b'salt', probe)
+    per_iteration = (time.perf_counter() - started) / probe
+    iterations = max(MIN_PBKDF2_ITERATIONS, round(target / per_iteration / 10000) * 10000)
+    return f'pbkdf2:sha256:{iterations}'
+
+
+def _calibrate_scrypt(target):
+    # scrypt's n must be a power of two: double it until the target is met.
+    n = MIN_SCRYPT_N
+    while time_verify(f'scrypt:{n}:8:1', rounds=1) < target and n < 2 ** 20:
+        n *= 2
+    return f'scrypt:{n}:8:1'
+
+
+def calibrate(target_ms=DEFAULT_TARGET_MS, algorithm='pbkdf2'):
+    """(method, measured ms): the cheapest method of `algorithm` whose
+    verification takes at least about `target_ms` here"""
+    target = target_ms / 1000
+    method = _calibrate_pbkdf2(target) if algorithm == 'pbkdf2' else _calibrate_scrypt(target)
+    return method, time_verify(method) * 1000
+
+
+def method_counts(conn):
+    """{canonical method: number of accounts hashed with it}"""
+    cur = conn.cursor()
+    try:
+        cur.execute('SELECT password FROM users')
+        counts = {}
+        for row in cur.fetchall():
+            method = row['password'].split('$', 1)[0]
+            counts[method] = counts.get(method, 0) + 1
+        return counts
+    finally:
+        cur.close()
+        conn.commit()
+
+
+def main(argv):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Calibrate and inspect the password hash policy')
+    sub = parser.add_subparsers(dest='command', required=True)
+    c = sub.add_parser('calibrate')
+    c.add_argument('--target-ms', type=float,
+                   default=float(os.getenv('PASSWORD_HASH_TARGET_MS', DEFAULT_TARGET_MS)))
+    c.add_argument('--algorithm', choices=('pbkdf2', 'scrypt'), default='pbkdf2')
+    b = sub.add_parser('bench')
+    b.add_argument('--method', help='default: the current PASSWORD_HASH_METHOD')
+    b.add_argument('--rounds', type=int, default=5)
+    sub.add_parser('status')
+    args = parser.parse_args(argv[1:])
+
+    if args.command == 'calibrate':
+        method, ms = calibrate(args.target_ms, args.algorithm)
+        print(f"One verification takes {ms:.0f} ms (target {args.target_ms:.0f} ms). Set:")
+        print(f"PASSWORD_HASH_METHOD={method}")
+        return 0
+    if args.command == 'bench':
+        method = canonical_method(args.method) if args.method else hash_method()
+        ms = time_verify(method, args.rounds) * 1000
+        print(f"{method}: {ms:.0f} ms per verification, about {1000 / ms:.1f} login(s)/s per core")
+        return 0
+
+    from app import get_db
+    conn = get_db()
+    try:
+        counts = method_counts(conn)
+    finally:
+        conn.close()
+    current = hash_method()
+    for method, n in sorted(counts.items(), key=lambda item: -item[1]):
+        print(f"{n:>8}  {method}{'  (current)' if method == current else '  (rehashed at next login)'}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,262 @@
+"""Monthly reports read from rollups kept in step with every status change.
+
+request_status_history is append-only: one row per submission and one per
+status change (request, document type, from, to, when). Two daily rollups
+are maintained from the same writes, on the caller's cursor, so they
+commit or roll back with the change they describe (as counters.py does):
+
+  report_daily_requests    (day submitted, document_type, status) -> cnt
+                           requests submitted that day, by their status now;
+                           a status change moves one count between statuses
+  report_daily_turnaround  (day completed, document_type, bucket) -> cnt
+                           requests completed that day, by how long they took
+                           from submission, in log-scale buckets of hours
+
+The reports page sums a month of rollup rows, never requests or
+all_records, and reads p50 / p90 turnaround off the merged histogram.
+Buckets are a quarter of a doubling wide, so a percentile is within ~19%.
+
+Archiving or deleting a request leaves its rollup counts alone. Migration
+009 seeded the volume and status rollup from the existing rows; turnaround
+starts with the first completion after it, since no change times were
+recorded before. `rebuild` recomputes both rollups (volume from requests,
+all_records and the cold storage segments, turnaround from the history).
+
+Usage:
+    python reports.py show [--month YYYY-MM]
+    python reports.py rebuild
+"""
+import math
+import sys
+from datetime import date, datetime
+
+import cold_storage
+from backends import upsert_add_sql
+
+COMPLETED = 'Completed'
+BUCKETS_PER_DOUBLING = 4
+MAX_BUCKET = 14 * BUCKETS_PER_DOUBLING      # 2**14 hours, about 22 months
+
+
+# ==================== BUCKETS ====================
+
+def bucket(hours):
+    """Histogram bucket for a turnaround of `hours`; bucket b holds
+    (2**((b-1)/4), 2**(b/4)] hours and bucket 0 everything up to an hour"""
+    if hours <= 1:
+        return 0
+    return min(MAX_BUCKET, math.ceil(math.log2(hours) * BUCKETS_PER_DOUBLING))
+
+
+def bucket_bounds(b):
+    upper = 2 ** (b / BUCKETS_PER_DOUBLING)
+    return (0.0 if b == 0 else 2 ** ((b - 1) / BUCKETS_PER_DOUBLING)), upper
+
+
+def percentile(histogram, q):
+    """Hours at quantile `q` (0..1) of {bucket: count}, interpolated inside
+    the bucket it falls in; None for an empty histogram"""
+    total = sum(histogram.values())
+    if not total:
+        return None
+    target = q * total
+    seen = 0
+    for b in sorted(histogram):
+        n = histogram[b]
+        if n and seen + n >= target:
+            lower, upper = bucket_bounds(b)
+            return lower + (upper - lower) * (target - seen) / n
+        seen += n
+    return bucket_bounds(max(histogram))[1]
+
+
+def format_hours(hours):
+    if hours is None:
+        return '-'
+    if hours < 48:
+        return f'{hours:.1f} h'
+    return f'{hours / 24:.1f} d'
+
+
+# ==================== WRITES ====================
+
+def _day(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _bump(cur, table, key_columns, rows):
+    rows = [r for r in rows if r[-1]]
+    if rows:
+        cur.executemany(upsert_add_sql(cur, table, key_columns, 'cnt'), rows)
+
+
+def _history(cur, rows):
+    cur.executemany('''INSERT INTO request_status_history
+                       (request_id, user_id, document_type, from_status, to_status, changed_at)
+                       VALUES (%s, %s, %s, %s, %s, %s)''', rows)
+
+
+def request_submitted(cur, req_id, user_id, document_type, submitted_at, status='Pending'):
+    _history(cur, [(req_id, user_id, document_type, None, status, submitted_at)])
+    _bump(cur, 'report_daily_requests', ('day', 'document_type', 'status'),
+          [(_day(submitted_at), document_type, status, 1)])
+
+
+def requests_moved(cur, request_rows, status, changed_at):
+    """Record requests that just moved to `status`. Each row needs id,
+    user_id, document_type, date_submitted and its previous status."""
+    request_rows = [r for r in request_rows if r['status'] != status]
+    if not request_rows:
+        return
+    _history(cur, [(r['id'], r['user_id'], r['document_type'], r['status'], status, changed_at)
+                   for r in request_rows])
+    moves = {}
+    for r in request_rows:
+        for key, delta in (((r['status'],), -1), ((status,), 1)):
+            key = (_day(r['date_submitted']), r['document_type']) + key
+            moves[key] = moves.get(key, 0) + delta
+    _bump(cur, 'report_daily_requests', ('day', 'document_type', 'status'),
+          [key + (n,) for key, n in moves.items()])
+    if status == COMPLETED:
+        done = {}
+        for r in request_rows:
+            hours = (changed_at - (r['date_submitted'] or changed_at)).total_seconds() / 3600
+            key = (_day(changed_at), r['document_type'], bucket(hours))
+            done[key] = done.get(key, 0) + 1
+        _bump(cur, 'report_daily_turnaround', ('day', 'document_type', 'bucket'),
+              [key + (n,) for key, n in done.items()])
+
+
+# ==================== READS ====================
+
+def month_range(month):
+    """[first day, first day of next month) for a date in the month"""
+    start = month.replace(day=1)
+    end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    return start, end
+
+
+def monthly_report(cur, month):
+    """Per-document-type rows for the month containing `month`, plus a
+    total row: submitted, {status: count now}, completed, p50, p90 hours"""
+    start, end = month_range(month)
+    cur.execute('''SELECT document_type, status, SUM(cnt) AS cnt FROM report_daily_requests
+                   WHERE day >= %s AND day < %s GROUP BY document_type, status''', (start, end))
+    volume = cur.fetchall()
+    cur.execute('''SELECT document_type, bucket, SUM(cnt) AS cnt FROM report_daily_turnaround
+                   WHERE day >= %s AND day < %s GROUP BY document_type, bucket''', (start, end))
+    turnaround = cur.fetchall()
+
+    rows = {}
+
+    def row(document_type):
+        return rows.setdefault(document_type, {'document_type': document_type, 'submitted': 0, 'statuses': {},
+                                               'completed': 0, 'histogram': {}})
+
+    total = {'document_type': None, 'submitted': 0, 'statuses': {}, 'completed': 0, 'histogram': {}}
+    for v in volume:
+        n = int(v['cnt'])
+        for r in (row(v['document_type']), total):
+            r['submitted'] += n
+            r['statuses'][v['status']] = r['statuses'].get(v['status'], 0) + n
+    for t in turnaround:
+        n = int(t['cnt'])
+        for r in (row(t['document_type']), total):
+            r['completed'] += n
+            r['histogram'][t['bucket']] = r['histogram'].get(t['bucket'], 0) + n
+
+    result = sorted(rows.values(), key=lambda r: -r['submitted']) + [total]
+    for r in result:
+        r['p50'] = percentile(r['histogram'], 0.5)
+        r['p90'] = percentile(r['histogram'], 0.9)
+    return result
+
+
+def report_months(cur):
+    """First days of every month the rollups cover, newest first"""
+    cur.execute('SELECT MIN(day) AS first, MAX(day) AS last FROM report_daily_requests')
+    span = cur.fetchone()
+    if not span or span['first'] is None:
+        return []
+    first, last = _parse_day(span['first']), _parse_day(span['last'])
+    months = []
+    month = first.replace(day=1)
+    while month <= last:
+        months.append(month)
+        month = month_range(month)[1]
+    return months[::-1]
+
+
+def _parse_day(value):
+    # MIN()/MAX() lose SQLite's DATE conversion and come back as text.
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+# ==================== REBUILD ====================
+
+def seed_volume(cur):
+    """Refill report_daily_requests from requests, all_records and the
+    records cold_storage.py has moved out of all_records"""
+    cur.execute('DELETE FROM report_daily_requests')
+    for table in ('requests', 'all_records'):
+        cur.execute(f'''SELECT DATE(date_submitted) AS day, document_type, status, COUNT(*) AS cnt FROM {table}
+                        WHERE date_submitted IS NOT NULL GROUP BY DATE(date_submitted), document_type, status''')
+        _bump(cur, 'report_daily_requests', ('day', 'document_type', 'status'),
+              [(_parse_day(r['day']), r['document_type'], r['status'], r['cnt']) for r in cur.fetchall()])
+    _bump(cur, 'report_daily_requests', ('day', 'document_type', 'status'),
+          [(_parse_day(day), document_type, status, n)
+           for (day, document_type, status), n in cold_storage.volume().items()])
+
+
+def rebuild(cur):
+    """Recompute both rollups; returns the number of completions counted"""
+    seed_volume(cur)
+    cur.execute('DELETE FROM report_daily_turnaround')
+    cur.execute('''SELECT h.document_type, h.changed_at, s.changed_at AS submitted_at
+                   FROM request_status_history h
+                   JOIN request_status_history s ON s.request_id = h.request_id AND s.from_status IS NULL
+                   WHERE h.to_status = %s''', (COMPLETED,))
+    done = {}
+    completions = 0
+    for r in cur.fetchall():
+        hours = (r['changed_at'] - r['submitted_at']).total_seconds() / 3600
+        key = (_day(r['changed_at']), r['document_type'], bucket(hours))
+        done[key] = done.get(key, 0) + 1
+        completions += 1
+    _bump(cur, 'report_daily_turnaround', ('day', 'document_type', 'bucket'), [k + (n,) for k, n in done.items()])
+    return completions
+
+
+def main(argv):
+    import argparse
+    from app import get_db
+
+    parser = argparse.ArgumentParser(description='Request volume and turnaround reports')
+    sub = parser.add_subparsers(dest='command', required=True)
+    show = sub.add_parser('show')
+    show.add_argument('--month', help='YYYY-MM (default: this month)')
+    sub.add_parser('rebuild')
+    args = parser.parse_args(argv[1:])
+
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        if args.command == 'rebuild':
+            completions = rebuild(cur)
+            conn.commit()
+            print(f"Rebuilt the report rollups ({completions} completion(s) in the history).")
+            return 0
+        month = datetime.strptime(args.month, '%Y-%m').date() if args.month else date.today()
+        rows = monthly_report(cur, month)
+        print(f"{'Document type':42} {'Submitted':>9} {'Completed':>9} {'p50':>8} {'p90':>8}")
+        for r in rows:
+            print(f"{r['document_type'] or 'All documents':42} {r['submitted']:>9} {r['completed']:>9} "
+                  f"{format_hours(r['p50']):>8} {format_hours(r['p90']):>8}")
+        return 0
+    finally:
+        cur.close()
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
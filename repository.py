@@ -0,0 +1,359 @@
+"""Data access for the routes: every query app.py runs lives here.
+
+A Repository is built around a connection getter (app.get_db), so inside
+a request it shares the request-scoped connection and outside one it
+checks out its own. The SQL is the portable subset both backends accept
+(see backends.py); the routes no longer touch cursors, placeholders or
+driver exceptions.
+
+Each public method is one unit of work: it commits on success and rolls
+back if anything raises. Methods that change a user's requests stamp
+requests.updated_at and, once committed, report the affected user ids to
+`on_requests_changed` (live.notify in app.py).
+"""
+from contextlib import contextmanager
+from datetime import datetime
+
+import cold_storage
+import counters
+import notifications
+import reports
+import work_queue
+from archive import archive_requests
+from backends import SQLITE, dialect_of, nocase
+from pagination import DEFAULT_PAGE_SIZE, fetch_page
+from resident_search import index_user, remove_user, search_residents
+
+# What a status change reads under lock: the counters need user_id and
+# the old status, the report rollups date_submitted and document_type, the
+# work queue the claim, the notification outbox the rest.
+_NOTIFY_COLUMNS = ('id, user_id, status, full_name, email, contact, document_type, date_submitted, claimed_by, '
+                   'claim_expires_at')
+
+PROFILE_FIELDS = ('first_name', 'last_name', 'fullname', 'contact', 'email', 'birthdate', 'civil_status',
+                  'address', 'fathers_name', 'mothers_name', 'birthplace')
+
+
+class DuplicateEmail(Exception):
+    """Raised when an account with that email address already exists"""
+
+
+def _placeholders(values):
+    return ','.join(['%s'] * len(values))
+
+
+class Repository:
+    def __init__(self, backend, connect, on_requests_changed=None):
+        self.backend = backend
+        self._connect = connect
+        self._on_requests_changed = on_requests_changed
+
+    def _requests_changed(self, user_ids):
+        if self._on_requests_changed is not None and user_ids:
+            self._on_requests_changed(set(user_ids))
+
+    @contextmanager
+    def _cursor(self):
+        conn = self._connect()
+        cur = conn.cursor()
+        try:
+            yield cur
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+            conn.close()
+
+    # ==================== USERS ====================
+
+    def user_by_email(self, email):
+        with self._cursor() as cur:
+            cur.execute(f"SELECT * FROM users WHERE {nocase(cur, 'email')} = %s", (email,))
+            return cur.fetchone()
+
+    def login_user(self, email):
+        """Just what login needs: the session fields and the password hash"""
+        with self._cursor() as cur:
+            cur.execute(f"SELECT id, email, fullname, role, password FROM users WHERE {nocase(cur, 'email')} = %s",
+                        (email,))
+            return cur.fetchone()
+
+    def rehash_password(self, user_id, old_hash, new_hash):
+        """Swap in a hash made under the current policy, unless the password
+        changed since `old_hash` was read"""
+        with self._cursor() as cur:
+            cur.execute('UPDATE users SET password = %s WHERE id = %s AND password = %s', (new_hash, user_id, old_hash))
+            return cur.rowcount == 1
+
+    def user_by_id(self, user_id):
+        with self._cursor() as cur:
+            cur.execute('SELECT * FROM users WHERE id = %s', (user_id,))
+            return cur.fetchone()
+
+    def profile_version(self):
+        """Bumped by every profile update or deletion (counters.PROFILES)"""
+        with self._cursor() as cur:
+            return counters.profile_version(cur)
+
+    def create_user(self, first_name, last_name, email, password_hash, role='user', contact=None):
+        """Insert an account (indexed for search, counted if a resident) and return its id.
+        Emails are stored lower-cased."""
+        email = email.strip().lower()
+        try:
+            with self._cursor() as cur:
+                if dialect_of(cur) == SQLITE:
+                    # MySQL's unique index already compares emails without
+                    # case; SQLite's does not, so look for a case variant of
+                    # an older account first, holding the write lock.
+                    cur.execute("SELECT id FROM users WHERE email COLLATE NOCASE = %s FOR UPDATE", (email,))
+                    if cur.fetchone():
+                        raise DuplicateEmail(email)
+                cur.execute('''INSERT INTO users (first_name, last_name, fullname, email, password, contact, role)
+                               VALUES (%s, %s, %s, %s, %s, %s, %s)''',
+                            (first_name, last_name, f"{first_name} {last_name}", email, password_hash,
+                             contact, role))
+                user_id = cur.lastrowid
+                if role == 'user':
+                    index_user(cur, user_id, first_name, last_name)
+                    counters.resident_added(cur)
+                return user_id
+        except self.backend.IntegrityError:
+            raise DuplicateEmail(email) from None
+
+    def update_user(self, user_id, fields, password_hash=None):
+        """Update PROFILE_FIELDS (and the password, when given) and reindex a resident's name"""
+        columns = [c for c in PROFILE_FIELDS if c in fields]
+        values = [fields[c].strip().lower() if c == 'email' else fields[c] for c in columns]
+        if password_hash:
+            columns.append('password')
+            values.append(password_hash)
+        with self._cursor() as cur:
+            cur.execute(f"UPDATE users SET {', '.join(c + '=%s' for c in columns)} WHERE id=%s",
+                        (*values, user_id))
+            cur.execute('SELECT role FROM users WHERE id = %s', (user_id,))
+            user = cur.fetchone()
+            if user and user['role'] == 'user':
+                index_user(cur, user_id, fields['first_name'], fields['last_name'])
+            counters.profile_changed(cur)
+
+    def delete_user(self, user_id):
+        with self._cursor() as cur:
+            cur.execute('SELECT role FROM users WHERE id = %s FOR UPDATE', (user_id,))
+            user = cur.fetchone()
+            if user:
+                counters.user_removed(cur, user_id, was_resident=user['role'] == 'user')
+            remove_user(cur, user_id)
+            cur.execute('DELETE FROM users WHERE id = %s', (user_id,))
+            counters.profile_changed(cur)
+
+    def resident_page(self, search_query, after=None, before=None, limit=DEFAULT_PAGE_SIZE):
+        """Ranked name search, or every resident paginated by id"""
+        with self._cursor() as cur:
+            if search_query:
+                return search_residents(cur, search_query, after=after, before=before, limit=limit)
+            return fetch_page(
+                cur,
+                'SELECT id, first_name, last_name, fullname, email FROM users',
+                [('id', 'id')],
+                ["role = 'user'"],
+                after=after, before=before,
+                limit=limit, descending=False)
+
+    def page(self, select_sql, key_columns, where=None, params=(), after=None, before=None,
+             limit=DEFAULT_PAGE_SIZE, descending=True):
+        """A keyset page of any projection (see pagination.fetch_page); the
+        JSON API builds its column lists and filters in api.py"""
+        with self._cursor() as cur:
+            return fetch_page(cur, select_sql, key_columns, where, params,
+                              after=after, before=before, limit=limit, descending=descending)
+
+    # ==================== REQUESTS ====================
+
+    def submit_request(self, user_id, full_name, email, document_type, address, contact, purpose):
+        with self._cursor() as cur:
+            now = datetime.now()
+            cur.execute('''INSERT INTO requests (user_id, full_name, email, document_type, address, contact, purpose, status,
+                                                  date_submitted, updated_at)
+                           VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)''',
+                        (user_id, full_name, email, document_type, address, contact, purpose, 'Pending', now, now))
+            counters.request_added(cur, user_id, 'Pending')
+            req_id = cur.lastrowid
+            reports.request_submitted(cur, req_id, user_id, document_type, now)
+        self._requests_changed([user_id])
+        return req_id
+
+    def user_requests(self, user_id, columns='id, document_type, status, date_submitted'):
+        with self._cursor() as cur:
+            cur.execute(f'SELECT {columns} FROM requests WHERE user_id = %s ORDER BY date_submitted DESC',
+                        (user_id,))
+            return cur.fetchall()
+
+    def request_versions(self, user_ids):
+        """{user_id: version} where version changes whenever any of the
+        user's requests is added, changed or removed"""
+        with self._cursor() as cur:
+            cur.execute(f'''SELECT user_id, COUNT(*) AS n, MAX(updated_at) AS latest FROM requests
+                            WHERE user_id IN ({_placeholders(user_ids)}) GROUP BY user_id''', tuple(user_ids))
+            # str(): MySQL hands back a datetime, SQLite the stored text; both
+            # print as 'YYYY-MM-DD HH:MM:SS.ffffff'.
+            found = {row['user_id']: f"{row['n']}:{row['latest']}" for row in cur.fetchall()}
+        return {user_id: found.get(user_id, '0:None') for user_id in user_ids}
+
+    def status_counts(self, user_id=counters.GLOBAL):
+        with self._cursor() as cur:
+            return counters.status_counts(cur, user_id)
+
+    def admin_stats(self):
+        """(registered residents, {status: count}) from the counter tables"""
+        with self._cursor() as cur:
+            return counters.resident_count(cur), counters.status_counts(cur)
+
+    def request_page(self, status=None, after=None, before=None, limit=DEFAULT_PAGE_SIZE):
+        """Requests newest first, optionally of one status"""
+        where, params = [], []
+        if status:
+            where.append('r.status = %s')
+            params.append(status)
+        with self._cursor() as cur:
+            return fetch_page(
+                cur,
+                '''SELECT r.id, u.fullname, u.email, r.document_type, r.purpose, r.status, r.date_submitted,
+                          r.claimed_by, r.claim_expires_at
+                   FROM requests r JOIN users u ON r.user_id = u.id''',
+                [('r.date_submitted', 'date_submitted'), ('r.id', 'id')],
+                where, params,
+                after=after, before=before, limit=limit)
+
+    def certificate_rows(self, req_ids=None, status=None):
+        """What certificates.py prints for each request in `req_ids`, or for
+        every request in `status`: the request plus the owner's profile"""
+        if req_ids is None:
+            where, params = 'r.status = %s', (status,)
+        elif req_ids:
+            where, params = f'r.id IN ({_placeholders(req_ids)})', tuple(req_ids)
+        else:
+            return []
+        with self._cursor() as cur:
+            cur.execute(f'''SELECT r.id, r.document_type, r.full_name, r.address, r.purpose, r.status, r.updated_at,
+                                   u.birthdate, u.civil_status, u.birthplace, u.fathers_name, u.mothers_name
+                            FROM requests r JOIN users u ON r.user_id = u.id
+                            WHERE {where} ORDER BY r.id''', params)
+            return cur.fetchall()
+
+    def transition_requests(self, req_ids, status, transitions, admin_id=None):
+        """Move every request in `req_ids` that may go to `status` under
+        `transitions`, in one transaction. Returns {req_id: result}. With
+        `admin_id`, requests another admin has claimed are skipped."""
+        now = datetime.now()
+        with self._cursor() as cur:
+            cur.execute(f'SELECT {_NOTIFY_COLUMNS} FROM requests WHERE id IN ({_placeholders(req_ids)}) FOR UPDATE',
+                        tuple(req_ids))
+            current = {row['id']: row for row in cur.fetchall()}
+
+            results = {}
+            moves = {}
+            for req_id in req_ids:
+                row = current.get(req_id)
+                if row is None:
+                    results[req_id] = 'not_found'
+                elif row['status'] == status:
+                    results[req_id] = 'unchanged'
+                elif status not in transitions.get(row['status'], []):
+                    results[req_id] = f"invalid_transition: {row['status']} -> {status}"
+                elif work_queue.claimed_by_other(row, admin_id, now):
+                    results[req_id] = 'claimed'
+                else:
+                    results[req_id] = 'updated'
+                    key = (row['user_id'], row['status'])
+                    moves[key] = moves.get(key, 0) + 1
+
+            updated = [req_id for req_id, result in results.items() if result == 'updated']
+            if updated:
+                cur.execute(f'''UPDATE requests SET status=%s, updated_at=%s, claimed_by=NULL, claim_expires_at=NULL
+                                WHERE id IN ({_placeholders(updated)})''', (status, now, *updated))
+                for (user_id, old_status), n in moves.items():
+                    counters.request_moved(cur, user_id, old_status, status, n)
+                notifications.enqueue(cur, [current[req_id] for req_id in updated], status)
+                reports.requests_moved(cur, [current[req_id] for req_id in updated], status, now)
+        self._requests_changed([user_id for user_id, _ in moves])
+        return results
+
+    def delete_requests(self, req_ids):
+        with self._cursor() as cur:
+            groups = counters.lock_request_groups(cur, req_ids)
+            cur.execute(f'DELETE FROM requests WHERE id IN ({_placeholders(req_ids)})', tuple(req_ids))
+            deleted = cur.rowcount
+            counters.requests_removed(cur, groups)
+        self._requests_changed([g['user_id'] for g in groups])
+        return deleted
+
+    def archive(self, req_ids, statuses=None):
+        """Move requests to all_records; see archive.archive_requests"""
+        with self._cursor() as cur:
+            cur.execute(f'SELECT DISTINCT user_id FROM requests WHERE id IN ({_placeholders(req_ids)})',
+                        tuple(req_ids))
+            owners = [row['user_id'] for row in cur.fetchall()]
+        conn = self._connect()
+        try:
+            moved = archive_requests(conn, req_ids, statuses=statuses)
+        finally:
+            conn.close()
+        if moved:
+            self._requests_changed(owners)
+        return moved
+
+    # ==================== ARCHIVED RECORDS ====================
+
+    def record_page(self, status=None, after=None, before=None, limit=DEFAULT_PAGE_SIZE):
+        """Archived records, most recently archived first"""
+        where, params = [], []
+        if status:
+            where.append('status = %s')
+            params.append(status)
+        with self._cursor() as cur:
+            return fetch_page(
+                cur,
+                'SELECT * FROM all_records',
+                [('archived_at', 'archived_at'), ('id', 'id')],
+                where, params,
+                after=after, before=before, limit=limit)
+
+    def restore_record(self, record_id):
+        """Copy a record back from cold storage (see cold_storage.py)"""
+        conn = self._connect()
+        try:
+            return cold_storage.restore(conn, record_id)
+        finally:
+            conn.close()
+
+    def delete_records(self, record_ids):
+        with self._cursor() as cur:
+            cur.execute(f'DELETE FROM all_records WHERE id IN ({_placeholders(record_ids)})', tuple(record_ids))
+            return cur.rowcount
+
+    # ==================== REPORTS ====================
+
+    def monthly_report(self, month):
+        """reports.monthly_report for the month containing `month`, and the
+        months the rollups cover"""
+        with self._cursor() as cur:
+            return reports.monthly_report(cur, month), reports.report_months(cur)
+
+    # ==================== WORK QUEUE ====================
+
+    def claim_requests(self, admin_id, n, status='Pending', document_type=None,
+                       lease_seconds=work_queue.LEASE_SECONDS):
+        """Claim the next `n` unclaimed requests for `admin_id` (see work_queue.py); returns their ids"""
+        with self._cursor() as cur:
+            work_queue.begin_claim(cur)
+            return work_queue.claim_next(cur, admin_id, n, status, document_type, lease_seconds)
+
+    def claimed_requests(self, admin_id):
+        with self._cursor() as cur:
+            return work_queue.claimed(cur, admin_id)
+
+    def release_claims(self, admin_id, req_ids=None):
+        with self._cursor() as cur:
+            return work_queue.release(cur, admin_id, req_ids)
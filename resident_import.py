@@ -0,0 +1,242 @@
+"""Bulk import of residents from a census CSV.
+
+The file needs a header row with at least first_name, last_name and email;
+contact, password, birthdate, civil_status, address, fathers_name,
+mothers_name and birthplace are optional. Rows are checked the way
+/register and /edit_account check them (required names, a plausible email,
+validate_contact() for a non-empty contact) and an email may appear only
+once, in the file or in the database, ignoring letter case; imported
+emails are stored lower-cased. Bad rows are reported by line and skipped;
+the rest are imported.
+
+Hashing the initial passwords is what makes one-by-one registration slow,
+so it runs in a process pool across every core while the main process
+inserts the hashed rows in chunks: one executemany for the users, one for
+their search terms, one for their trigrams and one counter update per
+chunk, each chunk its own transaction. Rows without a password get a
+random one, written to --credentials-out for the barangay to hand out.
+Hashes follow PASSWORD_HASH_METHOD (see passwords.py), like /register.
+
+Usage:
+    python resident_import.py residents.csv [--chunk-size 1000] [--workers N] [--dry-run]
+                              [--errors-out errors.csv] [--credentials-out credentials.csv]
+"""
+import csv
+import itertools
+import os
+import re
+import secrets
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import counters
+import passwords
+from backends import integrity_error, nocase
+from resident_search import index_new_users
+
+COLUMNS = ('first_name', 'last_name', 'email', 'contact', 'password', 'birthdate', 'civil_status', 'address',
+           'fathers_name', 'mothers_name', 'birthplace')
+REQUIRED = ('first_name', 'last_name', 'email')
+DEFAULT_CHUNK_SIZE = 1000
+EXISTS_BATCH = 1000
+MAX_LENGTHS = {'first_name': 255, 'last_name': 255, 'email': 255, 'contact': 50, 'birthdate': 50,
+               'civil_status': 50, 'fathers_name': 255, 'mothers_name': 255, 'birthplace': 255}
+
+_EMAIL = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+
+def _header(name):
+    return re.sub(r'\W+', '_', (name or '').strip().lower()).strip('_')
+
+
+def read_rows(lines, validate_contact):
+    """Parse and check a census CSV. Returns (rows, errors): rows are dicts
+    over COLUMNS plus 'line'; errors are (line, email, message)."""
+    reader = csv.reader(lines)
+    header = [_header(h) for h in next(reader, [])]
+    missing = [c for c in REQUIRED if c not in header]
+    if missing:
+        raise ValueError(f"CSV header is missing column(s): {', '.join(missing)}")
+    positions = {c: header.index(c) for c in COLUMNS if c in header}
+
+    rows, errors, seen = [], [], {}
+    for record in reader:
+        line = reader.line_num
+        if not any(cell.strip() for cell in record):
+            continue
+        row = {c: (record[i].strip() if i < len(record) else '') for c, i in positions.items()}
+        row = {c: row.get(c, '') for c in COLUMNS}
+        row['email'] = row['email'].lower()
+        row['line'] = line
+        problem = None
+        for column in REQUIRED:
+            if not row[column]:
+                problem = f'{column} is required'
+                break
+        if problem is None and not _EMAIL.match(row['email']):
+            problem = 'invalid email address'
+        if problem is None and row['contact'] and not validate_contact(row['contact']):
+            problem = 'contact number must be 11 digits and start with 09'
+        if problem is None:
+            for column, limit in MAX_LENGTHS.items():
+                if len(row[column]) > limit:
+                    problem = f'{column} is longer than {limit} characters'
+                    break
+        if problem is None:
+            if row['email'] in seen:
+                problem = f"duplicate email (also on line {seen[row['email']]})"
+            else:
+                seen[row['email']] = line
+        if problem:
+            errors.append((line, row['email'], problem))
+        else:
+            rows.append(row)
+    return rows, errors
+
+
+def existing_emails(cur, emails):
+    """The subset of `emails` that already have an account, compared and
+    returned lower-cased"""
+    found = set()
+    emails = [e.lower() for e in emails]
+    column = nocase(cur, 'email')
+    for start in range(0, len(emails), EXISTS_BATCH):
+        batch = emails[start:start + EXISTS_BATCH]
+        cur.execute(f"SELECT email FROM users WHERE {column} IN ({','.join(['%s'] * len(batch))})", tuple(batch))
+        found.update(row['email'].lower() for row in cur.fetchall())
+    return found
+
+
+def _insert_chunk(cur, rows, hashes):
+    cur.executemany('''INSERT INTO users (first_name, last_name, fullname, email, password, contact, birthdate,
+                                          civil_status, address, fathers_name, mothers_name, birthplace, role)
+                       VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)''',
+                    [(r['first_name'], r['last_name'], f"{r['first_name']} {r['last_name']}", r['email'], h,
+                      r['contact'] or None, r['birthdate'] or None, r['civil_status'] or None, r['address'] or None,
+                      r['fathers_name'] or None, r['mothers_name'] or None, r['birthplace'] or None, 'user')
+                     for r, h in zip(rows, hashes)])
+    emails = [r['email'] for r in rows]
+    cur.execute(f"SELECT id, first_name, last_name FROM users WHERE email IN ({','.join(['%s'] * len(emails))})",
+                tuple(emails))
+    index_new_users(cur, [(u['id'], u['first_name'], u['last_name']) for u in cur.fetchall()])
+    counters.resident_added(cur, len(rows))
+
+
+def import_residents(conn, rows, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, hash_password=passwords.hash_password,
+                     log=print):
+    """Hash and insert checked rows (see read_rows). Returns (imported,
+    errors, passwords) where passwords maps email -> generated password
+    for rows that came without one."""
+    cur = conn.cursor()
+    errors = []
+    try:
+        taken = existing_emails(cur, [r['email'] for r in rows])
+        conn.commit()
+        fresh = []
+        for row in rows:
+            if row['email'].lower() in taken:
+                errors.append((row['line'], row['email'], 'email already exists'))
+            else:
+                fresh.append(row)
+
+        generated = {}
+        for row in fresh:
+            if not row['password']:
+                row['password'] = generated[row['email']] = secrets.token_urlsafe(9)
+
+        duplicate = integrity_error(conn)
+        imported = 0
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # map() queues every hash up front, so the pool keeps hashing the
+            # next chunks while this process inserts the current one.
+            hashes = pool.map(hash_password, [r['password'] for r in fresh],
+                              chunksize=max(1, min(64, len(fresh) // (4 * (workers or os.cpu_count() or 1)))))
+            for start in range(0, len(fresh), chunk_size):
+                chunk = fresh[start:start + chunk_size]
+                chunk_hashes = list(itertools.islice(hashes, len(chunk)))
+                try:
+                    _insert_chunk(cur, chunk, chunk_hashes)
+                    conn.commit()
+                    imported += len(chunk)
+                except duplicate:
+                    # Someone registered one of these emails since the check
+                    # above: redo the chunk row by row to find out which.
+                    conn.rollback()
+                    for row, hashed in zip(chunk, chunk_hashes):
+                        try:
+                            _insert_chunk(cur, [row], [hashed])
+                            conn.commit()
+                            imported += 1
+                        except duplicate:
+                            conn.rollback()
+                            errors.append((row['line'], row['email'], 'email already exists'))
+                            generated.pop(row['email'], None)
+                elapsed = time.perf_counter() - started
+                log(f"imported {imported}/{len(fresh)} ({imported / elapsed:.0f} rows/s)")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return imported, sorted(errors), generated
+
+
+def _write_csv(path, header, rows, private=False):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        if private:
+            os.chmod(path, 0o600)
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def main(argv):
+    import argparse
+    from app import get_db, validate_contact
+
+    parser = argparse.ArgumentParser(description='Import residents from a census CSV')
+    parser.add_argument('csv_file')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='rows per insert transaction')
+    parser.add_argument('--workers', type=int, default=None, help='hashing processes (default: every core)')
+    parser.add_argument('--dry-run', action='store_true', help='check the file without importing anything')
+    parser.add_argument('--errors-out', help='write rejected rows (line, email, error) to this CSV')
+    parser.add_argument('--credentials-out', help='where to write generated passwords '
+                                                  '(default: <csv_file>.credentials.csv)')
+    args = parser.parse_args(argv[1:])
+
+    started = time.perf_counter()
+    with open(args.csv_file, newline='', encoding='utf-8-sig') as f:
+        rows, errors = read_rows(f, validate_contact)
+    print(f"Read {len(rows) + len(errors)} row(s): {len(rows)} valid, {len(errors)} rejected.")
+
+    imported, generated = 0, {}
+    if not args.dry_run and rows:
+        conn = get_db()
+        try:
+            imported, db_errors, generated = import_residents(conn, rows, args.workers, args.chunk_size)
+        finally:
+            conn.close()
+        errors = sorted(errors + db_errors)
+
+    for line, email, message in errors[:50]:
+        print(f"  line {line}: {email or '-'}: {message}")
+    if len(errors) > 50:
+        print(f"  ... {len(errors) - 50} more")
+    if args.errors_out:
+        _write_csv(args.errors_out, ('line', 'email', 'error'), errors)
+        print(f"Wrote {len(errors)} rejected row(s) to {args.errors_out}")
+    if generated:
+        path = args.credentials_out or args.csv_file + '.credentials.csv'
+        _write_csv(path, ('email', 'password'), sorted(generated.items()), private=True)
+        print(f"Wrote {len(generated)} generated password(s) to {path}")
+
+    seconds = time.perf_counter() - started
+    rate = imported / seconds if seconds else 0
+    print(f"Done: imported {imported} resident(s) in {seconds:.1f}s ({rate:.0f} rows/s)")
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
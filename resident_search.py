@@ -0,0 +1,347 @@
+"""Resident name search backed by maintained term / trigram tables.
+
+Names are normalised (lower-case, accents and punctuation stripped) and
+split into terms. Filipino surname particles are folded into the word
+that follows them, so "Dela Cruz", "de la Cruz" and "DELACRUZ" all index
+the term "delacruz" (plus "cruz" on its own for the spaced forms).
+
+Lookups first try an index range scan on term prefixes. Only when that
+finds too few residents does the typo-tolerant trigram path run.
+
+`bench` searches the load-test residents from bench/seed.py, seeding
+them first when the database has none; bench.seed.clear() (run by
+`python -m bench seed --reset`) removes them again.
+
+Usage:
+    python resident_search.py reindex
+    python resident_search.py bench [--residents 100000] [--queries 2000]
+"""
+import math
+import re
+import sys
+import unicodedata
+
+from backends import prefix_match
+from pagination import Page, encode_cursor, decode_cursor, DEFAULT_PAGE_SIZE
+
+PARTICLES = {'de', 'del', 'dela', 'della', 'delas', 'delos', 'la', 'las', 'los',
+             'san', 'sta', 'sto', 'santa', 'santo', 'y'}
+SUFFIXES = {'jr', 'sr', 'ii', 'iii', 'iv'}
+
+MAX_RESULTS = 200
+PREFIX_SCAN_LIMIT = 5000
+FUZZY_MIN_SIMILARITY = 0.45
+
+
+# ==================== TOKENISING ====================
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return re.sub(r'[^a-z0-9]+', ' ', text.lower()).split()
+
+
+def name_terms(*parts):
+    """Return the ordered, de-duplicated search terms for a name"""
+    terms = []
+    run = []
+    for word in normalize(' '.join(p or '' for p in parts)):
+        if word in SUFFIXES:
+            continue
+        if word in PARTICLES:
+            run.append(word)
+            continue
+        if run:
+            terms.append(''.join(run) + word)
+            run = []
+        terms.append(word)
+    if run:
+        # Trailing particles, e.g. a query for just "dela"
+        terms.append(''.join(run))
+    return list(dict.fromkeys(t[:64] for t in terms))
+
+
+def trigrams(term):
+    padded = f'${term}$'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a, b):
+    ta, tb = trigrams(a), trigrams(b)
+    return len(ta & tb) / len(ta | tb)
+
+
+# ==================== INDEX MAINTENANCE ====================
+
+def index_user(cur, user_id, first_name, last_name):
+    """(Re)build the search rows for one resident; caller commits"""
+    cur.execute('DELETE FROM user_search_terms WHERE user_id = %s', (user_id,))
+    cur.execute('DELETE FROM user_search_trigrams WHERE user_id = %s', (user_id,))
+    terms = name_terms(first_name, last_name)
+    if not terms:
+        return
+    cur.executemany('INSERT INTO user_search_terms (term, user_id) VALUES (%s, %s)',
+                    [(t, user_id) for t in terms])
+    grams = set()
+    for t in terms:
+        grams |= trigrams(t)
+    cur.executemany('INSERT INTO user_search_trigrams (trigram, user_id) VALUES (%s, %s)',
+                    [(g, user_id) for g in sorted(grams)])
+
+
+def index_new_users(cur, users):
+    """Search rows for freshly inserted residents in two batched INSERTs.
+    `users` is an iterable of (user_id, first_name, last_name); unlike
+    index_user() there is nothing old to delete."""
+    term_rows, gram_rows = [], []
+    for user_id, first_name, last_name in users:
+        terms = name_terms(first_name, last_name)
+        term_rows.extend((t, user_id) for t in terms)
+        grams = set()
+        for t in terms:
+            grams |= trigrams(t)
+        gram_rows.extend((g, user_id) for g in sorted(grams))
+    if term_rows:
+        cur.executemany('INSERT INTO user_search_terms (term, user_id) VALUES (%s, %s)', term_rows)
+    if gram_rows:
+        cur.executemany('INSERT INTO user_search_trigrams (trigram, user_id) VALUES (%s, %s)', gram_rows)
+
+
+def remove_user(cur, user_id):
+    cur.execute('DELETE FROM user_search_terms WHERE user_id = %s', (user_id,))
+    cur.execute('DELETE FROM user_search_trigrams WHERE user_id = %s', (user_id,))
+
+
+def reindex_all(conn, batch_size=1000):
+    """Rebuild the whole index in id order, committing every batch. Only
+    residents are indexed, as Repository.create_user does."""
+    cur = conn.cursor()
+    for table in ('user_search_terms', 'user_search_trigrams'):
+        cur.execute(f"DELETE FROM {table} WHERE user_id IN (SELECT id FROM users WHERE role <> 'user')")
+    conn.commit()
+    last_id = 0
+    total = 0
+    while True:
+        cur.execute('''SELECT id, first_name, last_name FROM users WHERE role = 'user' AND id > %s
+                       ORDER BY id LIMIT %s''', (last_id, batch_size))
+        rows = cur.fetchall()
+        if not rows:
+            break
+        for row in rows:
+            index_user(cur, row['id'], row['first_name'], row['last_name'])
+        conn.commit()
+        last_id = rows[-1]['id']
+        total += len(rows)
+    cur.close()
+    return total
+
+
+# ==================== SEARCH ====================
+
+def _prefix_candidates(cur, qterms):
+    """Residents with a term starting with each of `qterms`, at most
+    PREFIX_SCAN_LIMIT of them. Several terms are intersected in SQL before
+    the limit applies, so a common first term cannot crowd out the
+    residents who also match the rest of the query."""
+    matches = [prefix_match(cur, 'term', q) for q in qterms]
+    if len(matches) == 1:
+        # Walks the (term, user_id) key, so exact matches come first.
+        condition, pattern = matches[0]
+        cur.execute(f'SELECT user_id FROM user_search_terms WHERE {condition} LIMIT %s',
+                    (pattern, PREFIX_SCAN_LIMIT))
+        return {row['user_id'] for row in cur.fetchall()}
+    conditions = [condition for condition, _ in matches]
+    patterns = [pattern for _, pattern in matches]
+    placeholders = ','.join(['%s'] * len(qterms))
+    cur.execute(f'''SELECT user_id FROM user_search_terms
+                    WHERE {' OR '.join(conditions)}
+                    GROUP BY user_id
+                    HAVING {' AND '.join(f'MAX({c}) = 1' for c in conditions)}
+                    ORDER BY SUM(term IN ({placeholders})) DESC
+                    LIMIT %s''',
+                (*patterns, *patterns, *qterms, PREFIX_SCAN_LIMIT))
+    return {row['user_id'] for row in cur.fetchall()}
+
+
+def _fuzzy_candidates(cur, qterms):
+    grams = set()
+    for q in qterms:
+        grams |= trigrams(q)
+    needed = max(2, math.ceil(len(grams) * FUZZY_MIN_SIMILARITY))
+    placeholders = ','.join(['%s'] * len(grams))
+    cur.execute(f'''SELECT user_id, COUNT(*) AS hits FROM user_search_trigrams
+                    WHERE trigram IN ({placeholders})
+                    GROUP BY user_id HAVING hits >= %s
+                    ORDER BY hits DESC LIMIT %s''',
+                (*sorted(grams), needed, MAX_RESULTS * 5))
+    return {row['user_id'] for row in cur.fetchall()}
+
+
+def _score(qterms, terms):
+    """Sum of the best match per query term, or None if one term misses"""
+    total = 0.0
+    for q in qterms:
+        best = 0.0
+        for t in terms:
+            if t == q:
+                best = 3.0
+                break
+            if t.startswith(q):
+                best = max(best, 2.0 + len(q) / len(t))
+            elif len(q) >= 3:
+                sim = similarity(q, t)
+                if sim >= FUZZY_MIN_SIMILARITY:
+                    best = max(best, 1.5 * sim)
+        if best == 0.0:
+            return None
+        total += best
+    return total
+
+
+def ranked_user_ids(cur, query):
+    """Return resident ids matching `query`, best match first"""
+    qterms = name_terms(query)
+    if not qterms:
+        return []
+
+    candidates = _prefix_candidates(cur, qterms)
+    if len(candidates) < MAX_RESULTS and any(len(q) >= 3 for q in qterms):
+        candidates |= _fuzzy_candidates(cur, [q for q in qterms if len(q) >= 3])
+    if not candidates:
+        return []
+
+    ids = sorted(candidates)
+    terms_by_user = {}
+    for start in range(0, len(ids), 1000):
+        chunk = ids[start:start + 1000]
+        placeholders = ','.join(['%s'] * len(chunk))
+        cur.execute(f'SELECT user_id, term FROM user_search_terms WHERE user_id IN ({placeholders})',
+                    tuple(chunk))
+        for row in cur.fetchall():
+            terms_by_user.setdefault(row['user_id'], []).append(row['term'])
+
+    scored = []
+    for user_id, terms in terms_by_user.items():
+        score = _score(qterms, terms)
+        if score is not None:
+            scored.append((-score, user_id))
+    scored.sort()
+    return [user_id for _, user_id in scored[:MAX_RESULTS]]
+
+
+def search_residents(cur, query, after=None, before=None, limit=DEFAULT_PAGE_SIZE):
+    """Ranked, paginated resident search returning a pagination.Page.
+
+    Cursors hold a position in the ranked list, which is rebuilt on every
+    page; that list is capped at MAX_RESULTS so this stays cheap.
+    """
+    ranked = ranked_user_ids(cur, query)
+    after_pos = decode_cursor(after, 1)
+    before_pos = decode_cursor(before, 1)
+    if after_pos is not None:
+        start = after_pos[0] + 1
+    elif before_pos is not None:
+        start = max(0, before_pos[0] - limit)
+    else:
+        start = 0
+    ids = ranked[start:start + limit]
+
+    rows = []
+    if ids:
+        placeholders = ','.join(['%s'] * len(ids))
+        cur.execute(f'''SELECT id, first_name, last_name, fullname, email FROM users
+                        WHERE role = 'user' AND id IN ({placeholders})''', tuple(ids))
+        by_id = {row['id']: row for row in cur.fetchall()}
+        rows = [by_id[i] for i in ids if i in by_id]
+
+    end = start + len(ids)
+    next_cursor = encode_cursor([end - 1]) if end < len(ranked) else None
+    prev_cursor = encode_cursor([start]) if start > 0 else None
+    return Page(rows, next_cursor, prev_cursor)
+
+
+# ==================== BENCHMARK ====================
+
+BENCH_FIRST_NAMES = ['Juan', 'Maria', 'Jose', 'Ana', 'Mark', 'Kristine', 'John Paul', 'Ma. Cristina',
+                     'Rodrigo', 'Liza', 'Angelo', 'Jasmine', 'Ramon', 'Rowena', 'Carlo', 'Princess',
+                     'Jericho', 'Maricel', 'Noel', 'Shiela', 'Rogelio', 'Teresita', 'Paolo', 'Joy']
+BENCH_LAST_NAMES = ['Dela Cruz', 'De los Santos', 'Santos', 'Reyes', 'Garcia', 'Mendoza', 'Bautista',
+                    'Del Rosario', 'De Guzman', 'San Juan', 'Villanueva', 'Ramos', 'Aquino', 'Castillo',
+                    'De la Peña', 'Navarro', 'Sta. Maria', 'Torres', 'Gonzales', 'Lopez', 'Flores',
+                    'Magbanua', 'Macaraeg', 'Dimaculangan', 'Pangilinan', 'Manalastas']
+
+
+def _typo(word, rng):
+    if len(word) < 4:
+        return word
+    i = rng.randrange(1, len(word) - 1)
+    return word[:i] + word[i + 1:] if rng.random() < 0.5 else word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def bench(conn, residents=100000, queries=2000, seed=7):
+    """Returns 0, or 2 when a smaller load-test data set is already seeded"""
+    import random
+    import time
+
+    from bench import seed as load_test
+
+    have = load_test.dataset(conn)['residents']
+    if not have:
+        print(f"Seeding {residents} load-test residents...")
+        have = load_test.seed(conn, residents, requests=0, records=0)['residents']
+    elif have < residents:
+        print(f"Only {have} load-test residents are seeded; run "
+              f"`python -m bench seed --reset --residents {residents}` first.")
+        return 2
+
+    rng = random.Random(seed)
+    cur = conn.cursor()
+    samples = []
+    for _ in range(queries):
+        last = rng.choice(BENCH_LAST_NAMES)
+        kind = rng.random()
+        if kind < 0.4:
+            q = last[:rng.randint(2, len(last))]
+        elif kind < 0.7:
+            q = f'{rng.choice(BENCH_FIRST_NAMES)} {last}'
+        else:
+            q = ' '.join(_typo(w, rng) for w in last.split())
+        t0 = time.perf_counter()
+        search_residents(cur, q)
+        samples.append((time.perf_counter() - t0) * 1000)
+    cur.close()
+
+    samples.sort()
+
+    def pct(p):
+        return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+    print(f"{queries} searches over {have} load-test residents: "
+          f"p50={pct(0.50):.2f}ms p95={pct(0.95):.2f}ms p99={pct(0.99):.2f}ms max={samples[-1]:.2f}ms")
+    return 0
+
+
+def main(argv):
+    import argparse
+    from app import get_db
+
+    parser = argparse.ArgumentParser(description='Resident search index tools')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('reindex')
+    b = sub.add_parser('bench')
+    b.add_argument('--residents', type=int, default=100000)
+    b.add_argument('--queries', type=int, default=2000)
+    args = parser.parse_args(argv[1:])
+
+    conn = get_db()
+    try:
+        if args.command == 'reindex':
+            print(f"Indexed {reindex_all(conn)} users.")
+            return 0
+        return bench(conn, args.residents, args.queries)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
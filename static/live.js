@@ -0,0 +1,58 @@
+// Live request status for the resident pages (see live.py).
+// The body's data-live-url is an EventSource stream that says `changed`
+// whenever one of this user's requests changes. The page then re-fetches
+// itself (a conditional GET, usually answered with a 304) and swaps in
+// every element marked data-live, leaving the rest of the page, including
+// a half-filled request form, alone.
+(function () {
+    if (!window.EventSource || !document.body.dataset.liveUrl) {
+        return;
+    }
+    let events = null;
+    let refreshing = false;
+    let again = false;
+
+    function listen(url) {
+        if (events) {
+            events.close();
+        }
+        events = new EventSource(url);
+        events.addEventListener('changed', refresh);
+    }
+
+    async function refresh() {
+        if (refreshing) {
+            again = true;
+            return;
+        }
+        refreshing = true;
+        try {
+            const response = await fetch(window.location.href, {cache: 'no-cache', credentials: 'same-origin'});
+            if (!response.ok || response.redirected) {
+                return;
+            }
+            const page = new DOMParser().parseFromString(await response.text(), 'text/html');
+            document.querySelectorAll('[data-live]').forEach(element => {
+                const fresh = page.getElementById(element.id);
+                if (fresh) {
+                    element.replaceWith(fresh);
+                }
+            });
+            // Reconnect at the new version so the next stream does not
+            // report this same change again.
+            const url = page.body.dataset.liveUrl;
+            if (url && url !== document.body.dataset.liveUrl) {
+                document.body.dataset.liveUrl = url;
+                listen(url);
+            }
+        } finally {
+            refreshing = false;
+            if (again) {
+                again = false;
+                refresh();
+            }
+        }
+    }
+
+    listen(document.body.dataset.liveUrl);
+})();
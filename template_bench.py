@@ -0,0 +1,124 @@
+"""Render-time and memory benchmark for the page templates.
+
+Renders every page in English and Tagalog from sample rows (no database
+needed) and reports the mean / p95 render time per page, how long the
+templates take to compile from source versus loading them from the Jinja
+bytecode cache, and the process's peak RSS. Run it in a fresh process so
+the RSS figure only covers the templates.
+
+Usage:
+    python template_bench.py [--rounds 200] [--rows 20]
+"""
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from jinja2 import FileSystemBytecodeCache
+
+from pagination import Page
+
+LANGUAGES = ('en', 'tl')
+STATUSES = ['Pending', 'Processing', 'Verifying', 'Ready to be Claim', 'Completed', 'Rejected']
+
+
+def sample_context(rows):
+    now = datetime(2025, 6, 1, 9, 30)
+    user = {'id': 1, 'first_name': 'Juan', 'last_name': 'Dela Cruz', 'fullname': 'Juan Dela Cruz',
+            'email': 'juan@example.com', 'contact': '09123456789', 'birthdate': '1990-01-01',
+            'civil_status': 'Single', 'address': 'Purok 1, San Isidro', 'fathers_name': 'Pedro Dela Cruz',
+            'mothers_name': 'Maria Dela Cruz', 'birthplace': 'Lipa City', 'role': 'user', 'created_at': now}
+    requests = [{'id': n, 'user_id': 1, 'fullname': 'Juan Dela Cruz', 'email': 'juan@example.com',
+                 'document_type': 'Barangay Clearance', 'purpose': 'Employment requirement',
+                 'status': STATUSES[n % len(STATUSES)], 'date_submitted': now - timedelta(hours=n)}
+                for n in range(1, rows + 1)]
+    records = [dict(r, request_id=r['id'], status=STATUSES[4 + r['id'] % 2], archived_at=now)
+               for r in requests]
+    users = [dict(user, id=n, email=f'r{n}@example.com') for n in range(1, rows + 1)]
+    return {
+        'index.html': {},
+        'login.html': {},
+        'register.html': {},
+        'edit_account.html': {'user': user},
+        'user_dashboard.html': {'fullname': user['fullname'], 'total': rows, 'pending': 3, 'completed': 4,
+                                'user_contact': user['contact'], 'user_requests': requests},
+        'status.html': {'requests': requests},
+        'admin_dashboard.html': {
+            'requests': requests, 'requests_page': Page(requests, 'next', 'prev'),
+            'status_counts': {s: rows for s in STATUSES}, 'total_users': rows, 'total_requests': rows * 6,
+            'users': users, 'users_page': Page(users, 'next', None), 'user_info': None,
+            'search_query': 'dela', 'status_filter': '', 'limit': rows},
+        'all_records.html': {'requests': records, 'records_page': Page(records, 'next', 'prev'),
+                             'status_filter': ''},
+        '404.html': {},
+    }
+
+
+def load_times(env, names):
+    """Seconds to load `names` from source, then from the bytecode cache"""
+    saved = env.bytecode_cache
+    with tempfile.TemporaryDirectory() as directory:
+        env.bytecode_cache = None
+        env.cache.clear()
+        started = time.perf_counter()
+        for name in names:
+            env.get_template(name)
+        cold = time.perf_counter() - started
+
+        env.bytecode_cache = FileSystemBytecodeCache(directory)
+        env.cache.clear()
+        for name in names:
+            env.get_template(name)
+        env.cache.clear()
+        started = time.perf_counter()
+        for name in names:
+            env.get_template(name)
+        warm = time.perf_counter() - started
+    env.bytecode_cache = saved
+    env.cache.clear()
+    return cold, warm
+
+
+def bench(app, rounds=200, rows=20):
+    from flask import render_template, session
+
+    contexts = sample_context(rows)
+    cold, warm = load_times(app.jinja_env, list(contexts))
+    print(f"compile {len(contexts)} templates: {cold * 1000:.1f} ms from source, "
+          f"{warm * 1000:.1f} ms from bytecode cache")
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{'page':<24}{'lang':<6}{'mean ms':>10}{'p95 ms':>10}")
+    for name, context in contexts.items():
+        for lang in LANGUAGES:
+            samples = []
+            with app.test_request_context('/'):
+                session['lang'] = lang
+                session['user_id'] = 1
+                for _ in range(rounds):
+                    started = time.perf_counter()
+                    render_template(name, **context)
+                    samples.append((time.perf_counter() - started) * 1000)
+            samples.sort()
+            mean = sum(samples) / len(samples)
+            print(f"{name:<24}{lang:<6}{mean:>10.3f}{samples[int(len(samples) * 0.95)]:>10.3f}")
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"templates cached: {len(app.jinja_env.cache)}; "
+          f"peak RSS {rss / 1024:.1f} MB (+{(rss - rss_before) / 1024:.1f} MB while rendering)")
+
+
+def main(argv):
+    import argparse
+    from app import app
+
+    parser = argparse.ArgumentParser(description='Benchmark template rendering')
+    parser.add_argument('--rounds', type=int, default=200)
+    parser.add_argument('--rows', type=int, default=20, help='table rows per page')
+    args = parser.parse_args(argv[1:])
+    bench(app, args.rounds, args.rows)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
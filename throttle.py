@@ -0,0 +1,97 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class Throttle:
+    """Thread-safe, size-bounded failure counter: a key that fails `limit`
+    times within `window` seconds is blocked until that window ends.
+
+    Counts live in the worker process, so with several gunicorn workers a
+    key gets up to `limit` failures in each; that still bounds the work an
+    attacker can make the login page do.
+    """
+
+    def __init__(self, limit, window, maxsize=10000):
+        self.limit = limit
+        self.window = window
+        self.maxsize = maxsize
+        self._data = OrderedDict()      # key -> [window start, failures]
+        self._lock = threading.Lock()
+        self.blocks = 0
+
+    def retry_after(self, key):
+        """Seconds until `key` may try again; 0 if it is not blocked"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return 0
+            remaining = entry[0] + self.window - now
+            if remaining <= 0:
+                del self._data[key]
+                return 0
+            if entry[1] < self.limit:
+                return 0
+            self.blocks += 1
+            return remaining
+
+    def failure(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] + self.window <= now:
+                entry = self._data[key] = [now, 0]
+            entry[1] += 1
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def reset(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._data), 'maxsize': self.maxsize, 'limit': self.limit,
+                    'window': self.window, 'blocks': self.blocks}
+
+
+class FairSemaphore:
+    """Counting semaphore that hands slots out in arrival order.
+
+    threading.Semaphore lets a thread that has just released a slot take
+    it straight back ahead of one that has been waiting, so under a steady
+    stream of logins a waiter can time out while others get through. Here
+    release() passes the slot directly to the longest waiter.
+    """
+
+    def __init__(self, slots):
+        self._slots = slots
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        """True once a slot is held; False if none came within `timeout` seconds"""
+        with self._lock:
+            if self._slots and not self._waiters:
+                self._slots -= 1
+                return True
+            waiter = threading.Lock()
+            waiter.acquire()
+            self._waiters.append(waiter)
+        if waiter.acquire(timeout=-1 if timeout is None else timeout):
+            return True
+        with self._lock:
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                return True     # handed a slot just as the wait ran out
+            return False
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                self._waiters.popleft().release()
+            else:
+                self._slots += 1
@@ -0,0 +1,66 @@
+"""Warm the preloaded app in gunicorn's master before it forks workers.
+
+With preload_app the master imports app.py once and every worker is a
+fork of it, sharing its memory copy-on-write. Anything done here is done
+once instead of on each worker's first requests:
+
+  * every template is compiled (and written to the Jinja bytecode cache),
+    so no request pays for a compile;
+  * the URL map is built and the anonymous pages are rendered once in
+    both languages, which pulls in the translation tables and the lazily
+    imported parts of Jinja and Werkzeug;
+  * the database is reached once, so a bad DB_* setting stops the deploy
+    in the master instead of failing every worker's first request. The
+    connection is closed again: a forked worker must never share the
+    master's socket;
+  * gc.freeze() moves everything allocated so far out of the garbage
+    collector's reach, so collections in the workers do not touch (and
+    un-share) those pages.
+
+gunicorn.conf.py calls warm() from its when_ready hook.
+"""
+import gc
+import time
+
+ANONYMOUS_PAGES = ('index.html', 'login.html', 'register.html', '404.html')
+
+
+def warm(app, backend, log=print):
+    """Returns {step: seconds}"""
+    from flask import render_template, session
+
+    import i18n
+
+    timings = {}
+    started = time.perf_counter()
+    names = app.jinja_env.list_templates(filter_func=lambda name: name.endswith('.html'))
+    for name in names:
+        app.jinja_env.get_template(name)
+    timings['templates'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for lang in i18n.LANGUAGES:
+        with app.test_request_context('/'):
+            session['lang'] = lang
+            for name in ANONYMOUS_PAGES:
+                render_template(name)
+    timings['render'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    conn = backend.acquire()
+    try:
+        cur = conn.cursor()
+        cur.execute('SELECT 1')
+        cur.fetchall()
+        cur.close()
+    finally:
+        backend.release(conn)
+        backend.close_all()
+    timings['database'] = time.perf_counter() - started
+
+    gc.collect()
+    gc.freeze()
+    log(f"warmup: compiled {len(names)} templates in {timings['templates'] * 1000:.0f} ms, "
+        f"rendered {len(ANONYMOUS_PAGES) * len(i18n.LANGUAGES)} pages in {timings['render'] * 1000:.0f} ms, "
+        f"database reached in {timings['database'] * 1000:.0f} ms; {gc.get_freeze_count()} objects frozen")
+    return timings
@@ -0,0 +1,96 @@
+"""Claim-next work queue for admin staff.
+
+Instead of everyone working the same full list, an admin claims the next
+N unclaimed requests in one status (oldest first, optionally one
+document type). A claim is requests.claimed_by plus claim_expires_at, a
+lease that lapses on its own if the admin walks away; any status change
+releases it, and so does an explicit release.
+
+Claiming is SELECT ... FOR UPDATE SKIP LOCKED on MySQL: concurrent
+claimers skip the rows another claim transaction is holding instead of
+waiting for them, so two admins never get the same request and never
+queue behind each other. The transaction runs at READ COMMITTED so the
+scan takes no gap locks that would stall new submissions. SQLite has one
+writer at a time: the claim runs under BEGIN IMMEDIATE, which is equally
+safe but serialises claimers for the few milliseconds each one takes.
+`python -m bench claims` measures both.
+
+Every helper runs on the caller's cursor and leaves committing to it.
+"""
+from datetime import datetime, timedelta
+
+from backends import MYSQL, dialect_of
+
+QUEUE_STATUSES = ('Pending', 'Processing', 'Verifying')
+LEASE_SECONDS = 15 * 60
+MAX_CLAIM = 20
+
+CLAIM_COLUMNS = 'r.id, r.user_id, r.full_name, r.document_type, r.purpose, r.status, r.date_submitted'
+
+
+class RequestClaimed(Exception):
+    """Raised when another admin holds a live claim on the request"""
+
+    def __init__(self, req_id, holder):
+        super().__init__(f'request {req_id} is claimed by admin {holder}')
+        self.req_id = req_id
+        self.holder = holder
+
+
+def claimed_by_other(row, admin_id, now=None):
+    """True when `row` (with claimed_by, claim_expires_at) has a live claim
+    held by someone other than `admin_id`"""
+    return (admin_id is not None and row['claimed_by'] is not None and row['claimed_by'] != admin_id
+            and row['claim_expires_at'] is not None and row['claim_expires_at'] > (now or datetime.now()))
+
+
+def begin_claim(cur):
+    """Call before the claim transaction's first statement. The
+    request-scoped connection may still have a transaction open from an
+    earlier query, and MySQL refuses SET TRANSACTION inside one, so that
+    transaction is committed first."""
+    if dialect_of(cur) == MYSQL:
+        cur.execute('COMMIT')
+        cur.execute('SET TRANSACTION ISOLATION LEVEL READ COMMITTED')
+
+
+def claim_next(cur, admin_id, n, status='Pending', document_type=None, lease_seconds=LEASE_SECONDS, now=None):
+    """Claim up to `n` of the oldest unclaimed requests in `status` for
+    `admin_id`; return their ids, oldest first"""
+    now = now or datetime.now()
+    where = ['status = %s', '(claimed_by IS NULL OR claim_expires_at <= %s)']
+    params = [status, now]
+    if document_type:
+        where.append('document_type = %s')
+        params.append(document_type)
+    cur.execute(f'''SELECT id FROM requests WHERE {' AND '.join(where)}
+                    ORDER BY date_submitted, id LIMIT %s FOR UPDATE SKIP LOCKED''', (*params, n))
+    ids = [row['id'] for row in cur.fetchall()]
+    if ids:
+        # updated_at = updated_at: a claim is not a change the resident can
+        # see, so it must not trip MySQL's ON UPDATE or the page ETags.
+        cur.execute(f'''UPDATE requests SET claimed_by = %s, claim_expires_at = %s, updated_at = updated_at
+                        WHERE id IN ({','.join(['%s'] * len(ids))})''',
+                    (admin_id, now + timedelta(seconds=lease_seconds), *ids))
+    return ids
+
+
+def release(cur, admin_id, req_ids=None):
+    """Drop `admin_id`'s claims (all of them, or just `req_ids`)"""
+    sql = 'UPDATE requests SET claimed_by = NULL, claim_expires_at = NULL, updated_at = updated_at WHERE claimed_by = %s'
+    params = [admin_id]
+    if req_ids is not None:
+        if not req_ids:
+            return 0
+        sql += f" AND id IN ({','.join(['%s'] * len(req_ids))})"
+        params.extend(req_ids)
+    cur.execute(sql, tuple(params))
+    return cur.rowcount
+
+
+def claimed(cur, admin_id, now=None):
+    """`admin_id`'s live claims, oldest request first"""
+    cur.execute(f'''SELECT {CLAIM_COLUMNS}, r.claim_expires_at FROM requests r
+                    WHERE r.claimed_by = %s AND r.claim_expires_at > %s
+                    ORDER BY r.date_submitted, r.id''', (admin_id, now or datetime.now()))
+    return cur.fetchall()